@@ -1,156 +1,313 @@
 import os
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable
 from langchain_google_genai import ChatGoogleGenerativeAI
-from ai.schemas import PARStructure, TagResponse, CoachingResult, MemoryEntryStructure
+from ai.schemas import PARStructure, PARStructureWithTags, TagResponse, CoachingResult, MemoryEntryStructure
 from ai.prompts import (
     PAR_STRUCTURING_PROMPT, TAGGING_PROMPT, COACHING_PROMPT, 
-    MEMORY_SUMMARIZATION_PROMPT, COACHING_AGENT_PROMPT
+    MEMORY_SUMMARIZATION_PROMPT, COACHING_AGENT_PROMPT, STRUCTURE_AND_TAG_PROMPT
 )
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from ai.tools import create_user_tools
-from ai.tools import create_user_tools
+from ai.hedging import hedged_or_fallback
+from ai.rate_limit import rate_limited
+from ai.token_budget import compaction_step
+from ai.instrumentation import METRICS_CALLBACKS
+from ai import fake_providers
+from structured_logging import AGENT_TRACE_LOGGER
+
+logger = logging.getLogger(__name__)
+# Sampled per request (AGENT_TRACE_SAMPLE_RATE)
+trace_logger = logging.getLogger(AGENT_TRACE_LOGGER)
 
 # Model Defaults (can be overridden via environment variables)
 GEMINI_FLASH_MODEL = os.getenv("GEMINI_FLASH_MODEL", "gemini-2.0-flash")
 GEMINI_PRO_MODEL = os.getenv("GEMINI_PRO_MODEL", "gemini-2.0-pro-exp-02-05")
 
-def get_structure_chain():
+# =============================================================================
+# CHAIN REGISTRY
+# =============================================================================
+# Gemini clients and chains are built once per worker process and shared by
+# every request. Clients are keyed by (model, temperature, verbose) so chains
+# with the same settings reuse one client; chains are keyed by
+# (name, model, temperature, schema). After the first call, fetching a chain
+# is a single dictionary lookup.
+
+_registry_lock = threading.RLock()
+_llm_registry: Dict[Tuple[str, float, bool], Runnable] = {}
+_chain_registry: Dict[Hashable, Runnable] = {}
+
+
+# Sampling temperature per chain
+CHAIN_TEMPERATURES = {
+    "structure": 0.7,             # Slight creativity for titles/phrasing, but grounded
+    "tagging": 0.3,               # Lower temperature for classification (more deterministic)
+    "structure_and_tag": 0.3,     # Fused call: keep tags as stable as the standalone tagger
+    "coaching": 0.7,              # Higher temperature for slightly more diverse feedback
+    "memory_summarization": 0.0,  # Cold for factual extraction
+    "coaching_agent": 0.5,
+}
+
+# Prompt template behind each chain
+CHAIN_PROMPTS = {
+    "structure": PAR_STRUCTURING_PROMPT,
+    "tagging": TAGGING_PROMPT,
+    "structure_and_tag": STRUCTURE_AND_TAG_PROMPT,
+    "coaching": COACHING_PROMPT,
+    "memory_summarization": MEMORY_SUMMARIZATION_PROMPT,
+    "coaching_agent": COACHING_AGENT_PROMPT,
+}
+
+
+@lru_cache(maxsize=None)
+def _prompt_version(chain_name: str) -> str:
+    """Short hash of a chain's prompt template; changes whenever the prompt text changes."""
+    template = CHAIN_PROMPTS[chain_name].pretty_repr()
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+def get_chain_identity(chain_name: str) -> dict:
     """
-    Creates and returns the LangChain runnable for PAR structuring.
-    Expects 'raw_transcript' as input.
-    Returns PARStructure object.
+    Describe everything that determines a chain's output apart from its inputs:
+    prompt template version, model(s) and temperature. Used to key output caches.
     """
+    if chain_name in ("coaching", "coaching_agent"):
+        models = [GEMINI_PRO_MODEL, GEMINI_FLASH_MODEL]
+    else:
+        models = [GEMINI_FLASH_MODEL]
+    return {
+        "chain": chain_name,
+        "prompt_version": _prompt_version(chain_name),
+        "models": models,
+        "temperature": CHAIN_TEMPERATURES[chain_name],
+    }
+
+
+def _get_api_key() -> str:
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise ValueError("GOOGLE_API_KEY environment variable not set")
+    return api_key
+
+
+def _get_llm(model: str, temperature: float, verbose: bool = True) -> Runnable:
+    """
+    Return the shared Gemini client for these settings, creating it on first use.
+    With AI_LLM_PROVIDER=fake this is an offline stand-in (see ai/fake_providers.py).
+    Calls go through the model's shared rate limiter (see ai/rate_limit.py).
+    """
+    key = (model, temperature, verbose)
+    llm = _llm_registry.get(key)
+    if llm is None:
+        with _registry_lock:
+            llm = _llm_registry.get(key)
+            if llm is None:
+                if fake_providers.LLM_PROVIDER == fake_providers.PROVIDER_FAKE:
+                    llm = fake_providers.fake_chat_model(model, temperature)
+                    llm.callbacks = [METRICS_CALLBACKS]
+                else:
+                    llm = ChatGoogleGenerativeAI(
+                        model=model,
+                        google_api_key=_get_api_key(),
+                        temperature=temperature,
+                        verbose=verbose,
+                        callbacks=[METRICS_CALLBACKS]
+                    )
+                llm = rate_limited(llm, model)
+                _llm_registry[key] = llm
+    return llm
+
+
+def _get_or_build_chain(key: Hashable, builder: Callable[[], Any]) -> Any:
+    """Return the registered chain for `key`, building it once if missing."""
+    chain = _chain_registry.get(key)
+    if chain is None:
+        with _registry_lock:
+            chain = _chain_registry.get(key)
+            if chain is None:
+                chain = builder()
+                _chain_registry[key] = chain
+    return chain
 
-    # Initialize Gemini 2.0 Flash (high-performance, cost-effective default)
-    llm = ChatGoogleGenerativeAI(
-        model=GEMINI_FLASH_MODEL,
-        google_api_key=api_key,
-        temperature=0.7, # Slight creativity for titles/phrasing, but grounded
-        verbose=True
-    )
 
-    # Bind the structured output schema
-    start_chain = PAR_STRUCTURING_PROMPT | llm.with_structured_output(PARStructure)
-    
-    return start_chain
+def reload_chains() -> None:
+    """
+    Re-read GEMINI_FLASH_MODEL / GEMINI_PRO_MODEL and drop every cached client and chain.
+
+    Call this after changing the model environment variables (or GOOGLE_API_KEY);
+    the next get_*_chain() call rebuilds against the new settings.
+    """
+    global GEMINI_FLASH_MODEL, GEMINI_PRO_MODEL
+    with _registry_lock:
+        GEMINI_FLASH_MODEL = os.getenv("GEMINI_FLASH_MODEL", "gemini-2.0-flash")
+        GEMINI_PRO_MODEL = os.getenv("GEMINI_PRO_MODEL", "gemini-2.0-pro-exp-02-05")
+        _chain_registry.clear()
+        _llm_registry.clear()
+
+
+def get_structure_chain():
+    """
+    Returns the shared LangChain runnable for PAR structuring.
+    Expects 'raw_transcript' as input.
+    Returns PARStructure object.
+    """
+    model = GEMINI_FLASH_MODEL
+    temperature = CHAIN_TEMPERATURES["structure"]
+
+    def build():
+        llm = _get_llm(model, temperature)
+        # Bind the structured output schema
+        return compaction_step("structure") | PAR_STRUCTURING_PROMPT | llm.with_structured_output(PARStructure)
+
+    return _get_or_build_chain(("structure", model, temperature, PARStructure), build)
 
 def get_tagging_chain():
     """
-    Creates and returns the LangChain runnable for behavioral tagging.
+    Returns the shared LangChain runnable for behavioral tagging.
     Expects 'problem', 'action', 'result' as input.
     Returns TagResponse object with 1-3 tags.
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY environment variable not set")
-
     # Use same Gemini model as structuring for consistency
-    llm = ChatGoogleGenerativeAI(
-        model=GEMINI_FLASH_MODEL,
-        google_api_key=api_key,
-        temperature=0.3, # Lower temperature for classification (more deterministic)
-        verbose=True
-    )
+    model = GEMINI_FLASH_MODEL
+    temperature = CHAIN_TEMPERATURES["tagging"]
 
-    # Bind structured output schema
-    tagging_chain = TAGGING_PROMPT | llm.with_structured_output(TagResponse)
-    
-    return tagging_chain
+    def build():
+        llm = _get_llm(model, temperature)
+        return compaction_step("tagging") | TAGGING_PROMPT | llm.with_structured_output(TagResponse)
+
+    return _get_or_build_chain(("tagging", model, temperature, TagResponse), build)
+
+def get_structure_and_tag_chain():
+    """
+    Returns the shared LangChain runnable for fused PAR structuring + tagging.
+    Expects 'raw_transcript' as input.
+    Returns PARStructureWithTags object (one LLM call instead of structure → tag).
+    """
+    model = GEMINI_FLASH_MODEL
+    temperature = CHAIN_TEMPERATURES["structure_and_tag"]
+
+    def build():
+        llm = _get_llm(model, temperature)
+        return compaction_step("structure_and_tag") | STRUCTURE_AND_TAG_PROMPT | llm.with_structured_output(PARStructureWithTags)
+
+    return _get_or_build_chain(("structure_and_tag", model, temperature, PARStructureWithTags), build)
 
 def get_coaching_chain():
     """
-    Creates and returns the LangChain runnable for coaching insights.
+    Returns the shared LangChain runnable for coaching insights.
     Expects 'first_name', 'problem', 'action', 'result', 'tags', 'user_profile' as input.
     Returns CoachingResult object.
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY environment variable not set")
+    pro_model = GEMINI_PRO_MODEL
+    flash_model = GEMINI_FLASH_MODEL
+    temperature = CHAIN_TEMPERATURES["coaching"]
+
+    def build():
+        if fake_providers.LLM_PROVIDER != fake_providers.PROVIDER_FAKE:
+            _get_api_key()
+
+        # Try using the Pro model first for deeper reasoning, hedged with Flash
+        # when Pro is slow (or plain fallback on error, see ai/hedging.py)
+        try:
+            llm_pro = _get_llm(pro_model, temperature)
+            llm_flash = _get_llm(flash_model, temperature)
+
+            llm_with_fallback = hedged_or_fallback(llm_pro, llm_flash, pro_model, flash_model)
+
+            return compaction_step("coaching") | COACHING_PROMPT | llm_with_fallback.with_structured_output(CoachingResult)
+
+        except Exception as e:
+            logger.warning("Error configuring Pro model chain, falling back to Flash", extra={"error": str(e)})
+            llm_flash = _get_llm(flash_model, temperature)
+            return compaction_step("coaching") | COACHING_PROMPT | llm_flash.with_structured_output(CoachingResult)
+
+    return _get_or_build_chain(("coaching", pro_model, flash_model, temperature, CoachingResult), build)
 
-    # Try using the Pro model first for deeper reasoning
-    try:
-        # Higher temperature for coaching for slightly more diverse feedback
-        llm = ChatGoogleGenerativeAI(
-            model=GEMINI_PRO_MODEL,
-            google_api_key=api_key,
-            temperature=0.7,
-            verbose=True
-        )
-
-        # Bind structured output schema
-        coaching_chain = COACHING_PROMPT | llm.with_structured_output(CoachingResult)
-        
-        # We don't invoke here, so we wrap the chain in a way that handles lazy execution or just return it.
-        # However, LangChain chains are lazy. Validity of the model name might effectively be checked only when invoked.
-        # But ChatGoogleGenerativeAI might validate on init. Let's assume we return normally.
-        # To robustly handle fallback, we probably need a wrapper or just rely on the fact that if it fails later, the user sees an error.
-        # But the requirement was "fallback logic". LangChain doesn't make try/except around the returned runnable easy without a custom Runnable.
-        # A simple approach: Keep it as is, but we'll use a wrapper function in `get_coaching_agent` which is more complex.
-        # For this simple chain, let's keep it simple or use Fallback LLM if LangChain supports it.
-        # Actually, let's implement the fallback pattern by returning a chain that uses the `.with_fallbacks()` method if available, 
-        # or simplified: just use Pro. 
-        # Re-reading plan: "Update `get_coaching_chain()`: Use `GEMINI_PRO_MODEL` with fallback logic"
-        
-        llm_pro = ChatGoogleGenerativeAI(
-            model=GEMINI_PRO_MODEL,
-            google_api_key=api_key,
-            temperature=0.7,
-            verbose=True
-        )
-        
-        # Create a fallback LLM
-        llm_flash = ChatGoogleGenerativeAI(
-            model=GEMINI_FLASH_MODEL,
-            google_api_key=api_key,
-            temperature=0.7,
-            verbose=True
-        )
-        
-        # Use LangChain's built-in fallback mechanism
-        llm_with_fallback = llm_pro.with_fallbacks([llm_flash])
-        
-        coaching_chain = COACHING_PROMPT | llm_with_fallback.with_structured_output(CoachingResult)
-        
-        return coaching_chain
-
-    except Exception as e:
-        print(f"Error configuring Pro model chain, falling back to Flash: {e}")
-        llm_flash = ChatGoogleGenerativeAI(
-            model=GEMINI_FLASH_MODEL,
-            google_api_key=api_key,
-            temperature=0.7,
-            verbose=True
-        )
-        return COACHING_PROMPT | llm_flash.with_structured_output(CoachingResult)
+def get_fast_coaching_chain():
+    """
+    Returns the shared Flash-only coaching chain (same inputs and output as
+    get_coaching_chain). Used when the request's remaining time budget is too
+    small to risk a Pro call first.
+    """
+    model = GEMINI_FLASH_MODEL
+    temperature = CHAIN_TEMPERATURES["coaching"]
+
+    def build():
+        llm_flash = _get_llm(model, temperature)
+        return compaction_step("coaching") | COACHING_PROMPT | llm_flash.with_structured_output(CoachingResult)
+
+    return _get_or_build_chain(("coaching_fast", model, temperature, CoachingResult), build)
 
 def get_memory_summarization_chain():
     """
-    Creates and returns the LangChain runnable for memory entry summarization.
+    Returns the shared LangChain runnable for memory entry summarization.
     Expects 'text_chunk' as input.
     Returns MemoryEntryStructure object.
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY environment variable not set")
-
     # Use Gemini 2.0 Flash for speed and extraction quality
-    llm = ChatGoogleGenerativeAI(
-        model=GEMINI_FLASH_MODEL,
-        google_api_key=api_key,
-        temperature=0.0, # Cold for factual extraction
-        verbose=True
-    )
+    model = GEMINI_FLASH_MODEL
+    temperature = CHAIN_TEMPERATURES["memory_summarization"]
 
-    # Bind structured output schema
-    summarization_chain = MEMORY_SUMMARIZATION_PROMPT | llm.with_structured_output(MemoryEntryStructure)
-    
-    return summarization_chain
+    def build():
+        llm = _get_llm(model, temperature)
+        return compaction_step("memory_summarization") | MEMORY_SUMMARIZATION_PROMPT | llm.with_structured_output(MemoryEntryStructure)
 
-def get_coaching_agent(user_id: str):
+    return _get_or_build_chain(("memory_summarization", model, temperature, MemoryEntryStructure), build)
+
+class AgentThoughtLogger(BaseCallbackHandler):
     """
-    Creates and returns a tool-calling AgentExecutor for coaching.
+    Logs the agent's tool usage as sampled trace records (previews only).
+
+    Tool callbacks only reach it when it's passed in the run config (see
+    AGENT_RUN_CALLBACKS); as an executor callback it only sees the finish.
+    """
+
+    # Just builds a LogRecord and enqueues it, so no need for a worker thread
+    run_inline = True
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs) -> None:
+        input_preview = input_str[:150] + "..." if len(str(input_str)) > 150 else input_str
+        trace_logger.info("Tool call", extra={"tool": serialized.get("name", "unknown"), "input": input_preview})
+
+    def on_tool_end(self, output: Any, **kwargs) -> None:
+        output = str(output)
+        output_preview = output[:200] + "..." if len(output) > 200 else output
+        trace_logger.info("Tool result", extra={"output": output_preview})
+
+    def on_tool_error(self, error: BaseException, **kwargs) -> None:
+        trace_logger.warning("Tool error", extra={"error": str(error)})
+
+    def on_agent_finish(self, finish, **kwargs) -> None:
+        trace_logger.info("Agent finished generating coaching insights")
+
+
+AGENT_THOUGHT_LOGGER = AgentThoughtLogger()
+
+# Pass as config={"callbacks": AGENT_RUN_CALLBACKS} so tool calls are timed and traced
+AGENT_RUN_CALLBACKS = [METRICS_CALLBACKS, AGENT_THOUGHT_LOGGER]
+
+# Max agent reasoning/tool steps per coaching run
+AI_AGENT_MAX_ITERATIONS = int(os.getenv("AI_AGENT_MAX_ITERATIONS", "6"))
+
+def get_coaching_agent(fast: bool = False):
+    """
+    Returns the shared tool-calling AgentExecutor for coaching.
+
+    The agent and its tools are built once per worker. Tools look up the user
+    per run, so bind it around each invocation:
+
+        with user_scope(user_id):  # from ai.run_context
+            await get_coaching_agent().ainvoke(inputs)
+
+    The agent uses Pro hedged with Flash, or Flash only when `fast` is set
+    (callers pass fast=True when the request's time budget is low). It stops
+    after AI_AGENT_MAX_ITERATIONS steps; wall-clock limits come from the
+    request deadline (see ai/deadline.py).
 
     The agent has access to 10 tools:
     - search_memory: Search user's personal memory database
@@ -166,58 +323,36 @@ def get_coaching_agent(user_id: str):
 
     Returns AgentExecutor that behaves like a chain (invoke returns dict).
     """
-    from langchain.callbacks.base import BaseCallbackHandler
-    from typing import Any, Dict, List
-    
-    class AgentThoughtLogger(BaseCallbackHandler):
-        """Lightweight callback handler that logs tool usage without overwhelming output."""
-        
-        def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs) -> None:
-            tool_name = serialized.get("name", "unknown")
-            print(f"\n🔧 TOOL CALL: {tool_name}")
-            input_preview = input_str[:150] + "..." if len(str(input_str)) > 150 else input_str
-            print(f"   Input: {input_preview}")
-        
-        def on_tool_end(self, output: str, **kwargs) -> None:
-            output_preview = output[:200] + "..." if len(output) > 200 else output
-            print(f"   ✅ Result: {output_preview}")
-        
-        def on_tool_error(self, error: Exception, **kwargs) -> None:
-            print(f"   ❌ Error: {str(error)}")
-        
-        def on_agent_finish(self, finish, **kwargs) -> None:
-            print("\n✅ Agent finished generating coaching insights")
-    
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY environment variable not set")
+    pro_model = GEMINI_PRO_MODEL
+    flash_model = GEMINI_FLASH_MODEL
+    temperature = CHAIN_TEMPERATURES["coaching_agent"]
 
-    llm_pro = ChatGoogleGenerativeAI(
-        model=GEMINI_PRO_MODEL,
-        google_api_key=api_key,
-        temperature=0.5,
-        verbose=False
-    )
-    
-    llm_flash = ChatGoogleGenerativeAI(
-        model=GEMINI_FLASH_MODEL,
-        google_api_key=api_key,
-        temperature=0.5,
-        verbose=False
-    )
-    
-    # Configure fallback
-    llm_with_fallback = llm_pro.with_fallbacks([llm_flash])
+    def build():
+        return _build_coaching_agent(pro_model, flash_model, temperature, fast)
+
+    key = ("coaching_agent", None if fast else pro_model, flash_model, temperature)
+    return _get_or_build_chain(key, build)
 
-    tools = create_user_tools(user_id)
+def _build_coaching_agent(pro_model: str, flash_model: str, temperature: float, fast: bool):
+    """Construct the coaching AgentExecutor (clients, user-agnostic tools, agent)."""
+    llm_flash = _get_llm(flash_model, temperature, verbose=False)
+    if fast:
+        llm = llm_flash
+    else:
+        llm_pro = _get_llm(pro_model, temperature, verbose=False)
+        # Hedge slow Pro calls with Flash (or plain fallback on error)
+        llm = hedged_or_fallback(llm_pro, llm_flash, pro_model, flash_model)
 
-    agent = create_tool_calling_agent(llm_with_fallback, tools, COACHING_AGENT_PROMPT)
+    # No user_id: tools read the run's user from ai.run_context
+    tools = create_user_tools()
 
-    thought_logger = AgentThoughtLogger()
+    # Inputs are compacted to the agent's token budget before every model step
+    agent = compaction_step("coaching_agent") | create_tool_calling_agent(llm, tools, COACHING_AGENT_PROMPT)
 
     return AgentExecutor(
         agent=agent,
         tools=tools,
         verbose=False,  # Disable default verbose output
-        callbacks=[thought_logger]
+        max_iterations=AI_AGENT_MAX_ITERATIONS,
+        callbacks=[AGENT_THOUGHT_LOGGER]
     )
@@ -0,0 +1,123 @@
+"""
+Request-level latency budgets for coaching.
+
+A Deadline is started when a request's analysis begins (after transcription,
+which has its own stage timeout) and is carried in a context variable, so the
+coaching agent, its tools and the fallback chain all see the same budget
+without threading it through every call:
+
+- The agent only starts if enough budget is left after reserving time for
+  the fallback chain, and is cancelled when that share runs out.
+- Tools return a "budget exhausted, answer now" message instead of running
+  once the remaining time drops below AI_TOOL_MIN_SECONDS, so the agent
+  stops calling tools and writes its answer.
+- The Pro model is only used while the remaining budget is at least
+  AI_PRO_MIN_SECONDS; below that the Flash-only agent / chain is used.
+"""
+import asyncio
+import contextlib
+import os
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Total budget for the analysis part of /ai/process and for /ai/coach (seconds)
+AI_REQUEST_BUDGET_SECONDS = float(os.getenv("AI_REQUEST_BUDGET_SECONDS", "120"))
+# Time kept back for the fallback coaching chain when the agent runs
+AI_COACH_FALLBACK_RESERVE_SECONDS = float(os.getenv("AI_COACH_FALLBACK_RESERVE_SECONDS", "25"))
+# Don't start the agent with less than this much of its share left
+AI_AGENT_MIN_SECONDS = float(os.getenv("AI_AGENT_MIN_SECONDS", "15"))
+# Below this much remaining budget, skip the Pro model and use Flash directly
+AI_PRO_MIN_SECONDS = float(os.getenv("AI_PRO_MIN_SECONDS", "45"))
+# Below this much remaining budget (beyond the fallback reserve), tools stop running
+AI_TOOL_MIN_SECONDS = float(os.getenv("AI_TOOL_MIN_SECONDS", "10"))
+
+BUDGET_EXHAUSTED_TOOL_MESSAGE = (
+    "Skipped: the time budget for this request is nearly used up. "
+    "Do not call any more tools; write your final answer now using what you already know."
+)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work can't finish within the request's remaining budget."""
+
+
+class Deadline:
+    """A point in time (monotonic clock) by which a request should be finished."""
+
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("ai_request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Return the deadline of the request being handled, if one was started."""
+    return _current_deadline.get()
+
+
+@contextlib.contextmanager
+def activate_deadline(deadline: Deadline) -> Iterator[Deadline]:
+    """
+    Make `deadline` the current one for the enclosed block.
+
+    An already-active deadline is kept if it is tighter, so nested scopes
+    never extend the budget.
+    """
+    outer = _current_deadline.get()
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def deadline_scope(budget_seconds: float = AI_REQUEST_BUDGET_SECONDS):
+    """Start a new deadline of `budget_seconds` for the enclosed block."""
+    return activate_deadline(Deadline(budget_seconds))
+
+
+def remaining_budget(default: float = AI_REQUEST_BUDGET_SECONDS) -> float:
+    """Seconds left on the current deadline, or `default` if none is active."""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline is not None else default
+
+
+def tool_budget_exhausted() -> bool:
+    """True when tools should stop running so the agent can finish in time."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return False
+    return deadline.remaining() < AI_COACH_FALLBACK_RESERVE_SECONDS + AI_TOOL_MIN_SECONDS
+
+
+async def within_budget(awaitable: Awaitable[T], reserve: float = 0.0) -> T:
+    """
+    Await `awaitable`, cancelling it if it would eat into the last `reserve`
+    seconds of the current deadline.
+
+    Raises:
+        DeadlineExceeded: if no budget is left or the call runs out of time
+    """
+    timeout = remaining_budget() - reserve
+    if timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("No time budget left for this call")
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Call exceeded its remaining budget of {timeout:.1f}s")
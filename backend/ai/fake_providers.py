@@ -0,0 +1,360 @@
+"""
+Offline stand-ins for Gemini, Speech-to-Text and Tavily, for load testing.
+
+Select them with environment variables (each defaults to AI_PROVIDER, which
+defaults to "live"):
+
+    AI_PROVIDER=fake              # everything below at once
+    AI_LLM_PROVIDER=fake          # chains.py Gemini clients
+    AI_SPEECH_PROVIDER=fake       # transcriber.transcribe_audio_file
+    AI_SEARCH_PROVIDER=fake       # tools._get_tavily_tool
+
+Outputs are deterministic functions of the input: the same transcript always
+structures, tags and coaches the same way, and always passes schema
+validation (PARStructure, TagResponse, CoachingResult, ...). Latency and
+failures are sampled from configurable distributions (see LatencyModel and
+FaultModel) using a seeded RNG, so a load test run is reproducible.
+
+Latency spec: "<kind>:<params>" in seconds, one of
+    fixed:0.5 | uniform:0.2,1.5 | normal:1,0.2 | lognormal:<median>,<sigma> | exponential:<mean>
+Error spec: comma-separated "<rate>:<kind>" with kind one of
+    error (RuntimeError) | rate_limit (HTTP 429 ResourceExhausted) | timeout (TimeoutError)
+e.g. AI_FAKE_LLM_ERRORS="0.02:rate_limit,0.005:error".
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from google.api_core.exceptions import ResourceExhausted
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, ConfigDict
+
+from ai.schemas import (
+    CoachingResult, MemoryEntryStructure, PARStructure, PARStructureWithTags, TagResponse
+)
+from models.tag_models import CompetencyTag
+
+PROVIDER_LIVE = "live"
+PROVIDER_FAKE = "fake"
+
+_DEFAULT_PROVIDER = os.getenv("AI_PROVIDER", PROVIDER_LIVE).lower()
+LLM_PROVIDER = os.getenv("AI_LLM_PROVIDER", _DEFAULT_PROVIDER).lower()
+SPEECH_PROVIDER = os.getenv("AI_SPEECH_PROVIDER", _DEFAULT_PROVIDER).lower()
+SEARCH_PROVIDER = os.getenv("AI_SEARCH_PROVIDER", _DEFAULT_PROVIDER).lower()
+
+# Seed for the latency/error RNG
+AI_FAKE_SEED = int(os.getenv("AI_FAKE_SEED", "0"))
+# Per-call latency distributions (seconds); Pro defaults slower than Flash, like the real models
+AI_FAKE_FLASH_LATENCY = os.getenv("AI_FAKE_FLASH_LATENCY", "lognormal:1.2,0.4")
+AI_FAKE_PRO_LATENCY = os.getenv("AI_FAKE_PRO_LATENCY", "lognormal:4,0.6")
+AI_FAKE_SPEECH_LATENCY = os.getenv("AI_FAKE_SPEECH_LATENCY", "lognormal:3,0.5")
+AI_FAKE_SEARCH_LATENCY = os.getenv("AI_FAKE_SEARCH_LATENCY", "lognormal:0.8,0.4")
+# Failure mixes (empty = never fail)
+AI_FAKE_LLM_ERRORS = os.getenv("AI_FAKE_LLM_ERRORS", "")
+AI_FAKE_SPEECH_ERRORS = os.getenv("AI_FAKE_SPEECH_ERRORS", "")
+AI_FAKE_SEARCH_ERRORS = os.getenv("AI_FAKE_SEARCH_ERRORS", "")
+
+SAMPLE_TRANSCRIPTS_DIR = Path(__file__).parent.parent / "samples" / "transcripts"
+
+
+# =============================================================================
+# LATENCY AND FAULT MODELS
+# =============================================================================
+
+_rng = random.Random(AI_FAKE_SEED)
+_rng_lock = threading.Lock()
+
+
+def reseed(seed: int = AI_FAKE_SEED) -> None:
+    """Restart the latency/error sequence (e.g. between load test runs)."""
+    with _rng_lock:
+        _rng.seed(seed)
+
+
+def _draw() -> float:
+    with _rng_lock:
+        return _rng.random()
+
+
+def _gauss() -> float:
+    with _rng_lock:
+        return _rng.gauss(0, 1)
+
+
+class LatencyModel:
+    """A latency distribution parsed from a spec string like "lognormal:1.2,0.4"."""
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid latency spec '{spec}'")
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = p[0] + (p[1] - p[0]) * _draw()
+        elif self.kind == "normal":
+            value = p[0] + p[1] * _gauss()
+        elif self.kind == "lognormal":
+            value = p[0] * math.exp(p[1] * _gauss())
+        else:
+            value = -p[0] * math.log(1 - _draw())
+        return max(0.0, value)
+
+
+class FaultModel:
+    """Independent failure kinds with their rates, parsed from "0.02:rate_limit,0.01:error"."""
+
+    KINDS = ("error", "rate_limit", "timeout")
+
+    def __init__(self, spec: str):
+        self.faults: List[Tuple[float, str]] = []
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            rate, _, kind = part.partition(":")
+            kind = kind.strip().lower() or "error"
+            if kind not in self.KINDS:
+                raise ValueError(f"Invalid fault kind '{kind}' in '{spec}'")
+            self.faults.append((float(rate), kind))
+
+    def sample(self) -> Optional[str]:
+        """Return the failure kind for this call, or None."""
+        if not self.faults:
+            return None
+        roll = _draw()
+        for rate, kind in self.faults:
+            if roll < rate:
+                return kind
+            roll -= rate
+        return None
+
+    @staticmethod
+    def exception(kind: str, provider: str) -> Exception:
+        if kind == "rate_limit":
+            return ResourceExhausted(f"429 Fake {provider} quota exceeded")
+        if kind == "timeout":
+            return TimeoutError(f"Fake {provider} call timed out")
+        return RuntimeError(f"Fake {provider} error")
+
+
+def _simulate_sync(latency: LatencyModel, faults: FaultModel, provider: str) -> None:
+    fault = faults.sample()
+    time.sleep(latency.sample())
+    if fault:
+        raise FaultModel.exception(fault, provider)
+
+
+async def _simulate_async(latency: LatencyModel, faults: FaultModel, provider: str) -> None:
+    fault = faults.sample()
+    await asyncio.sleep(latency.sample())
+    if fault:
+        raise FaultModel.exception(fault, provider)
+
+
+def _seeded(*parts: str) -> random.Random:
+    """RNG derived from the call's inputs, so outputs never depend on call order."""
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+# =============================================================================
+# DETERMINISTIC STRUCTURED OUTPUTS
+# =============================================================================
+
+TAG_NAMES = CompetencyTag.list_values()
+
+
+def _thirds(text: str) -> Tuple[str, str, str]:
+    words = text.split() or ["(empty)"]
+    size = max(1, math.ceil(len(words) / 3))
+    parts = [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+    while len(parts) < 3:
+        parts.append(parts[-1])
+    return parts[0], parts[1], " ".join(parts[2:])
+
+
+def _fake_structure(text: str, rng: random.Random) -> Dict[str, Any]:
+    problem, action, result = _thirds(text)
+    title = " ".join(text.split()[:6]).strip(".,;:!?") or "Untitled story"
+    return {
+        "title": title.title(),
+        "problem": problem,
+        "action": action,
+        "result": result,
+        "confidence_score": round(0.6 + 0.35 * rng.random(), 2),
+        "warnings": [],
+    }
+
+
+def _fake_tags(rng: random.Random) -> List[Dict[str, Any]]:
+    tags = rng.sample(TAG_NAMES, rng.randint(1, 3))
+    return [
+        {"tag": tag, "confidence": round(0.95 - 0.15 * i, 2),
+         "reasoning": f"The story shows {tag.lower()} in how the problem was handled."}
+        for i, tag in enumerate(tags)
+    ]
+
+
+def _fake_insight(kind: str, rng: random.Random) -> Dict[str, str]:
+    return {
+        "overview": f"Fake {kind} insight #{rng.randint(1, 999)}.",
+        "detail": f"Deterministic placeholder {kind} detail generated offline for load testing.",
+    }
+
+
+def _fake_coaching(rng: random.Random) -> Dict[str, Any]:
+    return {kind: _fake_insight(kind, rng) for kind in ("strength", "gap", "suggestion")}
+
+
+def fake_output(schema: Type[BaseModel], text: str, seed: str = "") -> BaseModel:
+    """Build a valid `schema` instance determined by `text` (the prompt)."""
+    rng = _seeded(schema.__name__, seed, text)
+    if schema is PARStructureWithTags:
+        data = {**_fake_structure(text, rng), "tags": _fake_tags(rng)}
+    elif issubclass(schema, PARStructure):
+        data = _fake_structure(text, rng)
+    elif schema is TagResponse:
+        data = {"tags": _fake_tags(rng)}
+    elif schema is CoachingResult:
+        data = _fake_coaching(rng)
+    elif schema is MemoryEntryStructure:
+        data = {
+            "summary": text[:1000] or "(empty document)",
+            "category": rng.choice(["experience", "skill", "education", "achievement", "other"]),
+            "detected_source_type": "other",
+            "context": ", ".join(sorted(set(text.lower().split()))[:10]),
+        }
+    else:
+        raise TypeError(f"Fake provider has no output for schema {schema.__name__}; "
+                        "add it to fake_output() before routing that chain to the fake model")
+    return schema.model_validate(data)
+
+
+# =============================================================================
+# FAKE CHAT MODEL (Gemini stand-in)
+# =============================================================================
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    # The human turn carries the variable inputs (transcript / PAR story); system prompts are constant
+    human = [m.content for m in messages if m.type == "human" and isinstance(m.content, str)]
+    return "\n".join(human) if human else "\n".join(str(m.content) for m in messages)
+
+
+class FakeGeminiChatModel(BaseChatModel):
+    """
+    Chat model answering in JSON without calling any API.
+
+    with_structured_output(schema) emits JSON for a valid `schema` instance and
+    parses it back, like the real structured-output path. Tool-calling agents
+    (bind_tools) get a final coaching JSON answer straight away.
+    """
+
+    model: str
+    temperature: float = 0.0
+    latency: LatencyModel
+    faults: FaultModel
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "temperature": self.temperature}
+
+    def _get_ls_params(self, stop=None, **kwargs) -> Dict[str, Any]:
+        params = super()._get_ls_params(stop=stop, **kwargs)
+        params["ls_model_name"] = self.model
+        return params
+
+    def _respond(self, messages: List[BaseMessage], schema: Optional[Type[BaseModel]]) -> ChatResult:
+        text = _prompt_text(messages)
+        if schema is not None:
+            content = fake_output(schema, text, self.model).model_dump_json()
+        else:
+            # Agent final answer: coaching JSON plus the internal reasoning field
+            coaching = fake_output(CoachingResult, text, self.model).model_dump()
+            content = json.dumps({**coaching, "_reasoning": "Fake agent: answered without tool calls."})
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages, stop=None, run_manager=None, fake_schema=None, **kwargs) -> ChatResult:
+        _simulate_sync(self.latency, self.faults, self.model)
+        return self._respond(messages, fake_schema)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, fake_schema=None, **kwargs) -> ChatResult:
+        await _simulate_async(self.latency, self.faults, self.model)
+        return self._respond(messages, fake_schema)
+
+    def with_structured_output(self, schema, **kwargs) -> Runnable:
+        return self.bind(fake_schema=schema) | RunnableLambda(
+            lambda message: schema.model_validate_json(message.content)
+        )
+
+    def bind_tools(self, tools, **kwargs) -> Runnable:
+        return self
+
+
+def fake_chat_model(model: str, temperature: float) -> FakeGeminiChatModel:
+    latency = AI_FAKE_PRO_LATENCY if "pro" in model.lower() else AI_FAKE_FLASH_LATENCY
+    return FakeGeminiChatModel(
+        model=model, temperature=temperature,
+        latency=LatencyModel(latency), faults=FaultModel(AI_FAKE_LLM_ERRORS)
+    )
+
+
+# =============================================================================
+# FAKE SPEECH-TO-TEXT AND SEARCH
+# =============================================================================
+
+def _sample_transcripts() -> List[str]:
+    paths = sorted(SAMPLE_TRANSCRIPTS_DIR.glob("*.txt"))
+    return [p.read_text(encoding="utf-8").strip() for p in paths] or [
+        "I noticed our deploys kept failing, so I rebuilt the pipeline and cut failures by half."
+    ]
+
+
+def fake_transcribe(file_path: str) -> str:
+    """Return one of the sample transcripts, chosen by the audio file's content (blocking, like the real client)."""
+    with open(file_path, "rb") as audio_file:
+        digest = hashlib.sha256(audio_file.read()).hexdigest()
+    _simulate_sync(LatencyModel(AI_FAKE_SPEECH_LATENCY), FaultModel(AI_FAKE_SPEECH_ERRORS), "speech-to-text")
+    transcripts = _sample_transcripts()
+    return transcripts[int(digest, 16) % len(transcripts)]
+
+
+class FakeTavilySearch:
+    """Stand-in for TavilySearchResults: invoke(query) returns result dicts."""
+
+    def __init__(self, max_results: int = 3):
+        self.max_results = max_results
+        self.latency = LatencyModel(AI_FAKE_SEARCH_LATENCY)
+        self.faults = FaultModel(AI_FAKE_SEARCH_ERRORS)
+
+    def invoke(self, query: str) -> List[Dict[str, str]]:
+        _simulate_sync(self.latency, self.faults, "tavily")
+        rng = _seeded("tavily", query)
+        slug = "-".join(query.lower().split()[:6])
+        return [
+            {
+                "title": f"{query} — result {i + 1}",
+                "content": f"Offline search result {rng.randint(1000, 9999)} for '{query}'.",
+                "url": f"https://example.com/{slug}/{i + 1}",
+            }
+            for i in range(self.max_results)
+        ]
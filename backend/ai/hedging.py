@@ -0,0 +1,287 @@
+"""
+Latency-hedged execution across two models (Pro first, Flash as the hedge).
+
+`llm_pro.with_fallbacks([llm_flash])` only switches to Flash after Pro raises,
+so a slow Pro call still costs its full latency. HedgedRunnable instead starts
+Pro, and if it hasn't answered within the hedge delay, starts Flash in
+parallel. The first valid result wins (a call that raises, e.g. on a schema
+parse failure, is not valid) and the other call is cancelled.
+
+The hedge delay is the AI_HEDGE_PERCENTILE latency of recent Pro calls,
+clamped to [AI_HEDGE_MIN_DELAY_SECONDS, AI_HEDGE_MAX_DELAY_SECONDS], or
+AI_HEDGE_DEFAULT_DELAY_SECONDS until AI_HEDGE_MIN_SAMPLES calls have been seen.
+Per-model latency histograms are kept for tuning (see get_latency_histograms).
+
+Sync invoke() keeps failure-only fallback; hedging needs the event loop.
+With AI_LLM_HEDGING off, FallbackRunnable does failure-only fallback on both
+paths. Either way the model that answered is recorded (track_models).
+"""
+import asyncio
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+logger = logging.getLogger(__name__)
+
+AI_LLM_HEDGING = os.getenv("AI_LLM_HEDGING", "true").lower() not in ("0", "false", "no")
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "90"))
+AI_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("AI_HEDGE_DEFAULT_DELAY_SECONDS", "8"))
+AI_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("AI_HEDGE_MIN_DELAY_SECONDS", "1"))
+AI_HEDGE_MAX_DELAY_SECONDS = float(os.getenv("AI_HEDGE_MAX_DELAY_SECONDS", "30"))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90, 120)
+# Recent samples kept per model for percentile estimates
+LATENCY_WINDOW = 500
+
+
+# =============================================================================
+# LATENCY HISTOGRAMS
+# =============================================================================
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus a sliding window of recent samples."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window: int = LATENCY_WINDOW):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+            self._recent.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """p-th percentile (0-100) of recent samples, or None if there are none."""
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))
+        return samples[index]
+
+    @property
+    def recent_count(self) -> int:
+        return len(self._recent)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cumulative bucket counts (Prometheus-style `le` buckets), count, sum and key percentiles."""
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+        cumulative, running = [], 0
+        for le, n in zip(list(self.buckets) + ["+Inf"], counts):
+            running += n
+            cumulative.append((le, running))
+        return {
+            "buckets": cumulative,
+            "count": count,
+            "sum": total,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+_histograms: Dict[str, LatencyHistogram] = {}
+# Guards _histograms and _wins (sync invoke records from worker threads)
+_histograms_lock = threading.Lock()
+
+# {model_name: number of hedged/fallback calls it won}
+_wins: Dict[str, int] = {}
+
+
+def get_latency_histogram(model: str) -> LatencyHistogram:
+    histogram = _histograms.get(model)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(model, LatencyHistogram())
+    return histogram
+
+
+def get_latency_histograms() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every model's latency histogram."""
+    return {model: histogram.snapshot() for model, histogram in list(_histograms.items())}
+
+
+def get_model_wins() -> Dict[str, int]:
+    with _histograms_lock:
+        return dict(_wins)
+
+
+def hedge_delay(model: str) -> float:
+    """Seconds to wait for `model` before starting the hedge call."""
+    histogram = _histograms.get(model)
+    if histogram is None or histogram.recent_count < AI_HEDGE_MIN_SAMPLES:
+        return AI_HEDGE_DEFAULT_DELAY_SECONDS
+    delay = histogram.percentile(AI_HEDGE_PERCENTILE)
+    return min(AI_HEDGE_MAX_DELAY_SECONDS, max(AI_HEDGE_MIN_DELAY_SECONDS, delay))
+
+
+# =============================================================================
+# WINNING-MODEL TRACKING
+# =============================================================================
+
+_models_used: ContextVar[Optional[List[str]]] = ContextVar("models_used", default=None)
+
+
+@contextlib.contextmanager
+def track_models() -> Iterator[List[str]]:
+    """Collect, in order, the model that answered each hedged call in the enclosed block."""
+    models: List[str] = []
+    token = _models_used.set(models)
+    try:
+        yield models
+    finally:
+        _models_used.reset(token)
+
+
+def record_model(model: str) -> None:
+    """Note that `model` produced a result for the current request."""
+    with _histograms_lock:
+        _wins[model] = _wins.get(model, 0) + 1
+    models = _models_used.get()
+    if models is not None:
+        models.append(model)
+
+
+# =============================================================================
+# HEDGED RUNNABLE
+# =============================================================================
+
+class HedgedRunnable(Runnable):
+    """
+    Run `primary`, hedging with `secondary` when primary is slow; first valid result wins.
+
+    Wraps either chat models (bind_tools / with_structured_output are applied
+    to both sides) or whole chains.
+    """
+
+    def __init__(self, primary: Runnable, secondary: Runnable, primary_name: str, secondary_name: str):
+        self.primary = primary
+        self.secondary = secondary
+        self.primary_name = primary_name
+        self.secondary_name = secondary_name
+
+    def bind_tools(self, *args, **kwargs) -> "HedgedRunnable":
+        return type(self)(
+            self.primary.bind_tools(*args, **kwargs), self.secondary.bind_tools(*args, **kwargs),
+            self.primary_name, self.secondary_name
+        )
+
+    def with_structured_output(self, *args, **kwargs) -> "HedgedRunnable":
+        return type(self)(
+            self.primary.with_structured_output(*args, **kwargs),
+            self.secondary.with_structured_output(*args, **kwargs),
+            self.primary_name, self.secondary_name
+        )
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        try:
+            result = self._timed_invoke(self.primary, self.primary_name, input, config, **kwargs)
+            record_model(self.primary_name)
+        except Exception as e:
+            logger.warning("Primary model failed, falling back",
+                           extra={"primary": self.primary_name, "secondary": self.secondary_name, "error": str(e)})
+            result = self._timed_invoke(self.secondary, self.secondary_name, input, config, **kwargs)
+            record_model(self.secondary_name)
+        return result
+
+    @staticmethod
+    def _timed_invoke(runnable: Runnable, name: str, input: Any, config, **kwargs) -> Any:
+        start = time.monotonic()
+        try:
+            return runnable.invoke(input, config, **kwargs)
+        finally:
+            get_latency_histogram(name).record(time.monotonic() - start)
+
+    async def _timed_ainvoke(self, runnable: Runnable, name: str, input: Any, config, **kwargs) -> Any:
+        start = time.monotonic()
+        try:
+            return await runnable.ainvoke(input, config, **kwargs)
+        finally:
+            # Cancelled calls are recorded at the time they were cut off (a lower
+            # bound), so slow primaries still pull the percentile up
+            get_latency_histogram(name).record(time.monotonic() - start)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        names = {}
+        primary_task = asyncio.ensure_future(
+            self._timed_ainvoke(self.primary, self.primary_name, input, config, **kwargs)
+        )
+        names[primary_task] = self.primary_name
+        pending = {primary_task}
+
+        try:
+            done, _ = await asyncio.wait(pending, timeout=hedge_delay(self.primary_name))
+            if done and primary_task.exception() is None:
+                record_model(self.primary_name)
+                return primary_task.result()
+            if done:
+                logger.warning("Primary model failed, falling back", extra={
+                    "primary": self.primary_name, "secondary": self.secondary_name,
+                    "error": str(primary_task.exception()),
+                })
+                pending = set()
+            else:
+                logger.info("Primary model slower than hedge delay, starting hedge call",
+                            extra={"primary": self.primary_name, "secondary": self.secondary_name})
+
+            secondary_task = asyncio.ensure_future(
+                self._timed_ainvoke(self.secondary, self.secondary_name, input, config, **kwargs)
+            )
+            names[secondary_task] = self.secondary_name
+            pending.add(secondary_task)
+
+            errors = [primary_task.exception()] if done else []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer the primary on a tie
+                for task in sorted(done, key=lambda t: t is not primary_task):
+                    if task.exception() is None:
+                        record_model(names[task])
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+
+class FallbackRunnable(HedgedRunnable):
+    """Failure-only fallback from `primary` to `secondary` (no hedging), recording the model that answered."""
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        try:
+            result = await self._timed_ainvoke(self.primary, self.primary_name, input, config, **kwargs)
+            record_model(self.primary_name)
+        except Exception as e:
+            logger.warning("Primary model failed, falling back",
+                           extra={"primary": self.primary_name, "secondary": self.secondary_name, "error": str(e)})
+            result = await self._timed_ainvoke(self.secondary, self.secondary_name, input, config, **kwargs)
+            record_model(self.secondary_name)
+        return result
+
+
+def hedged_or_fallback(primary: Runnable, secondary: Runnable, primary_name: str, secondary_name: str) -> Runnable:
+    """Hedge primary with secondary when AI_LLM_HEDGING is on, else plain failure fallback."""
+    if AI_LLM_HEDGING:
+        return HedgedRunnable(primary, secondary, primary_name, secondary_name)
+    return FallbackRunnable(primary, secondary, primary_name, secondary_name)
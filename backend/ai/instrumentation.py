@@ -0,0 +1,113 @@
+"""
+LangChain callback handler feeding the /metrics histograms.
+
+METRICS_CALLBACKS is attached to every shared Gemini client (LLM call
+latency) and passed in the run config of coaching agent runs, which is the
+only way tool callbacks fire: AgentExecutor constructor callbacks are not
+inherited by the tools it calls.
+
+Also exports ai.hedging's per-model latency histograms and win counts.
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from ai.hedging import get_latency_histograms, get_model_wins
+from metrics import (
+    LLM_SECONDS, OUTCOME_ERROR, OUTCOME_OK, TOOL_SECONDS, current_route, outcome_for, register_collector
+)
+
+# Runs that never report an end (e.g. a tool cancelled mid-call) are dropped
+# once this many are in flight
+MAX_OPEN_RUNS = 10_000
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times tool and LLM runs by run_id (start/end callbacks)."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._open: Dict[UUID, tuple] = {}
+        # Tool callbacks fire from the worker threads running concurrent tools
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str) -> None:
+        with self._lock:
+            if len(self._open) >= MAX_OPEN_RUNS:
+                self._open.pop(next(iter(self._open)), None)
+            self._open[run_id] = (time.perf_counter(), name)
+
+    def _finish(self, run_id: UUID, histogram, outcome: str) -> None:
+        with self._lock:
+            started = self._open.pop(run_id, None)
+        if started is None:
+            return
+        start, name = started
+        histogram.observe(time.perf_counter() - start, (current_route(), name, outcome))
+
+    # Tools -------------------------------------------------------------------
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs) -> None:
+        self._start(run_id, kwargs.get("name") or (serialized or {}).get("name") or "unknown")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs) -> None:
+        self._finish(run_id, TOOL_SECONDS, OUTCOME_OK)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._finish(run_id, TOOL_SECONDS, outcome_for(type(error)))
+
+    # LLMs --------------------------------------------------------------------
+
+    @staticmethod
+    def _model_name(serialized: Optional[Dict[str, Any]], metadata: Optional[Dict[str, Any]],
+                    invocation_params: Optional[Dict[str, Any]]) -> str:
+        for source in (metadata, invocation_params, (serialized or {}).get("kwargs")):
+            if source:
+                model = source.get("ls_model_name") or source.get("model") or source.get("model_name")
+                if model:
+                    return str(model).removeprefix("models/")
+        return "unknown"
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs) -> None:
+        self._start(run_id, self._model_name(serialized, metadata, kwargs.get("invocation_params")))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, *, run_id: UUID,
+                     metadata: Optional[Dict[str, Any]] = None, **kwargs) -> None:
+        self._start(run_id, self._model_name(serialized, metadata, kwargs.get("invocation_params")))
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs) -> None:
+        self._finish(run_id, LLM_SECONDS, OUTCOME_OK)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._finish(run_id, LLM_SECONDS, outcome_for(type(error)) if error is not None else OUTCOME_ERROR)
+
+
+# Shared instance: LangChain de-duplicates a handler that is both attached to a
+# client and passed in the run config, so calls are never counted twice
+METRICS_CALLBACKS = MetricsCallbackHandler()
+
+
+def _render_hedging_metrics() -> List[str]:
+    """Exposition lines for the hedge-delay latency histograms and hedged-call winners."""
+    name = "parfolio_hedged_model_latency_seconds"
+    lines = [f"# HELP {name} Latency of hedged Pro/Flash calls (drives the hedge delay).",
+             f"# TYPE {name} histogram"]
+    for model, snapshot in sorted(get_latency_histograms().items()):
+        for le, count in snapshot["buckets"]:
+            lines.append(f'{name}_bucket{{model="{model}",le="{le}"}} {count}')
+        lines.append(f'{name}_sum{{model="{model}"}} {snapshot["sum"]}')
+        lines.append(f'{name}_count{{model="{model}"}} {snapshot["count"]}')
+
+    name = "parfolio_hedged_model_wins_total"
+    lines += [f"# HELP {name} Hedged or fallback calls answered by each model.", f"# TYPE {name} counter"]
+    for model, wins in sorted(get_model_wins().items()):
+        lines.append(f'{name}{{model="{model}"}} {wins}')
+    return lines
+
+
+register_collector(_render_hedging_metrics)
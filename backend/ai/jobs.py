@@ -0,0 +1,355 @@
+"""
+Durable background job queue for long-running AI work (e.g. /ai/process on long recordings).
+
+Jobs are persisted in a JobStore so they survive worker restarts:
+- SQLiteJobStore (local development, default): data/jobs.sqlite3, shared by
+  every uvicorn worker on the node.
+- FirestoreJobStore (ENVIRONMENT=production): the `ai_jobs` collection.
+
+Each worker process runs a JobQueue with a bounded number of concurrent jobs.
+Workers claim queued jobs atomically from the store, so a job submitted to one
+worker can be picked up by any of them, oldest first, and jobs left "running"
+by a crashed worker are re-queued once their lease expires (checked on start
+and every AI_JOB_SWEEP_SECONDS).
+
+FirestoreJobStore.claim_next needs the composite index on ai_jobs
+(status, created_at) from firestore.indexes.json.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from concurrency import run_blocking
+from structured_logging import request_id_scope
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Max jobs executing at once per worker process
+AI_JOB_CONCURRENCY = int(os.getenv("AI_JOB_CONCURRENCY", "2"))
+# How often idle workers check the store for jobs submitted elsewhere
+AI_JOB_POLL_SECONDS = float(os.getenv("AI_JOB_POLL_SECONDS", "2"))
+# A job "running" longer than this is assumed orphaned by a dead worker and re-queued
+AI_JOB_LEASE_SECONDS = float(os.getenv("AI_JOB_LEASE_SECONDS", "3600"))
+# How often each worker process looks for orphaned "running" jobs to re-queue
+AI_JOB_SWEEP_SECONDS = float(os.getenv("AI_JOB_SWEEP_SECONDS", "60"))
+
+JobRunner = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+# =============================================================================
+# JOB STORES
+# =============================================================================
+
+class SQLiteJobStore:
+    """Job store backed by a local SQLite file (safe across processes on one node)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    started_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def _transaction(self) -> "_Transaction":
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return _Transaction(conn)
+
+    def create(self, job_id: str, user_id: str, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, user_id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, user_id, JOB_QUEUED, json.dumps(payload), now, now)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["job_id"],
+            "user_id": row["user_id"],
+            "status": row["status"],
+            "payload": json.loads(row["payload"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": json.loads(row["error"]) if row["error"] else None,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Atomically mark the oldest queued job as running and return it."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, updated_at = ? WHERE job_id = ?",
+                (JOB_RUNNING, now, now, row["job_id"])
+            )
+        return self.get(row["job_id"])
+
+    def finish(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[dict] = None) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, json.dumps(result) if result is not None else None,
+                 json.dumps(error) if error is not None else None, time.time(), job_id)
+            )
+
+    def requeue_stale(self, lease_seconds: float) -> int:
+        """Return jobs orphaned in "running" (e.g. by a worker restart) to the queue."""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND started_at < ?",
+                (JOB_QUEUED, now, JOB_RUNNING, now - lease_seconds)
+            )
+            return cursor.rowcount
+
+
+class _Transaction:
+    """Context manager running a block inside BEGIN IMMEDIATE ... COMMIT."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class FirestoreJobStore:
+    """Job store backed by the Firestore `ai_jobs` collection (production)."""
+
+    def __init__(self, collection: str = "ai_jobs"):
+        from firebase_admin import firestore
+        self._firestore = firestore
+        self.db = firestore.client()
+        self.collection = self.db.collection(collection)
+
+    def create(self, job_id: str, user_id: str, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        self.collection.document(job_id).set({
+            "job_id": job_id,
+            "user_id": user_id,
+            "status": JOB_QUEUED,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+        })
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.collection.document(job_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        data.pop("started_at", None)
+        return data
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Atomically mark the oldest queued job as running and return it."""
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        transaction = self.db.transaction()
+        query = (
+            self.collection.where(filter=FieldFilter("status", "==", JOB_QUEUED))
+            .order_by("created_at")
+            .limit(1)
+        )
+
+        @self._firestore.transactional
+        def claim(transaction):
+            docs = list(query.stream(transaction=transaction))
+            if not docs:
+                return None
+            now = time.time()
+            transaction.update(docs[0].reference, {
+                "status": JOB_RUNNING, "started_at": now, "updated_at": now
+            })
+            return docs[0].id
+
+        job_id = claim(transaction)
+        return self.get(job_id) if job_id else None
+
+    def finish(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[dict] = None) -> None:
+        self.collection.document(job_id).update({
+            "status": status, "result": result, "error": error, "updated_at": time.time()
+        })
+
+    def requeue_stale(self, lease_seconds: float) -> int:
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        cutoff = time.time() - lease_seconds
+        stale = self.collection.where(filter=FieldFilter("status", "==", JOB_RUNNING)).stream()
+        count = 0
+        for doc in stale:
+            started_at = doc.to_dict().get("started_at") or 0
+            if started_at < cutoff:
+                doc.reference.update({"status": JOB_QUEUED, "updated_at": time.time()})
+                count += 1
+        return count
+
+
+def get_default_job_store():
+    """
+    Pick the job store for this environment.
+
+    AI_JOB_STORE=sqlite|firestore overrides the default (Firestore in production,
+    SQLite at AI_JOB_STORE_PATH or data/jobs.sqlite3 otherwise).
+    """
+    backend = os.getenv("AI_JOB_STORE") or ("firestore" if os.getenv("ENVIRONMENT") == "production" else "sqlite")
+    if backend == "firestore":
+        return FirestoreJobStore()
+
+    default_path = Path(__file__).parent.parent / "data" / "jobs.sqlite3"
+    return SQLiteJobStore(os.getenv("AI_JOB_STORE_PATH", str(default_path)))
+
+
+# =============================================================================
+# WORKER POOL
+# =============================================================================
+
+def _describe_error(exc: Exception) -> Dict[str, Any]:
+    """Turn an exception into a JSON-safe error record (keeps HTTPException status/detail)."""
+    return {
+        "status_code": getattr(exc, "status_code", 500),
+        "detail": getattr(exc, "detail", None) or str(exc) or exc.__class__.__name__,
+    }
+
+
+class JobQueue:
+    """
+    Per-process pool of async workers that execute jobs from a JobStore.
+
+    Args:
+        runner: Async function that takes a job payload and returns a JSON-safe result
+        store: JobStore to use (defaults to get_default_job_store() on start)
+        concurrency: Max jobs executing at once in this process
+        sweep_interval: Seconds between checks for orphaned "running" jobs
+    """
+
+    def __init__(self, runner: JobRunner, store=None, concurrency: int = AI_JOB_CONCURRENCY,
+                 poll_interval: float = AI_JOB_POLL_SECONDS, lease_seconds: float = AI_JOB_LEASE_SECONDS,
+                 sweep_interval: float = AI_JOB_SWEEP_SECONDS):
+        self.runner = runner
+        self.store = store
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.sweep_interval = sweep_interval
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._next_sweep = 0.0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        """Start the worker tasks and re-queue jobs orphaned by a previous run."""
+        if self.started:
+            return
+        if self.store is None:
+            self.store = await run_blocking(get_default_job_store)
+        await self._requeue_stale()
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Cancel worker tasks. Jobs they were running stay "running" until their lease expires."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, user_id: str, payload: Dict[str, Any]) -> str:
+        """Persist a new job and wake a worker. Returns the job ID."""
+        await self.start()
+        job_id = str(uuid.uuid4())
+        await run_blocking(self.store.create, job_id, user_id, payload)
+        self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        await self.start()
+        return await run_blocking(self.store.get, job_id)
+
+    async def _requeue_stale(self) -> None:
+        self._next_sweep = time.monotonic() + self.sweep_interval
+        requeued = await run_blocking(self.store.requeue_stale, self.lease_seconds)
+        if requeued:
+            logger.info("Re-queued orphaned jobs", extra={"count": requeued})
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while True:
+            # Workers in other processes can die mid-job while this one keeps running
+            if time.monotonic() >= self._next_sweep:
+                try:
+                    await self._requeue_stale()
+                except Exception as e:
+                    logger.warning("Re-queueing orphaned jobs failed", extra={"error": str(e)})
+
+            job = await run_blocking(self.store.claim_next)
+            if job is None:
+                # Sleep until a local submit or the next poll (jobs may be submitted to other workers)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                # Log records from the job carry its ID as the request ID
+                with request_id_scope(job["job_id"]):
+                    result = await self.runner(job["payload"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Job failed", extra={"job_id": job["job_id"], "error": str(e)})
+                await run_blocking(self.store.finish, job["job_id"], JOB_FAILED, error=_describe_error(e))
+            else:
+                await run_blocking(self.store.finish, job["job_id"], JOB_SUCCEEDED, result=result)
@@ -0,0 +1,156 @@
+"""
+Content-addressed cache for structured LLM outputs.
+
+Users often re-run /ai/structure, /ai/tag and /ai/coach on identical text while
+editing. Results are cached under a hash of:
+    (chain name, prompt template version, model(s), temperature, normalized inputs)
+so any prompt or model change naturally misses. Parsed outputs (PARStructure,
+TagResponse, CoachResponse, ...) are stored as JSON in a SQLite file shared by
+every uvicorn worker on the node, with a TTL and a size cap (LRU eviction).
+
+Send `X-Cache-Bypass: 1` to skip the lookup (the fresh result still refreshes
+the cache). Responses carry `X-Cache: HIT | MISS | BYPASS`; per-chain lookup
+outcomes are exported on /metrics as parfolio_llm_cache_events_total.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from ai.chains import get_chain_identity
+from ai.sqlite_cache import SQLiteCache
+from concurrency import run_blocking
+from metrics import Counter
+
+T = TypeVar("T", bound=BaseModel)
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("AI_LLM_CACHE", "true").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH = os.getenv(
+    "AI_LLM_CACHE_PATH",
+    str(Path(__file__).parent.parent / "data" / "llm_cache.sqlite3")
+)
+# Default TTL: 7 days (in seconds)
+LLM_CACHE_TTL = int(os.getenv("AI_LLM_CACHE_TTL", str(7 * 24 * 60 * 60)))
+# Default size cap: 64 MB
+LLM_CACHE_MAX_BYTES = int(os.getenv("AI_LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+CACHE_STATUS_HEADER = "X-Cache"
+
+CACHE_HIT = "HIT"
+CACHE_MISS = "MISS"
+CACHE_BYPASS = "BYPASS"
+
+_cache: Optional[SQLiteCache] = None
+_cache_lock = threading.Lock()
+
+LLM_CACHE_EVENTS = Counter(
+    "parfolio_llm_cache_events_total",
+    "LLM output cache lookups per chain: hit, miss, bypass or error.",
+    ("chain", "event"),
+)
+
+
+def get_llm_cache() -> SQLiteCache:
+    """Return the shared SQLite cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SQLiteCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES)
+    return _cache
+
+
+def _normalize(value: Any) -> Any:
+    """Canonicalize inputs so trivially different text (whitespace) maps to one key."""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def build_cache_key(chain_name: str, inputs: Dict[str, Any], scope: Optional[str] = None) -> str:
+    """
+    Hash the chain identity and normalized inputs into a cache key.
+
+    Args:
+        chain_name: Registered chain name (see ai.chains.CHAIN_PROMPTS)
+        inputs: The prompt variables
+        scope: Extra partition for outputs that depend on more than the inputs
+            (e.g. the user ID for agent coaching, which reads the user's data)
+    """
+    payload = {
+        "identity": get_chain_identity(chain_name),
+        "scope": scope,
+        "inputs": _normalize(inputs),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _record(chain_name: str, outcome: str) -> None:
+    LLM_CACHE_EVENTS.inc((chain_name, outcome))
+
+
+def is_bypass_requested(header_value: Optional[str]) -> bool:
+    return bool(header_value) and header_value.lower() not in ("0", "false", "no")
+
+
+async def cached_result(
+    chain_name: str,
+    inputs: Dict[str, Any],
+    schema: Type[T],
+    compute: Callable[[], Awaitable[T]],
+    scope: Optional[str] = None,
+    bypass: bool = False,
+    cacheable: Optional[Callable[[T], bool]] = None,
+) -> Tuple[T, str]:
+    """
+    Return a cached structured output for these inputs, or compute and store it.
+
+    Results that `cacheable` rejects (e.g. degraded fallback output) are
+    returned but not stored. Cache errors never fail the request; they are
+    logged and treated as misses.
+
+    Returns:
+        (result, cache_status) where cache_status is HIT, MISS or BYPASS
+    """
+    if not LLM_CACHE_ENABLED:
+        return await compute(), CACHE_MISS
+
+    key = build_cache_key(chain_name, inputs, scope)
+
+    if not bypass:
+        try:
+            cached = await run_blocking(get_llm_cache().get, key)
+            if cached is not None:
+                _record(chain_name, "hit")
+                return schema.model_validate_json(cached), CACHE_HIT
+        except Exception as e:
+            _record(chain_name, "error")
+            logger.warning("LLM cache read failed", extra={"chain": chain_name, "error": str(e)})
+
+    _record(chain_name, "bypass" if bypass else "miss")
+    result = await compute()
+    if cacheable is not None and not cacheable(result):
+        return result, CACHE_BYPASS if bypass else CACHE_MISS
+
+    try:
+        if not isinstance(result, schema):
+            result = schema.model_validate(result)
+        await run_blocking(get_llm_cache().set, key, result.model_dump_json(), LLM_CACHE_TTL)
+    except Exception as e:
+        _record(chain_name, "error")
+        logger.warning("LLM cache write failed", extra={"chain": chain_name, "error": str(e)})
+
+    return result, CACHE_BYPASS if bypass else CACHE_MISS
@@ -0,0 +1,151 @@
+"""
+Small dependency-graph scheduler for multi-stage AI pipelines.
+
+A pipeline is a list of Stages. Each stage declares the stages it depends on
+and starts as soon as all of them have finished, so independent stages (e.g.
+the profile fetch and tagging) run concurrently instead of one after another.
+
+Failure handling per stage:
+- `on_error` set: the stage fails gracefully; its result becomes on_error(exc).
+- `required=True` (default): the whole pipeline is cancelled and exc is raised.
+- `required=False`: the error is passed on to dependent stages, which fail
+  with the same exception (and then apply their own on_error / required rule).
+"""
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import span
+
+StageCallback = Callable[[str, Any], Awaitable[None]]
+
+
+class StageTimeoutError(Exception):
+    """Raised when a stage exceeds its timeout."""
+
+
+@dataclass
+class Stage:
+    """A single pipeline step. `run` receives the results of all finished stages."""
+    name: str
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    required: bool = True
+    on_error: Optional[Callable[[Exception], Any]] = None
+
+
+def stage_timeout(stage_name: str, default: float) -> float:
+    """Read a stage timeout in seconds from AI_STAGE_TIMEOUT_<STAGE_NAME>, falling back to default."""
+    return float(os.getenv(f"AI_STAGE_TIMEOUT_{stage_name.upper()}", default))
+
+
+def _validate(stages: List[Stage]) -> None:
+    names = [stage.name for stage in stages]
+    if len(names) != len(set(names)):
+        raise ValueError("Pipeline stage names must be unique")
+
+    known = set(names)
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in known]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {missing}")
+
+    # Reject cycles up front; otherwise they would just never start
+    resolved = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(dep in resolved for dep in stage.deps)]
+        if not ready:
+            raise ValueError(f"Pipeline has a dependency cycle among: {[s.name for s in remaining]}")
+        for stage in ready:
+            resolved.add(stage.name)
+            remaining.remove(stage)
+
+
+async def _run_stage(stage: Stage, results: Dict[str, Any]) -> Any:
+    with span(stage.name):
+        if stage.timeout is None:
+            return await stage.run(results)
+        try:
+            return await asyncio.wait_for(stage.run(results), timeout=stage.timeout)
+        except asyncio.TimeoutError:
+            raise StageTimeoutError(f"Stage '{stage.name}' timed out after {stage.timeout:.0f}s")
+
+
+async def run_pipeline(stages: List[Stage], on_stage_complete: Optional[StageCallback] = None) -> Dict[str, Any]:
+    """
+    Run all stages, each as soon as its dependencies are ready.
+
+    Args:
+        stages: The stages to run
+        on_stage_complete: Optional async callback invoked with (stage_name, result)
+            as each stage produces a result, including on_error fallbacks
+
+    Returns:
+        Mapping of stage name to result for every stage that produced one
+        (including on_error fallbacks).
+
+    Raises:
+        The original exception of the first required stage that fails.
+    """
+    _validate(stages)
+
+    pending: Dict[str, Stage] = {stage.name: stage for stage in stages}
+    results: Dict[str, Any] = {}
+    errors: Dict[str, Exception] = {}
+    running: Dict[asyncio.Task, Stage] = {}
+
+    async def settle_success(stage: Stage, value: Any) -> None:
+        results[stage.name] = value
+        if on_stage_complete is not None:
+            await on_stage_complete(stage.name, value)
+
+    async def settle_failure(stage: Stage, exc: Exception) -> None:
+        if stage.on_error is not None:
+            await settle_success(stage, stage.on_error(exc))
+        elif stage.required:
+            raise exc
+        else:
+            errors[stage.name] = exc
+
+    try:
+        while pending or running:
+            # Start (or fail) every stage whose dependencies are settled.
+            # Failures can unblock further stages, so repeat until nothing changes.
+            progressed = True
+            while progressed:
+                progressed = False
+                for name in list(pending):
+                    stage = pending[name]
+                    upstream_error = next((errors[dep] for dep in stage.deps if dep in errors), None)
+                    if upstream_error is not None:
+                        del pending[name]
+                        await settle_failure(stage, upstream_error)
+                        progressed = True
+                    elif all(dep in results for dep in stage.deps):
+                        del pending[name]
+                        task = asyncio.create_task(_run_stage(stage, results))
+                        running[task] = stage
+
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage = running.pop(task)
+                try:
+                    value = task.result()
+                except Exception as exc:
+                    await settle_failure(stage, exc)
+                else:
+                    await settle_success(stage, value)
+    finally:
+        # A required stage failed (or we were cancelled): stop everything still in flight
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    return results
@@ -0,0 +1,116 @@
+"""
+Portfolio-wide story analytics (backs GET /stories/analytics).
+
+Runs the coaching agent's three quality analyses for every story of a user
+in one pass, without any LLM call:
+- structure balance (_analyze_story_structure_quality)
+- weak storytelling patterns (detect_weak_storytelling_patterns_batch, one
+  regex scan per section for the whole portfolio)
+- career stage alignment (_validate_career_stage_alignment)
+
+Results are returned as a columnar table (one list per column, all in story
+order) so the dashboard gets the whole portfolio in one compact payload.
+Issue lists are packed into bit flags; `flag_legend` maps bit i to an issue
+type, e.g. structure_flags == 5 means too_short and problem_too_short.
+"""
+from typing import Any, Dict, List, Optional
+
+from ai.tools import (
+    CAREER_STAGE_KEYWORDS, _analyze_story_structure_quality, _validate_career_stage_alignment,
+    detect_weak_storytelling_patterns_batch
+)
+
+STRUCTURE_ISSUE_TYPES = (
+    "too_short", "too_long", "problem_too_short", "problem_too_long",
+    "action_too_short", "action_too_long", "result_too_short",
+)
+STORYTELLING_ISSUE_TYPES = ("passive_voice", "we_instead_of_i", "vague_results")
+
+COLUMNS = (
+    "story_id", "title", "status",
+    "words_problem", "words_action", "words_result", "words_total",
+    "pct_problem", "pct_action", "pct_result", "balance_score", "structure_flags",
+    "storytelling_score", "storytelling_flags", "has_quantified_results",
+    "aligned", "alignment_score", "alignment_flag_count",
+)
+
+# Decimal places kept for percentages and scores
+PRECISION = 3
+
+
+def _flags(issues: List[dict], types: tuple) -> int:
+    bits = 0
+    for issue in issues:
+        bits |= 1 << types.index(issue["type"])
+    return bits
+
+
+def _mean(values: List[Optional[float]]) -> Optional[float]:
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), PRECISION) if values else None
+
+
+def analyze_portfolio(stories: List[dict], career_stage: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Analyze every story and return the columnar table plus a portfolio summary.
+
+    Args:
+        stories: Dicts with story_id, title, status, problem, action, result
+            (as returned by ai.tools._get_user_stories)
+        career_stage: The user's career stage; alignment columns are None when
+            it is missing or unknown
+    """
+    sections = [(s.get("problem") or "", s.get("action") or "", s.get("result") or "") for s in stories]
+    storytelling = detect_weak_storytelling_patterns_batch(sections)
+    check_alignment = career_stage in CAREER_STAGE_KEYWORDS
+
+    columns: Dict[str, List[Any]] = {name: [] for name in COLUMNS}
+    for story, (problem, action, result), patterns in zip(stories, sections, storytelling):
+        structure = _analyze_story_structure_quality(problem, action, result)
+        words, percentages = structure["word_counts"], structure["percentages"]
+
+        columns["story_id"].append(story.get("story_id"))
+        columns["title"].append(story.get("title"))
+        columns["status"].append(story.get("status"))
+        for section in ("problem", "action", "result"):
+            columns[f"words_{section}"].append(words[section])
+            columns[f"pct_{section}"].append(round(percentages[section], PRECISION))
+        columns["words_total"].append(words["total"])
+        columns["balance_score"].append(round(structure["balance_score"], PRECISION))
+        columns["structure_flags"].append(_flags(structure["issues"], STRUCTURE_ISSUE_TYPES))
+        columns["storytelling_score"].append(round(patterns["quality_score"], PRECISION))
+        columns["storytelling_flags"].append(_flags(patterns["issues"], STORYTELLING_ISSUE_TYPES))
+        columns["has_quantified_results"].append(patterns["has_quantified_results"])
+
+        if check_alignment:
+            alignment = _validate_career_stage_alignment(problem, action, result, career_stage)
+            columns["aligned"].append(alignment["aligned"])
+            columns["alignment_score"].append(round(alignment["alignment_score"], PRECISION))
+            columns["alignment_flag_count"].append(len(alignment["flags"]))
+        else:
+            columns["aligned"].append(None)
+            columns["alignment_score"].append(None)
+            columns["alignment_flag_count"].append(None)
+
+    issue_counts = {
+        issue_type: sum(1 for flags in columns[column] if flags & (1 << bit))
+        for column, types in (("structure_flags", STRUCTURE_ISSUE_TYPES), ("storytelling_flags", STORYTELLING_ISSUE_TYPES))
+        for bit, issue_type in enumerate(types)
+    }
+    return {
+        "count": len(stories),
+        "career_stage": career_stage if check_alignment else None,
+        "columns": columns,
+        "flag_legend": {
+            "structure_flags": list(STRUCTURE_ISSUE_TYPES),
+            "storytelling_flags": list(STORYTELLING_ISSUE_TYPES),
+        },
+        "summary": {
+            "mean_balance_score": _mean(columns["balance_score"]),
+            "mean_storytelling_score": _mean(columns["storytelling_score"]),
+            "mean_alignment_score": _mean(columns["alignment_score"]),
+            "quantified_results": sum(columns["has_quantified_results"]),
+            "misaligned": sum(1 for aligned in columns["aligned"] if aligned is False),
+            "issue_counts": issue_counts,
+        },
+    }
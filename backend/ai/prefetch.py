@@ -0,0 +1,171 @@
+"""
+Background prefetch of market intelligence when a user's targets change.
+
+PUT /profile hands the target_companies, target_role and target_industry
+values that weren't in the stored profile to the worker's MarketPrefetcher. It runs get_company_interview_insights,
+get_role_interview_trends and get_industry_context for them in the
+background, so the results land in the tool cache (ai/tool_cache.py) before
+the user's next coaching run asks for them.
+
+- Duplicates are dropped: a target already queued or being fetched isn't
+  queued again, and a target whose results are already cached isn't searched.
+- Searches are rate-limited to AI_PREFETCH_RPM per worker and the queue holds
+  at most AI_PREFETCH_MAX_PENDING targets (extra targets are dropped), so
+  prefetching never competes with the agent for Tavily quota.
+- Prefetching is best-effort: failures are logged and counted, never raised.
+  Its cache lookups aren't counted in the tool cache hit/miss metrics.
+"""
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ai.tool_cache import cache_get, cached_tavily_search, tavily_cache_key
+from ai.tools import _company_insights_query, _get_tavily_tool, _industry_context_query, _role_trends_query
+from concurrency import run_blocking
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+AI_PREFETCH_ENABLED = os.getenv("AI_PREFETCH", "true").lower() not in ("0", "false", "no")
+# Max Tavily searches per minute for prefetching (per worker process)
+AI_PREFETCH_RPM = float(os.getenv("AI_PREFETCH_RPM", "20"))
+AI_PREFETCH_MAX_PENDING = int(os.getenv("AI_PREFETCH_MAX_PENDING", "200"))
+
+PREFETCH_EVENTS = Counter(
+    "parfolio_prefetch_events_total",
+    "Market-intelligence prefetches per tool: queued, duplicate, dropped, cached, fetched, failed, unavailable.",
+    ("tool", "event"),
+)
+
+# tool (tool_cache name) -> the Tavily query its tool makes for a value
+# (get_company_interview_insights, get_role_interview_trends, get_industry_context)
+PREFETCH_TOOLS: Dict[str, Callable[[str], str]] = {
+    "company_insights": _company_insights_query,
+    "role_trends": _role_trends_query,
+    "industry_context": _industry_context_query,
+}
+
+Target = Tuple[str, str]
+
+TARGET_FIELDS = ("target_companies", "target_role", "target_industry")
+
+
+def _targets(profile: dict) -> List[Target]:
+    targets = [("company_insights", company) for company in profile.get("target_companies") or []]
+    if profile.get("target_role"):
+        targets.append(("role_trends", profile["target_role"]))
+    if profile.get("target_industry"):
+        targets.append(("industry_context", profile["target_industry"]))
+    return [(tool, " ".join(value.split())) for tool, value in targets if value and value.strip()]
+
+
+def profile_targets(profile_update: dict, stored_profile: Optional[dict] = None) -> List[Target]:
+    """
+    (tool, value) pairs to prefetch for the target fields in a profile update,
+    leaving out values the stored profile already had (compared ignoring case).
+    """
+    known = {(tool, value.casefold()) for tool, value in _targets(stored_profile or {})}
+    return [(tool, value) for tool, value in _targets(profile_update) if (tool, value.casefold()) not in known]
+
+
+class MarketPrefetcher:
+    """
+    Per-worker queue of prefetch targets with one rate-limited worker task.
+
+    Args:
+        rpm: Max Tavily searches per minute (targets served from cache don't count)
+        max_pending: Max targets queued at once
+    """
+
+    def __init__(self, rpm: float = AI_PREFETCH_RPM, max_pending: int = AI_PREFETCH_MAX_PENDING):
+        self.interval = 60.0 / rpm
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Set[Target] = set()
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._worker is not None
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the worker; queued targets are dropped."""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        self._queue = None
+        self._pending.clear()
+
+    async def enqueue(self, targets: List[Target]) -> int:
+        """Queue targets for prefetching; returns how many were queued (the rest were duplicates or dropped)."""
+        if not AI_PREFETCH_ENABLED or not targets:
+            return 0
+        await self.start()
+        queued = 0
+        for tool, value in targets:
+            key = (tool, value.casefold())
+            if key in self._pending:
+                PREFETCH_EVENTS.inc((tool, "duplicate"))
+                continue
+            if self._queue.full():
+                PREFETCH_EVENTS.inc((tool, "dropped"))
+                continue
+            self._pending.add(key)
+            self._queue.put_nowait((key, tool, value))
+            PREFETCH_EVENTS.inc((tool, "queued"))
+            queued += 1
+        return queued
+
+    async def join(self) -> None:
+        """Wait until every queued target has been processed (tests and benchmarks)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _run(self) -> None:
+        while True:
+            key, tool, value = await self._queue.get()
+            searched = False
+            try:
+                searched = await run_blocking(_prefetch, tool, value)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                searched = True
+                PREFETCH_EVENTS.inc((tool, "failed"))
+                logger.warning("Market prefetch failed", extra={"tool": tool, "error": str(e)})
+            finally:
+                self._pending.discard(key)
+                self._queue.task_done()
+            if searched:
+                await asyncio.sleep(self.interval)
+
+
+def _prefetch(tool: str, value: str) -> bool:
+    """
+    Warm the tool cache for one target; returns whether Tavily was called.
+
+    Searches through the tool cache directly rather than running the tool,
+    which turns search errors into text; here they raise to the worker.
+    """
+    tavily = _get_tavily_tool()
+    if tavily is None:
+        PREFETCH_EVENTS.inc((tool, "unavailable"))
+        return False
+    query = PREFETCH_TOOLS[tool](value)
+    if cache_get(tavily_cache_key(query), tool, record=False) is not None:
+        PREFETCH_EVENTS.inc((tool, "cached"))
+        return False
+    cached_tavily_search(query, tavily.invoke, tool=tool, record=False)
+    PREFETCH_EVENTS.inc((tool, "fetched"))
+    return True
+
+
+market_prefetcher = MarketPrefetcher()
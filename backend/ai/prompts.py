@@ -30,11 +30,8 @@ If you score below 0.9, you MUST provide specific warnings in the `warnings` lis
 - "The 'Problem' context is missing—what was the actual challenge?"
 """
 
-TAGGING_SYSTEM_PROMPT = """You are an expert interview coach specializing in behavioral competency assessment.
-
-Your task is to analyze a PAR (Problem-Action-Result) story and identify which of the 10 predefined competency tags best describe the behavioral skills demonstrated.
-
-### AVAILABLE TAGS (choose 1-3):
+# Tag taxonomy and rules, shared by the tagging and fused structure+tag prompts
+TAG_GUIDE = """### AVAILABLE TAGS (choose 1-3):
 1. **Leadership**: Leading teams, mentoring, driving vision, influencing others
 2. **Ownership**: Taking initiative, accountability, driving to completion
 3. **Impact**: Delivering measurable results, business outcomes, scalable solutions
@@ -57,7 +54,13 @@ Your task is to analyze a PAR (Problem-Action-Result) story and identify which o
 - **0.7-0.8**: Strong evidence, but could be more explicit or detailed
 - **0.5-0.6**: Implied or indirect demonstration
 - **<0.5**: Weak or ambiguous connection (avoid assigning tags with this score)
+"""
+
+TAGGING_SYSTEM_PROMPT = """You are an expert interview coach specializing in behavioral competency assessment.
 
+Your task is to analyze a PAR (Problem-Action-Result) story and identify which of the 10 predefined competency tags best describe the behavioral skills demonstrated.
+
+""" + TAG_GUIDE + """
 ### OUTPUT FORMAT:
 Return a JSON object with an array of tag assignments, each containing:
 - `tag`: The competency name (exact match from the list above)
@@ -115,6 +118,18 @@ TAGGING_PROMPT = ChatPromptTemplate.from_messages([
 """),
 ])
 
+# Fused structuring + tagging: one call instead of structure → tag
+STRUCTURE_AND_TAG_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+### BEHAVIORAL TAGGING
+After structuring, assign competency tags to the PAR story YOU produced (not the raw transcript) in the `tags` list.
+
+""" + TAG_GUIDE
+
+STRUCTURE_AND_TAG_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", STRUCTURE_AND_TAG_SYSTEM_PROMPT),
+    ("human", "Here is the raw transcript: {raw_transcript}"),
+])
+
 MEMORY_SUMMARIZATION_SYSTEM_PROMPT = """You are an expert career data analyst.
 Your goal is to create a comprehensive, factual summary of a user's entire professional document (like a resume, LinkedIn export, or work transcript).
 
@@ -0,0 +1,395 @@
+"""
+Per-model rate limiting and priority scheduling for Gemini calls.
+
+Interactive requests (/ai/process, /ai/coach, ...) and background work
+(MemorySummarizer.process_document) share one token bucket per model and
+worker process. A call takes one token; tokens refill at the model's
+requests-per-minute rate up to a burst size. When no token is free, callers
+queue, and the queue is served in priority order (interactive first, FIFO
+within a class). Background calls also leave AI_RATE_LIMIT_BACKGROUND_RESERVE
+of the burst untouched, so a document upload can't drain the bucket right
+before a user's request arrives.
+
+A caller that waits longer than its class's queue timeout (interactive waits
+are also capped by the request's remaining deadline) gets RateLimitTimeout,
+which the hedged Pro/Flash clients treat like any other failure.
+
+When Gemini answers 429 anyway (quota shared with other workers or keys),
+the call is retried up to AI_RATE_LIMIT_MAX_RETRIES times. Each 429 empties
+the model's bucket and pauses it for a full-jitter exponential backoff, so
+every caller of that model slows down, not just the one that was rejected.
+The Gemini client's own short retry runs first, inside each attempt.
+
+Limits are per worker process: divide the project quota by the number of
+workers when setting AI_RATE_LIMIT_RPM.
+
+    with priority_scope(PRIORITY_BACKGROUND):
+        await chain.ainvoke(...)
+
+Queue depth, queue wait and 429/timeouts are exported on /metrics.
+"""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.api_core.exceptions import ResourceExhausted
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from ai.deadline import current_deadline
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+AI_RATE_LIMIT_ENABLED = os.getenv("AI_RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+# Queue timeouts per priority class (seconds)
+AI_RATE_LIMIT_INTERACTIVE_TIMEOUT = float(os.getenv("AI_RATE_LIMIT_INTERACTIVE_TIMEOUT", "10"))
+AI_RATE_LIMIT_BACKGROUND_TIMEOUT = float(os.getenv("AI_RATE_LIMIT_BACKGROUND_TIMEOUT", "300"))
+# Fraction of the burst background calls may not use
+AI_RATE_LIMIT_BACKGROUND_RESERVE = float(os.getenv("AI_RATE_LIMIT_BACKGROUND_RESERVE", "0.25"))
+# Retries after a 429, and the exponential backoff range (seconds)
+AI_RATE_LIMIT_MAX_RETRIES = int(os.getenv("AI_RATE_LIMIT_MAX_RETRIES", "3"))
+AI_RATE_LIMIT_BACKOFF_BASE_SECONDS = float(os.getenv("AI_RATE_LIMIT_BACKOFF_BASE_SECONDS", "1"))
+AI_RATE_LIMIT_BACKOFF_MAX_SECONDS = float(os.getenv("AI_RATE_LIMIT_BACKOFF_MAX_SECONDS", "30"))
+
+# Used for models without an AI_RATE_LIMIT_RPM_<MODEL> / AI_RATE_LIMIT_BURST_<MODEL> override
+DEFAULT_RPM = 60.0
+DEFAULT_BURST = 10.0
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+LLM_QUEUE_DEPTH = Gauge(
+    "parfolio_llm_queue_depth", "LLM calls waiting for a rate-limit token.", ("model", "priority")
+)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "parfolio_llm_queue_wait_seconds", "Time LLM calls spent waiting for a rate-limit token.", ("model", "priority")
+)
+LLM_RATE_LIMIT_EVENTS = Counter(
+    "parfolio_llm_rate_limit_events_total",
+    "Rate-limit events per model: 429 responses, retries after a 429, and queue timeouts.",
+    ("model", "event"),
+)
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when a call waited longer than its queue timeout for a rate-limit token."""
+
+
+# =============================================================================
+# PRIORITY CONTEXT
+# =============================================================================
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority_scope(priority: int) -> Iterator[int]:
+    """Run LLM calls in the enclosed block under `priority`."""
+    if priority not in PRIORITY_NAMES:
+        raise ValueError(f"Unknown LLM priority: {priority}")
+    token = _priority.set(priority)
+    try:
+        yield priority
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def _queue_timeout(priority: int) -> float:
+    if priority == PRIORITY_BACKGROUND:
+        return AI_RATE_LIMIT_BACKGROUND_TIMEOUT
+    deadline = current_deadline()
+    if deadline is not None:
+        return max(0.0, min(AI_RATE_LIMIT_INTERACTIVE_TIMEOUT, deadline.remaining()))
+    return AI_RATE_LIMIT_INTERACTIVE_TIMEOUT
+
+
+# =============================================================================
+# TOKEN BUCKET
+# =============================================================================
+
+class TokenBucket:
+    """
+    Token bucket with a priority queue of async waiters.
+
+    Async callers queue and are woken by a timer on the event loop; sync
+    callers (invoke() from worker threads) poll and only go ahead when no
+    async caller is queued.
+    """
+
+    def __init__(self, model: str, rpm: float, burst: float, background_reserve: float = AI_RATE_LIMIT_BACKGROUND_RESERVE):
+        if rpm <= 0 or burst < 1:
+            raise ValueError(f"Rate limit for {model} needs rpm > 0 and burst >= 1 (got {rpm}, {burst})")
+        self.model = model
+        self.rate = rpm / 60.0
+        self.burst = float(burst)
+        # Tokens a background call needs to see before it may take one
+        self.thresholds = {
+            PRIORITY_INTERACTIVE: 1.0,
+            PRIORITY_BACKGROUND: min(self.burst, 1.0 + background_reserve * self.burst),
+        }
+        self.tokens = self.burst
+        # Refill resumes from here; set into the future to pause the bucket after a 429
+        self.updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued = {priority: 0 for priority in PRIORITY_NAMES}
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    # --- state (callers hold self._lock) -------------------------------------
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def _seconds_until(self, priority: int, now: float) -> float:
+        missing = max(0.0, self.thresholds[priority] - self.tokens)
+        return max(0.0, self.updated - now) + missing / self.rate
+
+    def _can_take(self, priority: int, now: float) -> bool:
+        # Nobody of the same or higher priority may be queued ahead
+        ahead = sum(self._queued[p] for p in PRIORITY_NAMES if p <= priority)
+        return ahead == 0 and now >= self.updated and self.tokens >= self.thresholds[priority]
+
+    def _set_depth(self, priority: int, delta: int) -> None:
+        self._queued[priority] += delta
+        LLM_QUEUE_DEPTH.set((self.model, PRIORITY_NAMES[priority]), self._queued[priority])
+
+    # --- async ----------------------------------------------------------------
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """Wait for a token; returns the seconds waited. Raises RateLimitTimeout after `timeout`."""
+        start = time.monotonic()
+        with self._lock:
+            self._refill(start)
+            if self._can_take(priority, start):
+                self.tokens -= 1
+                return 0.0
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+            self._set_depth(priority, 1)
+            self._schedule(start)
+
+        try:
+            async with asyncio.timeout(timeout):
+                await waiter
+        except BaseException as e:
+            granted = waiter.done() and not waiter.cancelled()
+            timed_out = isinstance(e, asyncio.TimeoutError)
+            with self._lock:
+                if not granted:
+                    # Timed out or cancelled in the queue: leave it
+                    entry = next((w for w in self._waiters if w[2] is waiter), None)
+                    if entry is not None:
+                        self._waiters.remove(entry)
+                        heapq.heapify(self._waiters)
+                        self._set_depth(priority, -1)
+                elif not timed_out:
+                    # Cancelled after _dispatch_locked handed us a token: give it back
+                    self.tokens = min(self.burst, self.tokens + 1)
+                self._dispatch_locked()
+            if granted and timed_out:
+                # The timeout raced the handoff; the token is ours, so use it
+                return time.monotonic() - start
+            if timed_out:
+                LLM_RATE_LIMIT_EVENTS.inc((self.model, "queue_timeout"))
+                raise RateLimitTimeout(
+                    f"Waited {timeout:.1f}s for a {self.model} rate-limit token ({PRIORITY_NAMES[priority]})"
+                ) from None
+            raise
+        return time.monotonic() - start
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch_locked()
+
+    def _dispatch_locked(self) -> None:
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters:
+            priority, _, waiter = self._waiters[0]
+            if waiter.done():
+                heapq.heappop(self._waiters)
+                self._set_depth(priority, -1)
+                continue
+            if now < self.updated or self.tokens < self.thresholds[priority]:
+                break
+            heapq.heappop(self._waiters)
+            self._set_depth(priority, -1)
+            self.tokens -= 1
+            waiter.set_result(None)
+        if self._waiters:
+            self._schedule(now)
+
+    def _schedule(self, now: float) -> None:
+        """(Re)arm the wake-up timer for when the head of the queue can go."""
+        delay = self._seconds_until(self._waiters[0][0], now)
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and self._timer_loop is loop:
+            if self._timer.when() <= loop.time() + delay:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_later(delay, self._dispatch)
+        self._timer_loop = loop
+
+    # --- sync -----------------------------------------------------------------
+
+    def acquire_sync(self, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """Blocking variant of acquire() for calls made from worker threads."""
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._can_take(priority, now):
+                    self.tokens -= 1
+                    return now - start
+                wait = self._seconds_until(priority, now) or 0.05
+            if timeout is not None and now - start + wait > timeout:
+                LLM_RATE_LIMIT_EVENTS.inc((self.model, "queue_timeout"))
+                raise RateLimitTimeout(
+                    f"Waited {timeout:.1f}s for a {self.model} rate-limit token ({PRIORITY_NAMES[priority]})"
+                )
+            time.sleep(wait)
+
+    # --- 429 handling -----------------------------------------------------------
+
+    def backoff(self, seconds: float) -> None:
+        """Empty the bucket and hand out no tokens for `seconds` (after Gemini returned 429)."""
+        with self._lock:
+            self.tokens = 0.0
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def _model_setting(name: str, model: str, default: float) -> float:
+    """AI_RATE_LIMIT_<NAME>_<MODEL> (model upper-cased, non-alphanumerics as _), else AI_RATE_LIMIT_<NAME>."""
+    suffix = re.sub(r"[^A-Z0-9]", "_", model.upper())
+    value = os.getenv(f"AI_RATE_LIMIT_{name}_{suffix}") or os.getenv(f"AI_RATE_LIMIT_{name}")
+    return float(value) if value else default
+
+
+def get_bucket(model: str) -> TokenBucket:
+    """Return the worker's shared bucket for `model`, creating it from the environment on first use."""
+    bucket = _buckets.get(model)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(model)
+            if bucket is None:
+                bucket = TokenBucket(model, _model_setting("RPM", model, DEFAULT_RPM),
+                                     _model_setting("BURST", model, DEFAULT_BURST))
+                _buckets[model] = bucket
+    return bucket
+
+
+def reset_buckets() -> None:
+    """Drop every bucket so limits are re-read from the environment (used by tests)."""
+    with _buckets_lock:
+        _buckets.clear()
+
+
+# =============================================================================
+# 429 BACKOFF
+# =============================================================================
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True for Gemini quota errors (HTTP 429 / RESOURCE_EXHAUSTED), however the client wrapped them."""
+    while error is not None:
+        if isinstance(error, ResourceExhausted) or getattr(error, "code", None) == 429:
+            return True
+        message = str(error)
+        if message.startswith("429") or "RESOURCE_EXHAUSTED" in message or "Resource has been exhausted" in message:
+            return True
+        error = error.__cause__
+    return False
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    cap = min(AI_RATE_LIMIT_BACKOFF_MAX_SECONDS, AI_RATE_LIMIT_BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+# =============================================================================
+# RATE-LIMITED RUNNABLE
+# =============================================================================
+
+class RateLimitedRunnable(Runnable):
+    """
+    Take a token from `model`'s bucket before every call to `runnable`, and back
+    off and retry on 429.
+
+    Wraps a chat model; bind_tools / with_structured_output results are wrapped
+    too, so chains and the agent built on top stay limited.
+    """
+
+    def __init__(self, runnable: Runnable, model: str):
+        self.runnable = runnable
+        self.model = model
+
+    def bind_tools(self, *args, **kwargs) -> "RateLimitedRunnable":
+        return RateLimitedRunnable(self.runnable.bind_tools(*args, **kwargs), self.model)
+
+    def with_structured_output(self, *args, **kwargs) -> "RateLimitedRunnable":
+        return RateLimitedRunnable(self.runnable.with_structured_output(*args, **kwargs), self.model)
+
+    def _on_error(self, error: Exception, attempt: int) -> float:
+        """Return the backoff before retrying, or re-raise if `error` isn't retryable."""
+        if not is_rate_limited(error):
+            raise error
+        LLM_RATE_LIMIT_EVENTS.inc((self.model, "429"))
+        if attempt >= AI_RATE_LIMIT_MAX_RETRIES:
+            raise error
+        delay = backoff_delay(attempt)
+        get_bucket(self.model).backoff(delay)
+        LLM_RATE_LIMIT_EVENTS.inc((self.model, "retry"))
+        logger.warning("Gemini rate limit hit, backing off",
+                       extra={"model": self.model, "attempt": attempt + 1, "delay_seconds": round(delay, 2)})
+        return delay
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        priority = current_priority()
+        for attempt in itertools.count():
+            waited = get_bucket(self.model).acquire_sync(priority, _queue_timeout(priority))
+            LLM_QUEUE_WAIT_SECONDS.observe(waited, (self.model, PRIORITY_NAMES[priority]))
+            try:
+                return self.runnable.invoke(input, config, **kwargs)
+            except Exception as e:
+                self._on_error(e, attempt)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        priority = current_priority()
+        for attempt in itertools.count():
+            waited = await get_bucket(self.model).acquire(priority, _queue_timeout(priority))
+            LLM_QUEUE_WAIT_SECONDS.observe(waited, (self.model, PRIORITY_NAMES[priority]))
+            try:
+                return await self.runnable.ainvoke(input, config, **kwargs)
+            except Exception as e:
+                self._on_error(e, attempt)
+
+
+def rate_limited(runnable: Runnable, model: str) -> Runnable:
+    """Wrap `runnable` in the model's rate limiter when AI_RATE_LIMIT_ENABLED is on."""
+    if AI_RATE_LIMIT_ENABLED:
+        return RateLimitedRunnable(runnable, model)
+    return runnable
@@ -0,0 +1,210 @@
+"""
+Per-run context for the shared coaching agent.
+
+The agent and its tools are built once per worker (see get_coaching_agent),
+so the user they act for is bound per invocation through a context variable
+instead of closures:
+
+    with user_scope(user_id):
+        await agent_executor.ainvoke(inputs)
+
+Context variables are copied into asyncio tasks and into the worker threads
+LangChain uses for sync tools, and each run sets its own value, so concurrent
+runs for different users never see each other's user ID. Tools that read user
+data call current_user_id(), which raises if nothing is bound rather than
+falling back to some other user.
+
+Each scope also carries a portfolio snapshot: the first tool that needs the
+user's stories loads them (user_portfolio), and every later tool call in the
+same run reuses that list, so a coaching run reads Firestore at most once.
+Outside a run, or across runs, loads can be served from a short per-user
+cache (PORTFOLIO_CACHE_TTL_SECONDS, off by default) that stories_router
+clears on every story write (invalidate_portfolio).
+
+Each scope also carries a tool memo: the coaching tools (see
+ai.tools.create_user_tools) store their output by tool name and normalized
+arguments, so when the agent repeats a call in the same run it gets the first
+answer back without running the tool again. Callers can seed it with results
+they already have (seed_tool_result), e.g. /ai/process's pre-analysis.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from metrics import Counter
+
+# Seconds a user's stories may be reused across runs (0 disables the cache).
+# Writes through stories_router clear it on this worker only, so other
+# workers may serve stories up to this old.
+PORTFOLIO_CACHE_TTL_SECONDS = float(os.getenv("PORTFOLIO_CACHE_TTL_SECONDS", "0"))
+
+PORTFOLIO_READS = Counter(
+    "parfolio_portfolio_reads_total",
+    "User portfolio lookups by tools: served from the run snapshot, the per-user cache, or loaded.",
+    ("source",),
+)
+
+TOOL_MEMO_HITS = Counter(
+    "parfolio_tool_memo_hits_total",
+    "Agent tool calls answered from the run's memo instead of running the tool.",
+    ("tool",),
+)
+
+StoriesLoader = Callable[[str], List[dict]]
+
+_current_user_id: ContextVar[Optional[str]] = ContextVar("coaching_user_id", default=None)
+
+
+class PortfolioSnapshot:
+    """The user's stories, loaded at most once per run and shared by its tools."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self._stories: Optional[List[dict]] = None
+        # Sync tools run in worker threads, possibly several at once
+        self._lock = threading.Lock()
+
+    def stories(self, load: StoriesLoader) -> List[dict]:
+        with self._lock:
+            if self._stories is None:
+                self._stories = cached_portfolio(self.user_id, load)
+            else:
+                PORTFOLIO_READS.inc(("run",))
+            return self._stories
+
+
+_portfolio_snapshot: ContextVar[Optional[PortfolioSnapshot]] = ContextVar("portfolio_snapshot", default=None)
+
+
+def _normalize_arg(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+class ToolMemo:
+    """Tool outputs of one run, keyed by tool name and normalized arguments."""
+
+    def __init__(self):
+        self._results: Dict[Tuple[str, str], str] = {}
+        self.saved: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tool: str, args: dict) -> Tuple[str, str]:
+        """Whitespace in string arguments doesn't matter; None arguments are dropped."""
+        normalized = {name: _normalize_arg(value) for name, value in args.items() if value is not None}
+        return tool, json.dumps(normalized, sort_keys=True, default=str)
+
+    def get(self, tool: str, args: dict) -> Optional[str]:
+        with self._lock:
+            output = self._results.get(self.key(tool, args))
+            if output is not None:
+                self.saved[tool] = self.saved.get(tool, 0) + 1
+        if output is not None:
+            TOOL_MEMO_HITS.inc((tool,))
+        return output
+
+    def set(self, tool: str, args: dict, output: str):
+        with self._lock:
+            self._results[self.key(tool, args)] = output
+
+    @property
+    def saved_calls(self) -> int:
+        with self._lock:
+            return sum(self.saved.values())
+
+
+_tool_memo: ContextVar[Optional[ToolMemo]] = ContextVar("tool_memo", default=None)
+
+
+class NoUserBoundError(RuntimeError):
+    """Raised when a user-scoped tool runs outside user_scope()."""
+
+
+@contextlib.contextmanager
+def user_scope(user_id: str) -> Iterator[str]:
+    """Bind `user_id` for tools invoked in the enclosed block."""
+    if not user_id:
+        raise ValueError("user_scope requires a user ID")
+    token = _current_user_id.set(user_id)
+    snapshot_token = _portfolio_snapshot.set(PortfolioSnapshot(user_id))
+    memo_token = _tool_memo.set(ToolMemo())
+    try:
+        yield user_id
+    finally:
+        _tool_memo.reset(memo_token)
+        _portfolio_snapshot.reset(snapshot_token)
+        _current_user_id.reset(token)
+
+
+def current_user_id() -> str:
+    """Return the user bound to the current run."""
+    user_id = _current_user_id.get()
+    if not user_id:
+        raise NoUserBoundError("No user bound for this coaching run; wrap the call in user_scope()")
+    return user_id
+
+
+def current_tool_memo() -> Optional[ToolMemo]:
+    """Return the current run's tool memo, or None outside user_scope()."""
+    return _tool_memo.get()
+
+
+def seed_tool_result(tool: str, args: dict, output: str):
+    """Record a tool result computed outside the agent so the run's tool calls can reuse it."""
+    memo = _tool_memo.get()
+    if memo is not None:
+        memo.set(tool, args, output)
+
+
+def user_portfolio(user_id: str, load: StoriesLoader) -> List[dict]:
+    """
+    Return the user's stories, from the current run's snapshot when the run is
+    bound to `user_id`, otherwise from cached_portfolio. The list is shared:
+    callers must not modify it.
+    """
+    snapshot = _portfolio_snapshot.get()
+    if snapshot is not None and snapshot.user_id == user_id:
+        return snapshot.stories(load)
+    return cached_portfolio(user_id, load)
+
+
+_portfolio_cache: Dict[str, Tuple[float, List[dict]]] = {}
+_portfolio_cache_lock = threading.Lock()
+
+
+def cached_portfolio(user_id: str, load: StoriesLoader) -> List[dict]:
+    """
+    Load the user's stories through the per-user cache. Empty results aren't
+    cached, since the loader also returns [] when Firestore fails.
+    """
+    if PORTFOLIO_CACHE_TTL_SECONDS > 0:
+        with _portfolio_cache_lock:
+            entry = _portfolio_cache.get(user_id)
+        if entry is not None and time.monotonic() - entry[0] < PORTFOLIO_CACHE_TTL_SECONDS:
+            PORTFOLIO_READS.inc(("cache",))
+            return entry[1]
+
+    stories = load(user_id)
+    PORTFOLIO_READS.inc(("load",))
+    if stories and PORTFOLIO_CACHE_TTL_SECONDS > 0:
+        with _portfolio_cache_lock:
+            _portfolio_cache[user_id] = (time.monotonic(), stories)
+    return stories
+
+
+def invalidate_portfolio(user_id: str):
+    """Forget the user's cached stories (call after any write to their stories)."""
+    with _portfolio_cache_lock:
+        _portfolio_cache.pop(user_id, None)
+
+
+def reset_portfolio_cache():
+    """Drop every cached portfolio (tests and benchmarks)."""
+    with _portfolio_cache_lock:
+        _portfolio_cache.clear()
@@ -61,6 +61,23 @@ class TagResponse(BaseModel):
         description="List of 1-3 assigned competency tags with metadata."
     )
 
+class PARStructureWithTags(PARStructure):
+    """
+    Structured output for the fused "structure + tag" chain:
+    the PAR story plus its 1-3 competency tags from a single LLM call.
+    """
+    tags: List[TagAssignment] = Field(
+        ...,
+        min_length=1,
+        max_length=3,
+        description="List of 1-3 competency tags demonstrated by the structured story, with metadata."
+    )
+
+    def split(self) -> "tuple[PARStructure, TagResponse]":
+        """Return the equivalent (PARStructure, TagResponse) pair from the two-call path."""
+        structure = PARStructure(**self.model_dump(exclude={"tags"}))
+        return structure, TagResponse(tags=self.tags)
+
 class CoachingInsightSchema(BaseModel):
     """Single coaching insight with overview + detail for LLM parsing"""
     overview: str = Field(..., description="1-2 sentence summary of the insight.")
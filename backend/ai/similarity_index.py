@@ -0,0 +1,298 @@
+"""
+Per-user story similarity index (backs the find_similar_stories tool).
+
+Each user's stories are indexed once into TF-IDF vectors with inverted
+postings:
+- tags:    exact tag -> stories postings
+- title:   character trigrams, so partial and misspelled titles still match
+- content: words of problem/action/result (stopwords dropped, sublinear tf)
+
+A query only scores the stories reached through the postings of its tags and
+selective terms. Terms found in most stories are used to score those
+candidates, not to find them, unless there are too few candidates. Scores are
+weighted as before: 40% tag overlap, 20% title similarity and 40% content
+similarity, with cosine similarity in [0, 1] for the text parts.
+
+Indexes are kept per worker and updated in place when stories_router creates,
+updates or deletes a story (index_story / unindex_story). They are rebuilt
+from Firestore after SIMILARITY_INDEX_TTL_SECONDS, which bounds staleness from
+writes handled by other workers.
+"""
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Rebuild a user's index from Firestore after this many seconds
+SIMILARITY_INDEX_TTL_SECONDS = float(os.getenv("SIMILARITY_INDEX_TTL_SECONDS", "600"))
+# Indexes kept per worker (least recently used users are dropped first)
+SIMILARITY_INDEX_MAX_USERS = int(os.getenv("SIMILARITY_INDEX_MAX_USERS", "1000"))
+
+TAG_WEIGHT = 0.4
+TITLE_WEIGHT = 0.2
+CONTENT_WEIGHT = 0.4
+
+# Terms in more than this share of stories (and more than COMMON_TERM_MIN_DF
+# stories) only score candidates found through rarer terms
+COMMON_TERM_DF_RATIO = 0.1
+COMMON_TERM_MIN_DF = 8
+# Keep adding common-term postings until there are this many candidates per result
+CANDIDATES_PER_RESULT = 4
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+STOPWORDS = frozenset("""
+    a about after all also an and any are as at be because been but by can could did do does for from had
+    has have he her his how i if in into is it its me more most my no not of on or our out over she so
+    some than that the their them then there these they this those through to up us was we were what when
+    which while who will with would you your
+""".split())
+
+Terms = Dict[str, float]
+
+
+def content_terms(text: str) -> Counter:
+    """Word counts of `text`, lowercased, without stopwords and single characters."""
+    return Counter(w for w in _WORD.findall(text.lower()) if len(w) > 1 and w not in STOPWORDS)
+
+
+def title_terms(title: str) -> Counter:
+    """Character trigram counts of the normalized title."""
+    padded = f" {_NON_WORD.sub(' ', title.lower()).strip()} "
+    if len(padded) <= 2:
+        return Counter()
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def story_record(data: dict) -> dict:
+    """The story fields the index keeps, with the defaults ai.tools._get_user_stories uses."""
+    return {
+        "story_id": data.get("story_id"),
+        "title": data.get("title", "Untitled"),
+        "problem": data.get("problem", ""),
+        "action": data.get("action", ""),
+        "result": data.get("result", ""),
+        "tags": data.get("tags", []),
+        "status": data.get("status", "draft")
+    }
+
+
+def _story_content(story: dict) -> str:
+    return f"{story.get('problem') or ''} {story.get('action') or ''} {story.get('result') or ''}"
+
+
+class _TfidfField:
+    """Inverted postings and lazily normalized TF-IDF vectors for one text field."""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.doc_terms: Dict[str, Terms] = {}
+        self._norms: Dict[str, float] = {}
+        self._norms_generation = -1
+
+    def add(self, doc_id: str, counts: Counter):
+        terms = {term: 1.0 + math.log(count) for term, count in counts.items()}
+        self.doc_terms[doc_id] = terms
+        for term, weight in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = weight
+
+    def remove(self, doc_id: str):
+        for term in self.doc_terms.pop(doc_id, {}):
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+
+    def idf(self, term: str, doc_count: int) -> float:
+        """Smoothed idf, as in scikit-learn's TfidfVectorizer."""
+        return math.log((1 + doc_count) / (1 + len(self.postings.get(term, ())))) + 1.0
+
+    def query(self, counts: Counter, doc_count: int):
+        """Query weights (term -> tf * idf) and the query vector norm."""
+        weights = {term: (1.0 + math.log(count)) * self.idf(term, doc_count) for term, count in counts.items()}
+        return weights, math.sqrt(sum(w * w for w in weights.values()))
+
+    def candidates(self, weights: Terms, doc_count: int, found: set, wanted: int):
+        """Add stories sharing a selective term to `found`; common terms only if `found` is still short."""
+        common_df = max(COMMON_TERM_DF_RATIO * doc_count, COMMON_TERM_MIN_DF)
+        for term in sorted(weights, key=lambda t: len(self.postings.get(t, ()))):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            if len(posting) > common_df and len(found) >= wanted:
+                break
+            found.update(posting)
+
+    def cosine(self, doc_id: str, weights: Terms, query_norm: float, doc_count: int, generation: int) -> float:
+        terms = self.doc_terms.get(doc_id)
+        if not terms or not query_norm:
+            return 0.0
+        dot = sum(w * terms[t] * self.idf(t, doc_count) for t, w in weights.items() if t in terms)
+        if not dot:
+            return 0.0
+        return min(1.0, dot / (query_norm * self._norm(doc_id, terms, doc_count, generation)))
+
+    def _norm(self, doc_id: str, terms: Terms, doc_count: int, generation: int) -> float:
+        # idf changes with every write, so norms are recomputed lazily, and
+        # only for the stories a query actually scores
+        if self._norms_generation != generation:
+            self._norms.clear()
+            self._norms_generation = generation
+        norm = self._norms.get(doc_id)
+        if norm is None:
+            norm = math.sqrt(sum((w * self.idf(t, doc_count)) ** 2 for t, w in terms.items()))
+            self._norms[doc_id] = norm
+        return norm
+
+
+class StoryIndex:
+    """Similarity index over one user's stories. Safe to share between threads."""
+
+    def __init__(self, stories: Iterable[dict] = ()):
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._stories: Dict[str, dict] = {}
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        self._tags: Dict[str, Dict[str, None]] = {}
+        self._title = _TfidfField()
+        self._content = _TfidfField()
+        self._generation = 0
+        for story in stories:
+            self.upsert(story)
+
+    def __len__(self) -> int:
+        return len(self._stories)
+
+    def upsert(self, story: dict):
+        """Index a new story or re-index an updated one (matched by story_id)."""
+        story = story_record(story)
+        with self._lock:
+            # Stories without an ID can't be updated later but are still searchable
+            story_id = story["story_id"] or f"#{self._next_order}"
+            self._remove(story_id)
+            self._stories[story_id] = story
+            if story_id not in self._order:
+                self._order[story_id] = self._next_order
+                self._next_order += 1
+            for tag in set(story.get("tags") or []):
+                self._tags.setdefault(tag, {})[story_id] = None
+            self._title.add(story_id, title_terms(story.get("title") or ""))
+            self._content.add(story_id, content_terms(_story_content(story)))
+            self._generation += 1
+
+    def remove(self, story_id: str):
+        with self._lock:
+            self._remove(story_id)
+            self._order.pop(story_id, None)
+            self._generation += 1
+
+    def _remove(self, story_id: str):
+        story = self._stories.pop(story_id, None)
+        if story is None:
+            return
+        for tag in set(story.get("tags") or []):
+            posting = self._tags[tag]
+            del posting[story_id]
+            if not posting:
+                del self._tags[tag]
+        self._title.remove(story_id)
+        self._content.remove(story_id)
+
+    def search(
+        self,
+        title: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        content: Optional[str] = None,
+        top_k: int = 3
+    ) -> List[dict]:
+        """Top `top_k` stories by weighted similarity, as story dicts with a similarity_score."""
+        query_tags = set(tags or [])
+        with self._lock:
+            doc_count = len(self._stories)
+            title_weights, title_norm = self._title.query(title_terms(title or ""), doc_count)
+            content_weights, content_norm = self._content.query(content_terms(content or ""), doc_count)
+
+            found = set()
+            for tag in query_tags:
+                found.update(self._tags.get(tag, ()))
+            wanted = max(top_k, 1) * CANDIDATES_PER_RESULT
+            self._title.candidates(title_weights, doc_count, found, wanted)
+            self._content.candidates(content_weights, doc_count, found, wanted)
+
+            scored = []
+            for story_id in found:
+                story = self._stories[story_id]
+                score = 0.0
+                story_tags = set(story.get("tags") or [])
+                if query_tags and story_tags:
+                    score += len(story_tags & query_tags) / len(query_tags) * TAG_WEIGHT
+                score += TITLE_WEIGHT * self._title.cosine(
+                    story_id, title_weights, title_norm, doc_count, self._generation)
+                score += CONTENT_WEIGHT * self._content.cosine(
+                    story_id, content_weights, content_norm, doc_count, self._generation)
+                if score > 0:
+                    scored.append((score, -self._order[story_id], story))
+
+        best = heapq.nlargest(top_k, scored, key=lambda item: item[:2])
+        return [{**story, "similarity_score": score} for score, _, story in best]
+
+
+# =============================================================================
+# PER-USER REGISTRY
+# =============================================================================
+
+_indexes: "OrderedDict[str, StoryIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_story_index(user_id: str, load_stories: Callable[[str], List[dict]]) -> StoryIndex:
+    """
+    Return the user's index, building it with `load_stories(user_id)` when it
+    is missing or older than the TTL. Empty portfolios aren't cached, so a
+    failed fetch doesn't hide the user's stories until the TTL runs out.
+    """
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None and time.monotonic() - index.built_at < SIMILARITY_INDEX_TTL_SECONDS:
+            _indexes.move_to_end(user_id)
+            return index
+
+    index = StoryIndex(load_stories(user_id))
+    if len(index):
+        with _indexes_lock:
+            _indexes[user_id] = index
+            _indexes.move_to_end(user_id)
+            while len(_indexes) > SIMILARITY_INDEX_MAX_USERS:
+                _indexes.popitem(last=False)
+    return index
+
+
+def index_story(user_id: str, story: dict):
+    """Apply a created or updated story to the user's index, if one is loaded."""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    if index is not None:
+        index.upsert(story)
+
+
+def unindex_story(user_id: str, story_id: str):
+    """Drop a deleted story from the user's index, if one is loaded."""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    if index is not None:
+        index.remove(story_id)
+
+
+def reset_story_indexes():
+    """Drop every loaded index (tests and benchmarks)."""
+    with _indexes_lock:
+        _indexes.clear()
@@ -0,0 +1,109 @@
+"""
+Persistent key/value cache on a local SQLite file, shared by all uvicorn
+workers on a node.
+
+- Entries expire after their TTL.
+- Total stored size is capped in bytes; when a write pushes the cache over
+  the cap, least-recently-used entries are evicted first.
+- WAL mode lets readers in other processes proceed while one process writes.
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class SQLiteCache:
+    """
+    Args:
+        path: SQLite file path (parent directory is created if needed)
+        max_bytes: Cap on the total size of stored values
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the stored value, or None if missing or expired."""
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        now = time.time()
+        if now > expires_at:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        """Store a value for `ttl` seconds, then evict LRU entries if over the size cap."""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, value, size, now + ttl, now)
+        )
+        self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                victims = []
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append((key,))
+                    total -= size
+                conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+                self.evictions += len(victims)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM entries")
+
+    def stats(self) -> dict:
+        """Return entry count and total stored bytes."""
+        count, total = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes, "evictions": self.evictions}
@@ -0,0 +1,302 @@
+"""
+Token budgets and deterministic prompt compaction for the Gemini chains.
+
+Every chain in ai/chains.py starts with compaction_step(chain_name), which
+measures the prompt (template plus inputs) and shrinks the inputs before the
+LLM call:
+
+1. Always: collapse runs of whitespace in every text input, and drop spoken
+   filler ("um", "uh", "you know,", stuttered words) from raw transcripts.
+2. Over budget: drop the least useful profile lines (company sizes first,
+   roles and career stage last; see PROFILE_TRIM_ORDER).
+3. Still over: shorten the longest free-text inputs with an extractive
+   summary that keeps the opening and closing sentences, sentences with
+   numbers or outcomes, and marks the gaps with "[...]".
+
+Compaction is a pure function of the inputs, so the same inputs always yield
+the same prompt and LLM output caches keep working. Each call that saves
+tokens is logged with the before/after counts, and totals are exported on
+/metrics.
+
+Tokens are estimated locally (AI_TOKEN_CHARS_PER_TOKEN characters per token,
+Google's rule of thumb for Gemini) instead of calling the countTokens API,
+which would add a network round trip to every call. Budgets are per chain,
+override with AI_TOKEN_BUDGET_<CHAIN> (e.g. AI_TOKEN_BUDGET_STRUCTURE=3000).
+"""
+import logging
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableLambda, RunnablePassthrough
+
+from concurrency import run_blocking
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+AI_PROMPT_COMPACTION = os.getenv("AI_PROMPT_COMPACTION", "true").lower() not in ("0", "false", "no")
+AI_TOKEN_CHARS_PER_TOKEN = float(os.getenv("AI_TOKEN_CHARS_PER_TOKEN", "4"))
+
+# Default input budget per chain (template + inputs, in estimated tokens)
+DEFAULT_TOKEN_BUDGETS = {
+    "structure": 4000,
+    "structure_and_tag": 4500,
+    "tagging": 2500,
+    "coaching": 3000,
+    "coaching_agent": 4000,
+    "memory_summarization": 16000,
+}
+
+# Inputs that are speech transcripts (filler removal applies)
+TRANSCRIPT_FIELDS = ("raw_transcript",)
+# Free-text inputs that may be summarized when over budget, longest first at run time
+SUMMARIZABLE_FIELDS = ("raw_transcript", "text_chunk", "action", "problem", "result", "pre_analysis")
+# A summarized field keeps at least this many tokens
+MIN_FIELD_TOKENS = 150
+# Inputs larger than this (characters) are compacted in a worker thread
+INLINE_COMPACTION_CHARS = 20000
+
+PROFILE_FIELD = "user_profile"
+# Profile lines dropped first when over budget
+PROFILE_TRIM_ORDER = ("current_company_size", "target_company_size", "current_company", "target_companies")
+PROFILE_FIELDS = (
+    "current_role", "target_role", "career_stage", "current_company",
+    "target_companies", "current_company_size", "target_company_size",
+)
+NO_PROFILE = "None provided"
+
+PROMPT_TOKENS = Counter(
+    "parfolio_llm_prompt_tokens_total",
+    "Estimated prompt tokens per chain: sent to the model, and removed by compaction.",
+    ("chain", "kind"),
+)
+
+
+def count_tokens(text: str) -> int:
+    """Estimated Gemini token count of `text`."""
+    return math.ceil(len(text) / AI_TOKEN_CHARS_PER_TOKEN) if text else 0
+
+
+def get_token_budget(chain_name: str) -> int:
+    value = os.getenv(f"AI_TOKEN_BUDGET_{chain_name.upper()}")
+    return int(value) if value else DEFAULT_TOKEN_BUDGETS[chain_name]
+
+
+@lru_cache(maxsize=None)
+def template_tokens(chain_name: str) -> int:
+    """Tokens of the chain's static prompt (without inputs)."""
+    from ai.chains import CHAIN_PROMPTS
+    return count_tokens(CHAIN_PROMPTS[chain_name].pretty_repr())
+
+
+def prompt_tokens(chain_name: str, inputs: Dict[str, Any]) -> int:
+    """Estimated tokens of the full prompt for these inputs."""
+    return template_tokens(chain_name) + sum(count_tokens(v) for v in inputs.values() if isinstance(v, str))
+
+
+# =============================================================================
+# TEXT COMPACTION
+# =============================================================================
+
+# Only runs that actually need rewriting (a single space is left alone)
+_SPACES = re.compile(r"[ \t\f\v]{2,}|[\t\f\v]")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+# Hesitations (with the comma after them), plus "you know," as an aside.
+# "like", "so", "I mean" are left alone because they often carry meaning, and
+# "mm"/"hm" because they are also units ("5 mm"). Sentence-ending punctuation
+# after a hesitation is kept so sentences aren't merged
+_FILLER = re.compile(r"\b(?=[uey])(?:(?:u+m+|u+h+|uhm+|e+r+m+)\b,?|you know,)\s*", re.IGNORECASE)
+# Stutters only ("I I", "the the"): other words can repeat legitimately ("had had", "so so")
+_REPEATED_WORD = re.compile(r"\b(I|we|the|an?|and|u+m+|u+h+)(?:\s+\1\b)+", re.IGNORECASE)
+# Left behind when a hesitation ended a sentence ("It shipped, uh." -> "It shipped, .")
+_BEFORE_SENTENCE_END = re.compile(r",?[ \t]+(?=[.!?](?:\s|$))")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# Sentences with figures or outcomes are kept first when summarizing
+_SALIENT = re.compile(
+    r"\d|%|\$|\b(?:result|increase|decrease|reduc|improv|grew|grow|sav|launch|deliver|led|impact)\w*",
+    re.IGNORECASE,
+)
+GAP_MARKER = "[...]"
+
+
+def squeeze_whitespace(text: str) -> str:
+    """Collapse runs of spaces and blank lines; keeps single line breaks (lists, headings)."""
+    text = _SPACES.sub(" ", text)
+    text = _BLANK_LINES.sub("\n\n", text)
+    return "\n".join(line.strip() for line in text.split("\n")).strip()
+
+
+def drop_filler(text: str) -> str:
+    """Remove spoken filler and stuttered words ("I I", "the the") from a transcript."""
+    text = _FILLER.sub("", text)
+    text = _REPEATED_WORD.sub(r"\1", text)
+    text = _BEFORE_SENTENCE_END.sub("", _SPACES.sub(" ", text))
+    # Filler at a sentence start leaves a lowercase first word; that's fine for the model
+    return text.replace(" ,", ",").strip()
+
+
+def summarize_text(text: str, max_tokens: int) -> str:
+    """
+    Extractive summary of `text` within `max_tokens`.
+
+    Keeps sentences in their original order, choosing the first two and last
+    two, then sentences with figures or outcomes, then the rest from the top.
+    Omitted runs are marked with "[...]". Falls back to cutting the text when
+    even the anchor sentences don't fit.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Spoken stories repeat themselves; keep the first occurrence
+    sentences: List[str] = list(dict.fromkeys(s.strip() for s in _SENTENCE_END.split(text) if s.strip()))
+
+    anchors = [0, 1, len(sentences) - 2, len(sentences) - 1]
+    salient = [i for i, s in enumerate(sentences) if _SALIENT.search(s)]
+    order = list(dict.fromkeys(i for i in anchors + salient + list(range(len(sentences))) if 0 <= i < len(sentences)))
+
+    marker_tokens = count_tokens(GAP_MARKER) + 1
+    chosen, used = set(), 0
+    for i in order:
+        cost = count_tokens(sentences[i]) + 1 + marker_tokens
+        if used + cost > max_tokens:
+            continue
+        chosen.add(i)
+        used += cost
+
+    if not chosen:
+        return text[:max(0, int(max_tokens * AI_TOKEN_CHARS_PER_TOKEN) - len(GAP_MARKER) - 1)].rstrip() + " " + GAP_MARKER
+
+    parts, previous = [], -1
+    for i in sorted(chosen):
+        if i != previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(sentences[i])
+        previous = i
+    if previous != len(sentences) - 1:
+        parts.append(GAP_MARKER)
+    return " ".join(parts)
+
+
+# =============================================================================
+# PROFILE
+# =============================================================================
+
+def compact_profile(profile: Optional[Dict[str, Any]]) -> str:
+    """
+    Format the coaching-relevant profile fields as "field: value" lines.
+
+    Empty fields are dropped, and so is repetition: a target role equal to the
+    current role, a target company size equal to the current one, and the
+    current company inside target_companies.
+    """
+    if not profile:
+        return NO_PROFILE
+    fields = {k: profile.get(k) for k in PROFILE_FIELDS if profile.get(k) not in (None, "", [])}
+    if fields.get("target_role") and fields.get("target_role") == fields.get("current_role"):
+        del fields["target_role"]
+    if fields.get("target_company_size") and fields.get("target_company_size") == fields.get("current_company_size"):
+        del fields["target_company_size"]
+    targets = fields.get("target_companies")
+    if isinstance(targets, list):
+        current = (fields.get("current_company") or "").lower()
+        targets = list(dict.fromkeys(t for t in targets if t and t.lower() != current))
+        if targets:
+            fields["target_companies"] = ", ".join(targets)
+        else:
+            del fields["target_companies"]
+    if not fields:
+        return NO_PROFILE
+    return "\n".join(f"{key}: {value}" for key, value in fields.items())
+
+
+def _drop_profile_line(profile_text: str, field: str) -> str:
+    lines = [line for line in profile_text.split("\n") if not line.startswith(f"{field}:")]
+    return "\n".join(lines) if lines else NO_PROFILE
+
+
+# =============================================================================
+# COMPACTION
+# =============================================================================
+
+def compact_inputs(chain_name: str, inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Shrink `inputs` toward the chain's token budget.
+
+    Returns (compacted inputs, report); the report has tokens_before,
+    tokens_after, budget and the steps applied. Non-text inputs (e.g. the
+    agent's intermediate_steps) pass through untouched.
+    """
+    budget = get_token_budget(chain_name)
+    tokens_before = prompt_tokens(chain_name, inputs)
+    compacted = dict(inputs)
+    steps: List[str] = []
+
+    for key, value in inputs.items():
+        if isinstance(value, str):
+            value = squeeze_whitespace(value)
+            if key in TRANSCRIPT_FIELDS:
+                value = drop_filler(value)
+            compacted[key] = value
+    tokens = prompt_tokens(chain_name, compacted)
+    if tokens < tokens_before:
+        steps.append("normalize")
+
+    if tokens > budget and isinstance(compacted.get(PROFILE_FIELD), str):
+        for field in PROFILE_TRIM_ORDER:
+            if tokens <= budget:
+                break
+            trimmed = _drop_profile_line(compacted[PROFILE_FIELD], field)
+            if trimmed != compacted[PROFILE_FIELD]:
+                compacted[PROFILE_FIELD] = trimmed
+                tokens = prompt_tokens(chain_name, compacted)
+                steps.append(f"profile:-{field}")
+
+    if tokens > budget:
+        fields = [k for k in SUMMARIZABLE_FIELDS if isinstance(compacted.get(k), str)]
+        for key in sorted(fields, key=lambda k: (-count_tokens(compacted[k]), SUMMARIZABLE_FIELDS.index(k))):
+            if tokens <= budget:
+                break
+            field_tokens = count_tokens(compacted[key])
+            target = max(MIN_FIELD_TOKENS, field_tokens - (tokens - budget))
+            if target >= field_tokens:
+                continue
+            compacted[key] = summarize_text(compacted[key], target)
+            tokens = prompt_tokens(chain_name, compacted)
+            steps.append(f"summarize:{key}")
+
+    return compacted, {"tokens_before": tokens_before, "tokens_after": tokens, "budget": budget, "steps": steps}
+
+
+def _compact_and_log(chain_name: str, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    compacted, report = compact_inputs(chain_name, inputs)
+    # The agent re-sends its original inputs on every step; only count the first
+    if not inputs.get("intermediate_steps"):
+        saved = report["tokens_before"] - report["tokens_after"]
+        PROMPT_TOKENS.inc((chain_name, "sent"), report["tokens_after"])
+        if saved > 0:
+            PROMPT_TOKENS.inc((chain_name, "saved"), saved)
+            logger.info("Prompt compacted", extra={"chain": chain_name, "tokens_saved": saved, **report})
+        if report["tokens_after"] > report["budget"]:
+            logger.warning("Prompt over token budget after compaction", extra={"chain": chain_name, **report})
+    return compacted
+
+
+def compaction_step(chain_name: str) -> Runnable:
+    """Runnable placed in front of a chain's prompt to compact its inputs (identity when disabled)."""
+    if not AI_PROMPT_COMPACTION:
+        return RunnablePassthrough()
+
+    def compact(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return _compact_and_log(chain_name, inputs)
+
+    async def acompact(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # Typical inputs take well under a millisecond, cheaper inline than a
+        # thread hop; long documents are compacted off the event loop
+        size = sum(len(v) for v in inputs.values() if isinstance(v, str))
+        if size > INLINE_COMPACTION_CHARS:
+            return await run_blocking(_compact_and_log, chain_name, inputs)
+        return _compact_and_log(chain_name, inputs)
+
+    return RunnableLambda(compact, afunc=acompact, name=f"compact_{chain_name}")
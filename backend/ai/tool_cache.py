@@ -1,15 +1,139 @@
 """
-Simple in-memory cache with TTL for expensive API calls (e.g., Tavily).
+Two-tier cache for expensive tool calls (Tavily searches).
+
+- Memory tier: per-process LRU capped at AI_TOOL_CACHE_MEMORY_MAX_BYTES.
+- Persistent tier: a SQLite file (ai.sqlite_cache.SQLiteCache) shared by
+  every uvicorn worker on the node, capped at AI_TOOL_CACHE_MAX_BYTES with LRU
+  eviction, so one worker's search is reused by the others and survives
+  restarts.
+
+Reads check memory first, then SQLite (hits are promoted to memory). Writes
+go to both tiers. Each tool has its own TTL (TOOL_TTLS, overridable with
+AI_TOOL_CACHE_TTL_<TOOL>), and an entry keeps its original expiry when it's
+promoted. Hits, misses and evictions per tier are exported on /metrics.
+
+Concurrent misses for the same query in one worker are coalesced into a
+single search (concurrency.SingleFlight).
+
+Persistent-tier errors never fail a tool call; they are logged and treated
+as misses.
 """
 import hashlib
+import json
+import logging
+import os
+import threading
 import time
-from typing import Optional, Any, Dict
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Any, Tuple
+
+from ai.sqlite_cache import SQLiteCache
+from concurrency import SingleFlight
+from metrics import Counter, Gauge, span
+
+logger = logging.getLogger(__name__)
 
 # Default TTL: 24 hours (in seconds)
 DEFAULT_TTL = 24 * 60 * 60
 
-# In-memory cache storage: {cache_key: (value, expiry_timestamp)}
-_cache: Dict[str, tuple[Any, float]] = {}
+# Per-tool TTLs in seconds; override with AI_TOOL_CACHE_TTL_<TOOL>, e.g. AI_TOOL_CACHE_TTL_ROLE_TRENDS
+TOOL_TTLS = {
+    "company_insights": 7 * 24 * 60 * 60,  # Interview processes change slowly
+    "role_trends": 3 * 24 * 60 * 60,
+    "industry_context": 7 * 24 * 60 * 60,
+    "metric_benchmarks": 14 * 24 * 60 * 60,
+}
+
+TOOL_CACHE_PERSIST = os.getenv("AI_TOOL_CACHE_PERSIST", "true").lower() not in ("0", "false", "no")
+TOOL_CACHE_PATH = os.getenv(
+    "AI_TOOL_CACHE_PATH",
+    str(Path(__file__).parent.parent / "data" / "tool_cache.sqlite3")
+)
+# Default size caps: 32 MB on disk, 8 MB in memory per worker
+TOOL_CACHE_MAX_BYTES = int(os.getenv("AI_TOOL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TOOL_CACHE_MEMORY_MAX_BYTES = int(os.getenv("AI_TOOL_CACHE_MEMORY_MAX_BYTES", str(8 * 1024 * 1024)))
+
+TOOL_CACHE_EVENTS = Counter(
+    "parfolio_tool_cache_events_total",
+    "Tool cache lookups and evictions per tool and tier (memory or sqlite).",
+    ("tool", "tier", "event"),
+)
+TOOL_CACHE_BYTES = Gauge(
+    "parfolio_tool_cache_bytes", "Bytes stored in the tool cache per tier (memory is per worker).", ("tier",)
+)
+
+MEMORY_TIER = "memory"
+SQLITE_TIER = "sqlite"
+
+
+def tool_ttl(tool: str) -> int:
+    """TTL in seconds for a tool's cached results."""
+    env_value = os.getenv(f"AI_TOOL_CACHE_TTL_{tool.upper()}")
+    return int(env_value) if env_value else TOOL_TTLS.get(tool, DEFAULT_TTL)
+
+
+class _MemoryLRU:
+    """Thread-safe LRU of (value, expires_at, size) entries, capped in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry[1]:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key: str, value: Any, expires_at: float, size: int) -> int:
+        """Store an entry; returns how many other entries were evicted to fit it."""
+        evicted = 0
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                return 0
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                evicted += 1
+            TOOL_CACHE_BYTES.set((MEMORY_TIER,), self._bytes)
+        return evicted
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            TOOL_CACHE_BYTES.set((MEMORY_TIER,), 0)
+
+
+_memory = _MemoryLRU(TOOL_CACHE_MEMORY_MAX_BYTES)
+_searches = SingleFlight("tavily_search")
+_store: Optional[SQLiteCache] = None
+_store_lock = threading.Lock()
+
+
+def get_tool_store() -> SQLiteCache:
+    """Return the shared SQLite tier, opening it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SQLiteCache(TOOL_CACHE_PATH, TOOL_CACHE_MAX_BYTES)
+    return _store
 
 
 def _generate_cache_key(prefix: str, **kwargs) -> str:
@@ -20,67 +144,138 @@ def _generate_cache_key(prefix: str, **kwargs) -> str:
     return hashlib.md5(key_string.encode()).hexdigest()
 
 
-def cache_get(key: str) -> Optional[Any]:
+def tavily_cache_key(query: str) -> str:
+    """Cache key for a Tavily query; case and whitespace don't matter ("google" == "Google")."""
+    return _generate_cache_key("tavily", query=" ".join(query.split()).casefold())
+
+
+def _store_get(key: str) -> Optional[Tuple[Any, float, int]]:
+    if not TOOL_CACHE_PERSIST:
+        return None
+    try:
+        payload = get_tool_store().get(key)
+        if payload is None:
+            return None
+        entry = json.loads(payload)
+    except Exception as e:
+        logger.warning("Tool cache read failed", extra={"error": str(e)})
+        return None
+    if time.time() >= entry["expires_at"]:
+        return None
+    return entry["value"], entry["expires_at"], len(payload.encode("utf-8"))
+
+
+def cache_get(key: str, tool: str = "tavily", record: bool = True) -> Optional[Any]:
     """
     Retrieve a value from cache if it exists and hasn't expired.
 
     Args:
         key: The cache key
+        tool: Tool name, for the hit/miss metrics
+        record: Count the lookup in the hit/miss metrics (False for prefetching,
+            whose lookups aren't tool calls)
 
     Returns:
         The cached value, or None if not found/expired
     """
-    if key not in _cache:
-        return None
+    def count(tier: str, event: str):
+        if record:
+            TOOL_CACHE_EVENTS.inc((tool, tier, event))
 
-    value, expiry = _cache[key]
-    if time.time() > expiry:
-        # Expired, remove and return None
-        del _cache[key]
+    entry = _memory.get(key)
+    if entry is not None:
+        count(MEMORY_TIER, "hit")
+        return entry[0]
+    count(MEMORY_TIER, "miss")
+
+    entry = _store_get(key)
+    if entry is None:
+        if TOOL_CACHE_PERSIST:
+            count(SQLITE_TIER, "miss")
         return None
+    count(SQLITE_TIER, "hit")
 
+    value, expires_at, size = entry
+    _set_memory(key, value, expires_at, size, tool)
     return value
 
 
-def cache_set(key: str, value: Any, ttl: int = DEFAULT_TTL) -> None:
+def _set_memory(key: str, value: Any, expires_at: float, size: int, tool: str):
+    evicted = _memory.set(key, value, expires_at, size)
+    if evicted:
+        TOOL_CACHE_EVENTS.inc((tool, MEMORY_TIER, "eviction"), evicted)
+
+
+def cache_set(key: str, value: Any, ttl: int = DEFAULT_TTL, tool: str = "tavily") -> None:
     """
-    Store a value in cache with TTL.
+    Store a value in both cache tiers with TTL.
 
     Args:
         key: The cache key
-        value: The value to store
+        value: The value to store (JSON-serializable values also go to the SQLite tier)
         ttl: Time-to-live in seconds (default: 24 hours)
+        tool: Tool name, for the eviction metrics
     """
-    expiry = time.time() + ttl
-    _cache[key] = (value, expiry)
+    expires_at = time.time() + ttl
+    try:
+        payload = json.dumps({"value": value, "expires_at": expires_at})
+    except (TypeError, ValueError):
+        payload = None  # Memory tier only
+    size = len(payload.encode("utf-8")) if payload is not None else len(repr(value))
+    _set_memory(key, value, expires_at, size, tool)
+
+    if not TOOL_CACHE_PERSIST or payload is None or ttl <= 0:
+        return
+    try:
+        store = get_tool_store()
+        evictions_before = store.evictions
+        store.set(key, payload, ttl)
+        if store.evictions > evictions_before:
+            TOOL_CACHE_EVENTS.inc((tool, SQLITE_TIER, "eviction"), store.evictions - evictions_before)
+        TOOL_CACHE_BYTES.set((SQLITE_TIER,), store.stats()["bytes"])
+    except Exception as e:
+        logger.warning("Tool cache write failed", extra={"tool": tool, "error": str(e)})
 
 
 def cache_clear() -> None:
-    """Clear all cached values."""
-    global _cache
-    _cache = {}
+    """Clear all cached values (both tiers)."""
+    _memory.clear()
+    if TOOL_CACHE_PERSIST:
+        get_tool_store().clear()
+        TOOL_CACHE_BYTES.set((SQLITE_TIER,), 0)
 
 
-def cached_tavily_search(query: str, search_func, ttl: int = DEFAULT_TTL) -> str:
+def cached_tavily_search(
+    query: str, search_func, ttl: Optional[int] = None, tool: str = "tavily", record: bool = True
+) -> str:
     """
     Execute a Tavily search with caching.
 
     Args:
         query: The search query
         search_func: The function to call if cache miss
-        ttl: Cache TTL in seconds
+        ttl: Cache TTL in seconds (default: the tool's TTL, see TOOL_TTLS)
+        tool: Calling tool, for its TTL and the cache metrics
+        record: Count the lookups in the hit/miss metrics (see cache_get)
 
     Returns:
         The search results (cached or fresh)
     """
-    cache_key = _generate_cache_key("tavily", query=query)
+    cache_key = tavily_cache_key(query)
 
-    cached = cache_get(cache_key)
+    cached = cache_get(cache_key, tool, record)
     if cached is not None:
         return cached
 
-    # Execute search
-    result = search_func(query)
-    cache_set(cache_key, result, ttl)
+    def search():
+        # The previous leader may have filled the cache since our lookup
+        cached = cache_get(cache_key, tool, record)
+        if cached is not None:
+            return cached
+        with span("tavily_search"):
+            result = search_func(query)
+        cache_set(cache_key, result, tool_ttl(tool) if ttl is None else ttl, tool)
+        return result
 
-    return result
+    # Concurrent misses for the same query share one search
+    return _searches.do(cache_key, search)
@@ -4,22 +4,36 @@ AI Coaching Agent Tools
 This module provides tools for the coaching agent to analyze stories,
 access user portfolio data, and gather market intelligence.
 """
+import bisect
+import functools
+import inspect
+import logging
 import re
 import os
-from typing import List, Optional
-from difflib import SequenceMatcher
-from langchain_core.tools import tool, BaseTool
+from typing import Dict, Iterable, List, Optional, Tuple
+from langchain_core.tools import tool, BaseTool, StructuredTool
 from memory.client import get_user_collection
 from firebase_admin import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 from ai.tool_cache import cached_tavily_search
+from ai import fake_providers
+from ai.deadline import tool_budget_exhausted, BUDGET_EXHAUSTED_TOOL_MESSAGE
+from ai.run_context import current_tool_memo, current_user_id, user_portfolio
+from ai.similarity_index import get_story_index
+from portfolio_stats import compute_stats, read_stats
+from concurrency import SingleFlight
+from metrics import span
 
+logger = logging.getLogger(__name__)
 
 # =============================================================================
 # EXISTING TOOL: Personal Memory Search
 # =============================================================================
 
+_memory_searches = SingleFlight("memory_search")
+
+
 @tool
 def search_personal_memory(query: str, user_id: str, top_k: int = 3) -> str:
     """
@@ -38,12 +52,17 @@ def search_personal_memory(query: str, user_id: str, top_k: int = 3) -> str:
     Returns:
         A formatted string containing the most relevant memory entries found, or a message if none are found.
     """
+    def query_memory():
+        with span("memory_search"):
+            collection = get_user_collection(user_id)
+            return collection.query(
+                query_texts=[query],
+                n_results=top_k
+            )
+
     try:
-        collection = get_user_collection(user_id)
-        results = collection.query(
-            query_texts=[query],
-            n_results=top_k
-        )
+        # Identical concurrent searches (e.g. parallel runs for one user) share one query
+        results = _memory_searches.do((user_id, query, top_k), query_memory)
 
         if not results["documents"] or not results["documents"][0]:
             return f"No relevant personal memories found for query: {query}"
@@ -106,16 +125,85 @@ CAREER_STAGE_KEYWORDS = {
 }
 
 
-def _detect_weak_storytelling_patterns(problem: str, action: str, result: str) -> dict:
-    """Internal implementation for detecting weak storytelling patterns."""
-    full_text = f"{problem} {action} {result}".lower()
+class PatternSet:
+    """
+    A list of regex patterns compiled once into a single alternation.
+
+    Each pattern becomes a named group (`<name>_<index>`), so one scan finds
+    every pattern's matches and m.lastgroup tells which one matched; a
+    first-letter lookahead skips positions where no pattern can start. Counting
+    the scan's matches equals summing re.findall over the patterns separately
+    as long as no two patterns can match overlapping text, which holds for the
+    sets below (each starts with a different word or phrase; see
+    tests/test_storytelling_patterns.py).
+    """
+
+    def __init__(self, name: str, patterns: List[str], flags: int = re.IGNORECASE):
+        self.name = name
+        self.patterns = list(patterns)
+        alternation = "|".join(f"(?P<{name}_{i}>{pattern})" for i, pattern in enumerate(self.patterns))
+        self.regex = re.compile(_first_char_guard(self.patterns) + f"(?:{alternation})", flags)
+
+    def count(self, text: str) -> int:
+        """Total matches of all patterns in `text`."""
+        return sum(1 for _ in self.regex.finditer(text))
+
+    def count_by_pattern(self, text: str) -> Dict[str, int]:
+        """Matches per pattern, keyed by group name (for diagnostics)."""
+        counts: Dict[str, int] = {}
+        for match in self.regex.finditer(text):
+            counts[match.lastgroup] = counts.get(match.lastgroup, 0) + 1
+        return counts
+
+    def count_per_text(self, texts: List[str]) -> List[int]:
+        r"""
+        count() for many texts in one scan.
+
+        Texts are joined with NUL, which no pattern can match across (\s and
+        \w exclude it, and it ends words like the end of a string does).
+        """
+        counts = [0] * len(texts)
+        starts, offset = [], 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        for match in self.regex.finditer(_BATCH_SEPARATOR.join(texts)):
+            counts[bisect.bisect_right(starts, match.start()) - 1] += 1
+        return counts
+
+
+_BATCH_SEPARATOR = "\0"
+
+
+def _first_char_guard(patterns: List[str]) -> str:
+    """
+    Lookahead for the first letter of every pattern, e.g. "(?=[wbia])".
+
+    The regex engine otherwise tries every alternative at every position;
+    the guard rejects most positions with one character-class test (~4x
+    faster on story text). It is compiled with the same flags, so it never
+    rejects a position where some pattern would match. Empty if a pattern
+    doesn't start with a literal letter.
+    """
+    first = []
+    for pattern in patterns:
+        body = pattern[2:] if pattern.startswith(r"\b") else pattern
+        if not body or not body[0].isalpha():
+            return ""
+        first.append(body[0])
+    return "(?=[" + "".join(sorted(set(first))) + "])"
+
+PASSIVE_VOICE = PatternSet("passive", PASSIVE_VOICE_PATTERNS)
+WE_INSTEAD_OF_I = PatternSet("we", WE_INSTEAD_OF_I_PATTERNS)
+VAGUE_RESULTS = PatternSet("vague", VAGUE_RESULTS_PATTERNS)
+QUANTIFIED_RESULT = re.compile(r"\b\d+[%$KkMm]?\b|\$\d+|\d+\s*(?:percent|%)")
+
+
+def _storytelling_analysis(passive_count: int, we_count: int, vague_count: int, has_numbers: bool) -> dict:
+    """Build the analysis dict from the pattern counts of one story."""
     issues = []
 
     # Check for passive voice
-    passive_count = 0
-    for pattern in PASSIVE_VOICE_PATTERNS:
-        matches = re.findall(pattern, full_text, re.IGNORECASE)
-        passive_count += len(matches)
     if passive_count > 2:
         issues.append({
             "type": "passive_voice",
@@ -125,11 +213,6 @@ def _detect_weak_storytelling_patterns(problem: str, action: str, result: str) -
         })
 
     # Check for "we" instead of "I" in action section
-    we_count = 0
-    action_lower = action.lower()
-    for pattern in WE_INSTEAD_OF_I_PATTERNS:
-        matches = re.findall(pattern, action_lower, re.IGNORECASE)
-        we_count += len(matches)
     if we_count > 0:
         issues.append({
             "type": "we_instead_of_i",
@@ -139,11 +222,6 @@ def _detect_weak_storytelling_patterns(problem: str, action: str, result: str) -
         })
 
     # Check for vague results
-    result_lower = result.lower()
-    vague_count = 0
-    for pattern in VAGUE_RESULTS_PATTERNS:
-        matches = re.findall(pattern, result_lower, re.IGNORECASE)
-        vague_count += len(matches)
     if vague_count > 0:
         issues.append({
             "type": "vague_results",
@@ -152,9 +230,6 @@ def _detect_weak_storytelling_patterns(problem: str, action: str, result: str) -
             "suggestion": "Add specific numbers: percentages, dollar amounts, time saved, or user counts."
         })
 
-    # Check for quantified results (positive signal)
-    has_numbers = bool(re.search(r"\b\d+[%$KkMm]?\b|\$\d+|\d+\s*(?:percent|%)", result))
-
     return {
         "issues": issues,
         "issue_count": len(issues),
@@ -163,6 +238,43 @@ def _detect_weak_storytelling_patterns(problem: str, action: str, result: str) -
     }
 
 
+def _detect_weak_storytelling_patterns(problem: str, action: str, result: str) -> dict:
+    """Internal implementation for detecting weak storytelling patterns."""
+    return _storytelling_analysis(
+        # Passive voice anywhere in the story
+        PASSIVE_VOICE.count(f"{problem} {action} {result}".lower()),
+        # "We" language in the action section
+        WE_INSTEAD_OF_I.count(action.lower()),
+        # Vague results
+        VAGUE_RESULTS.count(result.lower()),
+        # Quantified results (positive signal)
+        QUANTIFIED_RESULT.search(result) is not None,
+    )
+
+
+def detect_weak_storytelling_patterns_batch(stories: Iterable[Tuple[str, str, str]]) -> List[dict]:
+    """
+    _detect_weak_storytelling_patterns for many (problem, action, result) stories.
+
+    Each pattern set scans the whole portfolio once instead of once per story;
+    results are identical and in input order.
+    """
+    stories = list(stories)
+    if not stories:
+        return []
+    passive = PASSIVE_VOICE.count_per_text([f"{p} {a} {r}".lower() for p, a, r in stories])
+    we = WE_INSTEAD_OF_I.count_per_text([a.lower() for _, a, _ in stories])
+    vague = VAGUE_RESULTS.count_per_text([r.lower() for _, _, r in stories])
+    quantified = [0] * len(stories)
+    # Only whether there's a match matters, so a per-story search stops at the first one
+    for i, (_, _, result) in enumerate(stories):
+        quantified[i] = QUANTIFIED_RESULT.search(result) is not None
+    return [
+        _storytelling_analysis(passive[i], we[i], vague[i], quantified[i])
+        for i in range(len(stories))
+    ]
+
+
 @tool
 def detect_weak_storytelling_patterns(problem: str, action: str, result: str) -> str:
     """
@@ -181,8 +293,11 @@ def detect_weak_storytelling_patterns(problem: str, action: str, result: str) ->
     Returns:
         Analysis of weak patterns found with severity and suggestions
     """
-    analysis = _detect_weak_storytelling_patterns(problem, action, result)
+    return _format_storytelling_analysis(_detect_weak_storytelling_patterns(problem, action, result))
+
 
+def _format_storytelling_analysis(analysis: dict) -> str:
+    """Render a _detect_weak_storytelling_patterns result as tool output."""
     if not analysis["issues"]:
         return "No major weak storytelling patterns detected. The story uses active voice and clear language."
 
@@ -304,8 +419,11 @@ def analyze_story_structure_quality(problem: str, action: str, result: str) -> s
     Returns:
         Structural analysis with word counts, percentages, and balance recommendations
     """
-    analysis = _analyze_story_structure_quality(problem, action, result)
+    return _format_structure_analysis(_analyze_story_structure_quality(problem, action, result))
 
+
+def _format_structure_analysis(analysis: dict) -> str:
+    """Render an _analyze_story_structure_quality result as tool output."""
     output_lines = [
         "=== Story Structure Analysis ===\n",
         f"Total Words: {analysis['word_counts']['total']}",
@@ -413,9 +531,10 @@ def validate_career_stage_alignment(problem: str, action: str, result: str, care
 def _get_user_stories(user_id: str) -> List[dict]:
     """Fetch all stories for a user from Firestore."""
     try:
-        db = firestore.client()
-        query = db.collection("stories").where(filter=FieldFilter("user_id", "==", user_id))
-        docs = query.stream()
+        with span("stories_fetch"):
+            db = firestore.client()
+            query = db.collection("stories").where(filter=FieldFilter("user_id", "==", user_id))
+            docs = list(query.stream())
 
         stories = []
         for doc in docs:
@@ -434,9 +553,28 @@ def _get_user_stories(user_id: str) -> List[dict]:
         return []
 
 
+def _get_portfolio(user_id: str) -> List[dict]:
+    """The user's stories for tools: read once per coaching run (see ai.run_context.user_portfolio)."""
+    return user_portfolio(user_id, _get_user_stories)
+
+
+def _get_portfolio_stats(user_id: str) -> Optional[dict]:
+    """Fetch the user's precomputed story counters (see portfolio_stats.py); None if missing."""
+    try:
+        with span("stats_fetch"):
+            return read_stats(firestore.client(), user_id)
+    except Exception as e:
+        return None
+
+
 def _get_competency_coverage_internal(user_id: str) -> dict:
-    """Internal implementation for competency coverage analysis."""
-    stories = _get_user_stories(user_id)
+    """
+    Internal implementation for competency coverage analysis.
+
+    Reads the user's portfolio_stats counters (one document); users without
+    them yet are counted from their stories.
+    """
+    stats = _get_portfolio_stats(user_id) or compute_stats(_get_portfolio(user_id))
 
     # All available competency tags
     all_tags = [
@@ -444,12 +582,8 @@ def _get_competency_coverage_internal(user_id: str) -> dict:
         "Strategic Thinking", "Execution", "Adaptability", "Failure", "Innovation"
     ]
 
-    # Count stories per tag
-    tag_counts = {tag: 0 for tag in all_tags}
-    for story in stories:
-        for tag in story.get("tags", []):
-            if tag in tag_counts:
-                tag_counts[tag] += 1
+    # Stories per tag
+    tag_counts = {tag: stats["tags"].get(tag, 0) for tag in all_tags}
 
     # Identify gaps (0 stories) and weak areas (1 story)
     gaps = [tag for tag, count in tag_counts.items() if count == 0]
@@ -457,7 +591,7 @@ def _get_competency_coverage_internal(user_id: str) -> dict:
     strong = [tag for tag, count in tag_counts.items() if count >= 3]
 
     return {
-        "total_stories": len(stories),
+        "total_stories": stats["total_stories"],
         "tag_counts": tag_counts,
         "gaps": gaps,
         "weak_coverage": weak,
@@ -510,11 +644,6 @@ def get_competency_coverage(user_id: str) -> str:
     return "\n".join(output_lines)
 
 
-def _calculate_similarity(text1: str, text2: str) -> float:
-    """Calculate text similarity using SequenceMatcher."""
-    return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
-
-
 def _search_similar_stories_internal(
     user_id: str,
     title: Optional[str] = None,
@@ -522,46 +651,15 @@ def _search_similar_stories_internal(
     content: Optional[str] = None,
     top_k: int = 3
 ) -> List[dict]:
-    """Internal implementation for similar story search."""
-    stories = _get_user_stories(user_id)
-
-    if not stories:
-        return []
-
-    scored_stories = []
-
-    for story in stories:
-        score = 0.0
-
-        # Tag overlap (40% weight)
-        if tags:
-            story_tags = set(story.get("tags", []))
-            query_tags = set(tags)
-            if story_tags and query_tags:
-                overlap = len(story_tags & query_tags) / len(query_tags)
-                score += overlap * 0.4
-
-        # Title similarity (20% weight)
-        if title and story.get("title"):
-            title_sim = _calculate_similarity(title, story["title"])
-            score += title_sim * 0.2
-
-        # Content similarity (40% weight)
-        if content:
-            story_content = f"{story.get('problem', '')} {story.get('action', '')} {story.get('result', '')}"
-            if story_content.strip():
-                content_sim = _calculate_similarity(content, story_content)
-                score += content_sim * 0.4
-
-        if score > 0:
-            scored_stories.append({
-                **story,
-                "similarity_score": score
-            })
+    """
+    Internal implementation for similar story search.
 
-    # Sort by score and return top_k
-    scored_stories.sort(key=lambda x: x["similarity_score"], reverse=True)
-    return scored_stories[:top_k]
+    Scores come from the user's similarity index (ai.similarity_index), built
+    on first use and kept up to date by stories_router: 40% tag overlap, 20%
+    title similarity, 40% content similarity.
+    """
+    index = get_story_index(user_id, _get_portfolio)
+    return index.search(title=title, tags=tags, content=content, top_k=top_k)
 
 
 @tool
@@ -622,7 +720,9 @@ def search_similar_stories(
 # =============================================================================
 
 def _get_tavily_tool():
-    """Get Tavily search tool instance."""
+    """Get Tavily search tool instance (an offline stand-in with AI_SEARCH_PROVIDER=fake)."""
+    if fake_providers.SEARCH_PROVIDER == fake_providers.PROVIDER_FAKE:
+        return fake_providers.FakeTavilySearch(max_results=3)
     try:
         from langchain_community.tools.tavily_search import TavilySearchResults
         api_key = os.getenv("TAVILY_API_KEY")
@@ -633,6 +733,18 @@ def _get_tavily_tool():
         return None
 
 
+def _company_insights_query(company_name: str) -> str:
+    return f"{company_name} interview process culture behavioral questions what interviewers look for"
+
+
+def _role_trends_query(role_title: str) -> str:
+    return f"{role_title} behavioral interview questions 2024 2025 what interviewers look for competencies"
+
+
+def _industry_context_query(industry: str) -> str:
+    return f"{industry} industry trends 2024 2025 hiring priorities key skills challenges"
+
+
 def _format_tavily_results(results) -> str:
     """Format Tavily results into readable string."""
     if not results:
@@ -674,13 +786,13 @@ def get_company_interview_insights(company_name: str) -> str:
     if not tavily:
         return f"Unable to search for {company_name} interview insights. Tavily API not configured."
 
-    query = f"{company_name} interview process culture behavioral questions what interviewers look for"
+    query = _company_insights_query(company_name)
 
     def search_func(q):
         return tavily.invoke(q)
 
     try:
-        results = cached_tavily_search(query, search_func)
+        results = cached_tavily_search(query, search_func, tool="company_insights")
         formatted = _format_tavily_results(results)
         return f"=== Interview Insights for {company_name} ===\n\n{formatted}"
     except Exception as e:
@@ -708,13 +820,13 @@ def get_role_interview_trends(role_title: str) -> str:
     if not tavily:
         return f"Unable to search for {role_title} interview trends. Tavily API not configured."
 
-    query = f"{role_title} behavioral interview questions 2024 2025 what interviewers look for competencies"
+    query = _role_trends_query(role_title)
 
     def search_func(q):
         return tavily.invoke(q)
 
     try:
-        results = cached_tavily_search(query, search_func)
+        results = cached_tavily_search(query, search_func, tool="role_trends")
         formatted = _format_tavily_results(results)
         return f"=== Interview Trends for {role_title} ===\n\n{formatted}"
     except Exception as e:
@@ -741,13 +853,13 @@ def get_industry_context(industry: str) -> str:
     if not tavily:
         return f"Unable to search for {industry} context. Tavily API not configured."
 
-    query = f"{industry} industry trends 2024 2025 hiring priorities key skills challenges"
+    query = _industry_context_query(industry)
 
     def search_func(q):
         return tavily.invoke(q)
 
     try:
-        results = cached_tavily_search(query, search_func)
+        results = cached_tavily_search(query, search_func, tool="industry_context")
         formatted = _format_tavily_results(results)
         return f"=== Industry Context for {industry} ===\n\n{formatted}"
     except Exception as e:
@@ -788,7 +900,7 @@ def benchmark_impact_metrics(metric_type: str, industry: Optional[str] = None, r
         return tavily.invoke(q)
 
     try:
-        results = cached_tavily_search(query, search_func)
+        results = cached_tavily_search(query, search_func, tool="metric_benchmarks")
         formatted = _format_tavily_results(results)
 
         context = f"for {industry}" if industry else ""
@@ -804,20 +916,94 @@ def benchmark_impact_metrics(metric_type: str, industry: Optional[str] = None, r
 # TOOL FACTORY FUNCTION
 # =============================================================================
 
-def create_user_tools(user_id: str) -> List[BaseTool]:
+def _with_time_budget(user_tool: BaseTool) -> BaseTool:
+    """
+    Wrap a tool so it returns BUDGET_EXHAUSTED_TOOL_MESSAGE instead of running
+    once the request deadline is close, prompting the agent to finish.
     """
-    Create all coaching tools with user_id pre-filled via closures.
+    func = user_tool.func
+
+    @functools.wraps(func)
+    def guarded(*args, **kwargs):
+        if tool_budget_exhausted():
+            logger.info("Skipping tool, time budget nearly used up", extra={"tool": user_tool.name})
+            return BUDGET_EXHAUSTED_TOOL_MESSAGE
+        return func(*args, **kwargs)
+
+    return StructuredTool.from_function(
+        func=guarded,
+        name=user_tool.name,
+        description=user_tool.description,
+        args_schema=user_tool.args_schema
+    )
+
+
+def _with_run_memo(user_tool: BaseTool) -> BaseTool:
+    """
+    Wrap a tool so a repeat call with the same arguments in one coaching run
+    returns the first output from the run's memo (see ai.run_context.ToolMemo).
+    Outside user_scope() every call runs the tool.
+    """
+    func = user_tool.func
+    signature = inspect.signature(func)
+
+    def memoized(*args, **kwargs):
+        memo = current_tool_memo()
+        if memo is None:
+            return func(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()  # "query" and "query, top_k=3" are the same call
+        output = memo.get(user_tool.name, bound.arguments)
+        if output is not None:
+            return output
+        output = func(*args, **kwargs)
+        if output != BUDGET_EXHAUSTED_TOOL_MESSAGE:
+            memo.set(user_tool.name, bound.arguments, output)
+        return output
+
+    return StructuredTool.from_function(
+        func=memoized,
+        name=user_tool.name,
+        description=user_tool.description,
+        args_schema=user_tool.args_schema
+    )
 
-    This factory function returns tools that the coaching agent can use
-    without needing to pass user_id as a parameter each time.
+
+def pre_analysis_tool_results(
+    problem: str, action: str, result: str, storytelling_analysis: dict, structure_analysis: dict
+) -> List[Tuple[str, dict, str]]:
+    """
+    (tool, args, output) for the agent tools that /ai/process's pre-analysis
+    already answers, for seeding the run's memo (ai.run_context.seed_tool_result).
+    """
+    story = {"problem": problem, "action": action, "result": result}
+    return [
+        ("analyze_storytelling", story, _format_storytelling_analysis(storytelling_analysis)),
+        ("analyze_structure", story, _format_structure_analysis(structure_analysis)),
+    ]
+
+
+def create_user_tools(user_id: Optional[str] = None) -> List[BaseTool]:
+    """
+    Create all coaching tools without the agent having to pass user_id.
+
+    With a user_id the tools are pinned to that user. Without one (the shared
+    per-worker agent), each call reads the user bound by ai.run_context.user_scope()
+    and fails if none is bound.
+
+    Within a run, repeated calls with the same arguments are answered from the
+    run's memo (_with_run_memo) instead of running the tool again.
 
     Args:
-        user_id: The unique identifier for the user
+        user_id: The unique identifier for the user, or None to use the run's user
 
     Returns:
         List of tools ready to be used by the coaching agent
     """
 
+    def resolve_user_id() -> str:
+        return user_id or current_user_id()
+
     @tool
     def search_memory(query: str, top_k: int = 3) -> str:
         """
@@ -826,7 +1012,7 @@ def create_user_tools(user_id: str) -> List[BaseTool]:
         """
         return search_personal_memory.invoke({
             "query": query,
-            "user_id": user_id,
+            "user_id": resolve_user_id(),
             "top_k": top_k
         })
 
@@ -873,7 +1059,7 @@ def create_user_tools(user_id: str) -> List[BaseTool]:
         Analyze competency tag coverage across the user's story portfolio.
         Shows which competencies have strong coverage vs gaps.
         """
-        return get_competency_coverage.invoke({"user_id": user_id})
+        return get_competency_coverage.invoke({"user_id": resolve_user_id()})
 
     @tool
     def find_similar_stories(
@@ -888,7 +1074,7 @@ def create_user_tools(user_id: str) -> List[BaseTool]:
         Tags should be comma-separated (e.g., "Leadership,Impact").
         """
         return search_similar_stories.invoke({
-            "user_id": user_id,
+            "user_id": resolve_user_id(),
             "title": title,
             "tags": tags,
             "content": content,
@@ -935,7 +1121,7 @@ def create_user_tools(user_id: str) -> List[BaseTool]:
             "role": role
         })
 
-    return [
+    tools = [
         search_memory,
         analyze_storytelling,
         analyze_structure,
@@ -947,3 +1133,4 @@ def create_user_tools(user_id: str) -> List[BaseTool]:
         get_industry_info,
         get_metric_benchmarks,
     ]
+    return [_with_run_memo(_with_time_budget(t)) for t in tools]
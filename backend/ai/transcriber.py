@@ -1,3 +1,4 @@
+import logging
 import os
 import wave
 import struct
@@ -5,6 +6,9 @@ import uuid
 from google.cloud import speech
 from google.cloud import storage
 from google.oauth2 import service_account
+from ai import fake_providers
+
+logger = logging.getLogger(__name__)
 
 def detect_audio_format(file_path: str):
     """
@@ -26,7 +30,7 @@ def detect_audio_format(file_path: str):
 
     # For non-WAV files (likely WebM Opus from web browsers)
     # Flutter's record package on web typically outputs WebM Opus
-    print(f"Non-WAV format detected. Trying WEBM_OPUS encoding.")
+    logger.debug("Non-WAV format detected. Trying WEBM_OPUS encoding.")
     return speech.RecognitionConfig.AudioEncoding.WEBM_OPUS, 48000, 1
 
 def transcribe_audio_file(file_path: str) -> str:
@@ -34,11 +38,15 @@ def transcribe_audio_file(file_path: str) -> str:
     Transcribes a local audio file using Google Cloud Speech-to-Text.
     Automatically detects audio format and encoding.
     Returns the transcribed text.
+    With AI_SPEECH_PROVIDER=fake, returns a sample transcript offline (see ai/fake_providers.py).
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Audio file not found at {file_path}")
 
-    print(f"Transcribing {file_path} with Google Speech-to-Text...")
+    if fake_providers.SPEECH_PROVIDER == fake_providers.PROVIDER_FAKE:
+        return fake_providers.fake_transcribe(file_path)
+
+    logger.info("Transcribing with Google Speech-to-Text", extra={"file": file_path})
 
     # Load credentials from the same Firebase credentials file
     credentials_path = os.getenv("FIREBASE_CREDENTIALS_PATH", "./firebase-credentials.json")
@@ -54,7 +62,8 @@ def transcribe_audio_file(file_path: str) -> str:
     # Detect audio format
     encoding, sample_rate, channels = detect_audio_format(file_path)
 
-    print(f"Audio format: {sample_rate}Hz, {channels} channel(s), encoding={encoding.name}")
+    logger.debug("Audio format detected",
+                 extra={"sample_rate": sample_rate, "channels": channels, "encoding": encoding.name})
 
     # Configure audio settings
     audio = speech.RecognitionAudio(content=content)
@@ -73,13 +82,13 @@ def transcribe_audio_file(file_path: str) -> str:
     # Check file size to determine which API to use
     # Files over ~1MB or >60 seconds need async API, but we'll use sync first and fallback
     try:
-        print("Using synchronous recognition (for audio < 1 minute)...")
+        logger.debug("Using synchronous recognition (for audio < 1 minute)")
         response = client.recognize(config=config, audio=audio)
     except Exception as e:
         error_msg = str(e)
         # If sync fails due to length, try long-running recognize with GCS
         if "too long" in error_msg.lower() or "LongRunningRecognize" in error_msg or "duration limit" in error_msg.lower():
-            print("Audio too long for sync API. Uploading to GCS for long-running recognition...")
+            logger.info("Audio too long for sync API. Uploading to GCS for long-running recognition")
 
             # Upload audio to GCS
             try:
@@ -93,30 +102,30 @@ def transcribe_audio_file(file_path: str) -> str:
                 blob = bucket.blob(blob_name)
 
                 # Upload file
-                print(f"Uploading to gs://{bucket_name}/{blob_name}...")
+                logger.debug("Uploading audio to GCS", extra={"gcs_uri": f"gs://{bucket_name}/{blob_name}"})
                 blob.upload_from_filename(file_path)
 
                 # Get GCS URI
                 gcs_uri = f"gs://{bucket_name}/{blob_name}"
-                print(f"File uploaded. Using GCS URI: {gcs_uri}")
+                logger.debug("File uploaded", extra={"gcs_uri": gcs_uri})
 
                 # Create audio object with URI instead of content
                 audio_gcs = speech.RecognitionAudio(uri=gcs_uri)
 
                 # Perform long-running recognition
                 operation = client.long_running_recognize(config=config, audio=audio_gcs)
-                print("Waiting for transcription to complete (this may take a while)...")
+                logger.info("Waiting for long-running transcription to complete")
                 response = operation.result(timeout=1800)  # 30 minute processing timeout
 
                 # Clean up - delete the temporary file from GCS
-                print(f"Deleting temporary file from GCS: {blob_name}")
+                logger.debug("Deleting temporary file from GCS", extra={"blob": blob_name})
                 blob.delete()
 
             except Exception as gcs_e:
-                print(f"Long-running Speech-to-Text API error: {gcs_e}")
+                logger.error("Long-running Speech-to-Text API error", extra={"error": str(gcs_e)})
                 raise Exception(f"Failed to transcribe long audio: {str(gcs_e)}")
         else:
-            print(f"Speech-to-Text API error: {e}")
+            logger.error("Speech-to-Text API error", extra={"error": str(e)})
             raise Exception(f"Failed to transcribe audio: {str(e)}")
 
     # Combine all transcription results
@@ -127,9 +136,9 @@ def transcribe_audio_file(file_path: str) -> str:
     transcribed_text = transcript.strip()
 
     if not transcribed_text:
-        print("Warning: Transcription returned empty text. Audio may be silent or format incompatible.")
+        logger.warning("Transcription returned empty text. Audio may be silent or format incompatible.")
         raise Exception("Transcription returned empty text")
 
-    print(f"Transcription complete: {len(transcribed_text)} characters")
+    logger.info("Transcription complete", extra={"chars": len(transcribed_text)})
 
     return transcribed_text
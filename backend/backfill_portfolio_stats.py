@@ -0,0 +1,87 @@
+import sys
+from firebase_admin import firestore
+from firebase_config import firebase_app
+from portfolio_stats import STATS_COLLECTION, compute_stats, read_stats, stats_mismatches, user_stories_query
+
+def _all_user_ids(db) -> list:
+    """Every user that owns at least one story or has a counters document."""
+    user_ids = {doc.to_dict().get("user_id") for doc in db.collection("stories").select(["user_id"]).stream()}
+    user_ids.update(doc.id for doc in db.collection(STATS_COLLECTION).select([]).stream())
+    return sorted(u for u in user_ids if u)
+
+def backfill_user(db, user_id: str) -> dict:
+    """
+    Recompute the user's counters from their stories and overwrite the document.
+
+    The stories are read inside the transaction, so a story written during the
+    backfill either is counted here or retries the transaction.
+    """
+    stats_ref = db.collection(STATS_COLLECTION).document(user_id)
+    query = user_stories_query(db, user_id)
+
+    @firestore.transactional
+    def backfill(transaction):
+        existing = stats_ref.get(transaction=transaction)
+        # The version only moves forward, so coaching cached for the old counters isn't reused
+        version = (existing.to_dict().get("version", 0) if existing.exists else 0) + 1
+        stats = compute_stats(doc.to_dict() for doc in transaction.get(query))
+        transaction.set(stats_ref, {
+            **stats, "user_id": user_id, "version": version, "updated_at": firestore.SERVER_TIMESTAMP
+        })
+        return stats
+
+    return backfill(db.transaction())
+
+def check_user(db, user_id: str) -> dict:
+    """Compare the stored counters with a recount; returns {counter: (stored, expected)}."""
+    expected = compute_stats(doc.to_dict() for doc in user_stories_query(db, user_id).stream())
+    return stats_mismatches(read_stats(db, user_id), expected)
+
+def main():
+    """Backfill (default) or check (--check) portfolio counters for the given users, or all users."""
+    args = sys.argv[1:]
+    if "--help" in args or "-h" in args:
+        print("Usage: python backfill_portfolio_stats.py [--check] [user_id1] [user_id2] ...")
+        print("\nWithout user IDs, every user with stories is processed.")
+        print("  --check  Report counters that differ from a recount instead of rewriting them")
+        sys.exit(0)
+
+    check_only = "--check" in args
+    user_ids = [a for a in args if not a.startswith("--")]
+    db = firestore.client()
+    user_ids = user_ids or _all_user_ids(db)
+
+    print("=" * 60)
+    print("Portfolio Stats " + ("Consistency Check" if check_only else "Backfill"))
+    print("=" * 60)
+    print(f"\nProcessing {len(user_ids)} user(s)...\n")
+
+    drifted = {}
+    for user_id in user_ids:
+        if check_only:
+            mismatches = check_user(db, user_id)
+            if mismatches:
+                drifted[user_id] = mismatches
+                print(f"  ❌ {user_id}:")
+                for counter, (stored, expected) in sorted(mismatches.items()):
+                    print(f"      {counter}: stored {stored}, expected {expected}")
+            else:
+                print(f"  ✅ {user_id}")
+        else:
+            stats = backfill_user(db, user_id)
+            print(f"  ✅ {user_id}: {stats['total_stories']} stories, {len(stats['tags'])} tags")
+
+    print("\n" + "=" * 60)
+    if check_only:
+        print(f"Check complete: {len(drifted)}/{len(user_ids)} users with drifted counters")
+        if drifted:
+            print("Run without --check to rewrite them.")
+    else:
+        print(f"Backfill complete: {len(user_ids)} users updated")
+    print("=" * 60)
+
+    if drifted:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Microbenchmark: coaching agent construction per request vs the shared per-worker agent.
+
+Run from the backend directory:
+    python -m benchmarks.coaching_agent
+
+Before, every coaching request built ten closure tools, the tool-calling agent
+and an AgentExecutor (the Gemini clients were already shared by the chain
+registry). Now get_coaching_agent() returns one shared instance per worker and
+the user is bound per run. No network calls are made.
+"""
+import gc
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder-key")
+
+from ai import chains
+
+ITERATIONS = 100
+
+
+def per_request_build():
+    """The previous behaviour: a fresh agent, tools and executor for every request."""
+    return chains._build_coaching_agent(
+        chains.GEMINI_PRO_MODEL, chains.GEMINI_FLASH_MODEL, chains.CHAIN_TEMPERATURES["coaching_agent"], False
+    )
+
+
+def _time_per_call(func, iterations: int) -> float:
+    """Return mean microseconds per call."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def _retained_per_call(func, iterations: int) -> float:
+    """Return mean KiB still held by each object func() returns."""
+    gc.collect()
+    tracemalloc.start()
+    total = 0
+    for _ in range(iterations):
+        start = tracemalloc.get_traced_memory()[0]
+        agent = func()
+        total += tracemalloc.get_traced_memory()[0] - start
+        del agent
+    tracemalloc.stop()
+    return total / iterations / 1024
+
+
+def run_benchmark():
+    chains.reload_chains()
+    chains.get_coaching_agent()  # Warm the registry once, as the first request on a worker would
+
+    build_us = _time_per_call(per_request_build, ITERATIONS)
+    shared_us = _time_per_call(chains.get_coaching_agent, ITERATIONS * 100)
+    build_kib = _retained_per_call(per_request_build, ITERATIONS)
+    shared_kib = _retained_per_call(chains.get_coaching_agent, ITERATIONS)
+
+    print(f"Coaching agent setup cost per request ({ITERATIONS} iterations)\n")
+    print(f"{'':<22}{'time (us)':>14}{'memory (KiB)':>16}")
+    print(f"{'per-request build':<22}{build_us:>14.1f}{build_kib:>16.1f}")
+    print(f"{'shared agent':<22}{shared_us:>14.3f}{shared_kib:>16.3f}")
+    print(f"\nSaved per request: {build_us - shared_us:.0f} us, {build_kib - shared_kib:.0f} KiB")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,95 @@
+"""
+Benchmark: two-call (structure → tag) vs fused single-call structuring and tagging.
+
+Run from the backend directory (makes real Gemini calls, needs GOOGLE_API_KEY):
+    python -m benchmarks.fused_structure_tag [--runs 3]
+
+For every transcript in samples/transcripts it reports the mean end-to-end
+latency of each path and how well the fused tags agree with the two-call tags:
+- top-1: the highest-confidence tag is the same
+- jaccard: overlap of the tag sets (|A ∩ B| / |A ∪ B|)
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from ai.chains import get_structure_chain, get_tagging_chain, get_structure_and_tag_chain
+
+TRANSCRIPTS_DIR = Path(__file__).parent.parent / "samples" / "transcripts"
+
+
+async def two_call(transcript: str):
+    structure = await get_structure_chain().ainvoke({"raw_transcript": transcript})
+    tags = await get_tagging_chain().ainvoke({
+        "problem": structure.problem,
+        "action": structure.action,
+        "result": structure.result
+    })
+    return tags.tags
+
+
+async def fused(transcript: str):
+    result = await get_structure_and_tag_chain().ainvoke({"raw_transcript": transcript})
+    return result.tags
+
+
+def _top_tag(tags) -> str:
+    return max(tags, key=lambda t: t.confidence).tag
+
+
+def _jaccard(a, b) -> float:
+    a, b = {t.tag for t in a}, {t.tag for t in b}
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+async def _timed(func, transcript: str):
+    start = time.perf_counter()
+    tags = await func(transcript)
+    return time.perf_counter() - start, tags
+
+
+async def run_benchmark(runs: int):
+    transcripts = sorted(TRANSCRIPTS_DIR.glob("*.txt"))
+    print(f"Structure + tag: two calls vs fused ({runs} run(s) per transcript)\n")
+    print(f"{'transcript':<28}{'two-call (s)':>14}{'fused (s)':>12}{'saved':>9}{'top-1':>8}{'jaccard':>10}")
+
+    all_two, all_fused, all_top, all_jaccard = [], [], [], []
+    for path in transcripts:
+        transcript = path.read_text()
+        two_times, fused_times, top_matches, jaccards = [], [], [], []
+
+        for _ in range(runs):
+            two_s, two_tags = await _timed(two_call, transcript)
+            fused_s, fused_tags = await _timed(fused, transcript)
+            two_times.append(two_s)
+            fused_times.append(fused_s)
+            top_matches.append(_top_tag(two_tags) == _top_tag(fused_tags))
+            jaccards.append(_jaccard(two_tags, fused_tags))
+
+        two_mean, fused_mean = statistics.mean(two_times), statistics.mean(fused_times)
+        top_rate, jaccard_mean = sum(top_matches) / runs, statistics.mean(jaccards)
+        print(f"{path.name:<28}{two_mean:>14.2f}{fused_mean:>12.2f}"
+              f"{(1 - fused_mean / two_mean) * 100:>8.0f}%{top_rate:>8.0%}{jaccard_mean:>10.2f}")
+
+        all_two += two_times
+        all_fused += fused_times
+        all_top += top_matches
+        all_jaccard += jaccards
+
+    two_mean, fused_mean = statistics.mean(all_two), statistics.mean(all_fused)
+    print(f"\n{'overall':<28}{two_mean:>14.2f}{fused_mean:>12.2f}"
+          f"{(1 - fused_mean / two_mean) * 100:>8.0f}%{sum(all_top) / len(all_top):>8.0%}"
+          f"{statistics.mean(all_jaccard):>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Runs per transcript and path")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.runs))
@@ -0,0 +1,36 @@
+"""
+Benchmark: /stories/analytics computation time by portfolio size.
+
+Run from the backend directory:
+    python -m benchmarks.portfolio_analytics
+
+Times ai.portfolio_analytics.analyze_portfolio (all three analyses, columnar
+output) on synthetic portfolios, excluding the Firestore read. For
+comparison, one coaching agent run per story costs seconds of LLM time.
+"""
+import json
+import time
+
+from ai.portfolio_analytics import analyze_portfolio
+from benchmarks.storytelling_patterns import synthetic_portfolio
+
+PORTFOLIO_SIZES = (10, 100, 1000)
+
+
+def run_benchmark():
+    print(f"{'stories':>8}{'analytics (ms)':>16}{'per story (us)':>16}{'payload (KB)':>14}")
+    for size in PORTFOLIO_SIZES:
+        stories = [
+            {"story_id": f"story-{i}", "title": f"Story {i}", "status": "complete",
+             "problem": p, "action": a, "result": r}
+            for i, (p, a, r) in enumerate(synthetic_portfolio(size, seed=size))
+        ]
+        start = time.perf_counter()
+        table = analyze_portfolio(stories, "mid_career")
+        elapsed = time.perf_counter() - start
+        payload = len(json.dumps(table, separators=(",", ":"))) / 1024
+        print(f"{size:>8}{elapsed * 1000:>16.2f}{elapsed / size * 1e6:>16.1f}{payload:>14.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,87 @@
+"""
+Load test: /ai/process throughput against the offline fake providers.
+
+Run from the backend directory:
+    python -m benchmarks.process_load --requests 200 --concurrency 50
+
+Gemini, Speech-to-Text and Tavily are replaced by ai/fake_providers.py
+(AI_PROVIDER=fake, latency/error mixes from the AI_FAKE_* variables), so no
+quota is used. The Firestore profile fetch is stubbed and auth is bypassed;
+everything else (router, pipeline, chains, agent, caches, metrics) runs as
+in production. The LLM output cache is disabled so every request reaches the
+fake models. The Gemini rate limiter is opened up unless AI_RATE_LIMIT_RPM
+is set, e.g. AI_RATE_LIMIT_RPM=600 to watch requests queue behind it.
+
+To drive a running server with an external load generator instead, start it
+with AI_PROVIDER=fake and point the generator at POST /ai/process.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("AI_PROVIDER", "fake")
+os.environ["AI_LLM_CACHE"] = "false"
+os.environ.setdefault("AI_RATE_LIMIT_RPM", "1000000")
+os.environ.setdefault("AI_RATE_LIMIT_BURST", "1000")
+
+import httpx
+from fastapi import FastAPI
+
+from dependencies.auth_dependencies import get_current_user
+from routers import ai_router
+
+USER = {"uid": "load_test_user"}
+
+
+def _build_app() -> FastAPI:
+    ai_router.get_user_profile = lambda user_id: {"first_name": "Load", "career_stage": "mid"}
+    app = FastAPI()
+    app.include_router(ai_router.router)
+    app.dependency_overrides[get_current_user] = lambda: USER
+    return app
+
+
+def _percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1)] if ordered else 0.0
+
+
+async def run_load(total: int, concurrency: int):
+    app = _build_app()
+    transcript = open("samples/transcripts/sample_transcript_1.txt", encoding="utf-8").read()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+        async def one(i):
+            async with semaphore:
+                # Vary the transcript so per-input caches don't flatten the load
+                payload = {"user_id": USER["uid"], "story_id": f"s{i}", "raw_transcript": f"{transcript} (#{i})"}
+                start = time.perf_counter()
+                response = await client.post("/ai/process", json=payload)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(total)])
+        elapsed = time.perf_counter() - start
+
+    print(f"/ai/process with fake providers: {total} requests, concurrency {concurrency}\n")
+    print(f"throughput      {total / elapsed:8.1f} req/s  ({elapsed:.1f}s total)")
+    for p in (50, 90, 99):
+        print(f"p{p:<14}{_percentile(latencies, p):8.2f} s")
+    print(f"status codes    {dict(sorted(statuses.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run_load(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark: prompt tokens before/after compaction, and compaction cost.
+
+Run from the backend directory:
+    python -m benchmarks.prompt_compaction
+
+Uses the sample transcripts as-is, with typical speech filler mixed in, and
+concatenated into an overlong recording, measured against the structure
+chain's budget (see ai/token_budget.py). Token counts are the local estimate
+used for budgeting, not billed tokens.
+"""
+import time
+from pathlib import Path
+
+from ai.token_budget import compact_inputs, get_token_budget
+
+SAMPLES = sorted(Path("samples/transcripts").glob("*.txt"))
+FILLER = ("um, ", "uh, ", "you know, ", "so so ")
+ITERATIONS = 200
+
+
+def _with_filler(text: str) -> str:
+    words = text.split()
+    # Deterministic: a filler word before every seventh word
+    return " ".join(FILLER[i % len(FILLER)] + w if i % 7 == 0 else w for i, w in enumerate(words))
+
+
+def _cases():
+    texts = [p.read_text(encoding="utf-8") for p in SAMPLES]
+    for path, text in zip(SAMPLES, texts):
+        yield path.stem, text
+        yield f"{path.stem} + filler", _with_filler(text)
+    yield "overlong (all samples x4, filler)", _with_filler(" ".join(texts * 4))
+
+
+def run_benchmark():
+    chain = "structure"
+    print(f"Chain '{chain}', budget {get_token_budget(chain)} tokens (template included)\n")
+    print(f"{'input':<36}{'before':>8}{'after':>8}{'saved':>8}{'us/call':>10}  steps")
+    for name, text in _cases():
+        inputs = {"raw_transcript": text}
+        _, report = compact_inputs(chain, inputs)
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            compact_inputs(chain, inputs)
+        micros = (time.perf_counter() - start) / ITERATIONS * 1_000_000
+        saved = report["tokens_before"] - report["tokens_after"]
+        print(f"{name:<36}{report['tokens_before']:>8}{report['tokens_after']:>8}{saved:>8}{micros:>10.0f}  "
+              f"{', '.join(report['steps']) or '-'}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,88 @@
+"""
+Benchmark: find_similar_stories scoring by portfolio size.
+
+Run from the backend directory:
+    python -m benchmarks.similarity_search
+
+Compares, per portfolio size (Firestore excluded):
+- baseline: the original scan (difflib.SequenceMatcher on title and full
+  content for every story, on every call)
+- build:    building the user's ai.similarity_index.StoryIndex (once per TTL)
+- query:    one top-3 query against the built index
+- update:   re-indexing one edited story
+"""
+import random
+import time
+from difflib import SequenceMatcher
+
+from ai.similarity_index import StoryIndex
+from benchmarks.storytelling_patterns import synthetic_portfolio
+
+PORTFOLIO_SIZES = (10, 100, 1000)
+QUERIES = 20
+TAGS = ["Leadership", "Ownership", "Impact", "Communication", "Conflict",
+        "Strategic Thinking", "Execution", "Adaptability", "Failure", "Innovation"]
+TITLE_WORDS = ["Checkout", "Billing", "Onboarding", "Migration", "Latency", "Hiring", "Pricing", "Roadmap",
+               "Redesign", "Rollout", "Audit", "Launch", "Cleanup", "Escalation"]
+
+
+def synthetic_stories(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {"story_id": f"story-{i}", "title": " ".join(rng.sample(TITLE_WORDS, 3)), "status": "complete",
+         "problem": p, "action": a, "result": r, "tags": rng.sample(TAGS, rng.randint(1, 3))}
+        for i, (p, a, r) in enumerate(synthetic_portfolio(count, seed=seed))
+    ]
+
+
+def baseline_search(stories, title=None, tags=None, content=None, top_k=3):
+    """The search as it was before the index (reference only)."""
+    def similarity(text1, text2):
+        return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
+
+    scored = []
+    for story in stories:
+        score = 0.0
+        if tags:
+            story_tags, query_tags = set(story.get("tags", [])), set(tags)
+            if story_tags and query_tags:
+                score += len(story_tags & query_tags) / len(query_tags) * 0.4
+        if title and story.get("title"):
+            score += similarity(title, story["title"]) * 0.2
+        if content:
+            story_content = f"{story.get('problem', '')} {story.get('action', '')} {story.get('result', '')}"
+            if story_content.strip():
+                score += similarity(content, story_content) * 0.4
+        if score > 0:
+            scored.append({**story, "similarity_score": score})
+    scored.sort(key=lambda x: x["similarity_score"], reverse=True)
+    return scored[:top_k]
+
+
+def _per_call(func, calls):
+    start = time.perf_counter()
+    for args in calls:
+        func(*args)
+    return (time.perf_counter() - start) / len(calls)
+
+
+def run_benchmark():
+    print(f"{'stories':>8}{'baseline (ms)':>15}{'build (ms)':>12}{'query (ms)':>12}{'update (ms)':>13}{'speedup':>10}")
+    for size in PORTFOLIO_SIZES:
+        stories = synthetic_stories(size, seed=size)
+        queries = [
+            (q["title"], q["tags"][:1], f"{q['action']} {q['result']}")
+            for q in synthetic_stories(QUERIES, seed=size + 1)
+        ]
+        baseline = _per_call(lambda t, g, c: baseline_search(stories, t, g, c), queries)
+        start = time.perf_counter()
+        index = StoryIndex(stories)
+        build = time.perf_counter() - start
+        query = _per_call(lambda t, g, c: index.search(t, g, c), queries)
+        update = _per_call(index.upsert, [(story,) for story in stories[:QUERIES]])
+        print(f"{size:>8}{baseline * 1000:>15.2f}{build * 1000:>12.2f}{query * 1000:>12.3f}"
+              f"{update * 1000:>13.3f}{baseline / query:>9.0f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,131 @@
+"""
+Benchmark: weak-storytelling pattern detection on large synthetic portfolios.
+
+Run from the backend directory:
+    python -m benchmarks.storytelling_patterns
+
+Compares, per portfolio size:
+- baseline: the original detector (re.findall per raw pattern string, per section)
+- per story: ai.tools._detect_weak_storytelling_patterns (precompiled, one pass per section)
+- batch:     ai.tools.detect_weak_storytelling_patterns_batch (one pass per section for the whole portfolio)
+
+All three must return identical results; the run aborts if they don't.
+"""
+import random
+import re
+import time
+
+from ai.tools import (
+    PASSIVE_VOICE_PATTERNS, VAGUE_RESULTS_PATTERNS, WE_INSTEAD_OF_I_PATTERNS,
+    _detect_weak_storytelling_patterns, detect_weak_storytelling_patterns_batch
+)
+
+PORTFOLIO_SIZES = (10, 100, 1000, 10000)
+
+# Sentence fragments, including every pattern family, mixed case, near misses
+# ("reduced costs by 30%") and characters whose case rules differ from ASCII
+_FRAGMENTS = {
+    "problem": [
+        "Our onboarding flow was confusing and churn was increasing every month.",
+        "The legacy billing system WAS Patched by hand every release.",
+        "Deployments were delayed because tests were flaky.",
+        "The data pipeline had been neglected for years and is owned by nobody.",
+        "Customers are frustrated with slow support responses.",
+        "Σε μια ομάδα ΟΔΟΣ the backlog was being ignored.",
+        "Our API latency at p99 was 2.3s on checkout.",
+    ],
+    "action": [
+        "I interviewed twelve customers and mapped the drop-off points.",
+        "We built a new dashboard and we launched it in two weeks.",
+        "Our team delivered the migration while I coordinated the rollout.",
+        "We were able to automate the release checklist.",
+        "I rewrote the retry logic, which was reviewed and approved by the architects.",
+        "We Did a full audit; our  team   implemented the fixes.",
+        "I led a working group of 5 engineers and owned the roadmap.",
+        "The services were refactored and tests were added.",
+    ],
+    "result": [
+        "Churn dropped by 18% and NPS rose 12 points.",
+        "This improved things for the whole team.",
+        "It made it better and we got good results.",
+        "We reduced costs by 30% and saved time by 5 hours a week.",
+        "Overall we increased efficiency and reduced time to market.",
+        "The launch had a positive impact and Positive Feedback from sales.",
+        "Revenue grew $2M in the first quarter.",
+        "It helped a lot and ſaved time for support.",
+        "Latency fell to 400ms, roughly 80 percent faster.",
+    ],
+}
+
+
+def synthetic_portfolio(count: int, seed: int = 0):
+    """`count` (problem, action, result) tuples built from the fragments above."""
+    rng = random.Random(seed)
+    stories = []
+    for _ in range(count):
+        story = []
+        for section in ("problem", "action", "result"):
+            fragments = _FRAGMENTS[section]
+            story.append(" ".join(rng.choice(fragments) for _ in range(rng.randint(1, 4))))
+        stories.append(tuple(story))
+    return stories
+
+
+def baseline_detect(problem: str, action: str, result: str) -> dict:
+    """The detector as it was before the patterns were precompiled (reference only)."""
+    full_text = f"{problem} {action} {result}".lower()
+    issues = []
+    passive_count = sum(len(re.findall(p, full_text, re.IGNORECASE)) for p in PASSIVE_VOICE_PATTERNS)
+    if passive_count > 2:
+        issues.append({
+            "type": "passive_voice",
+            "severity": "medium" if passive_count <= 4 else "high",
+            "message": f"Found {passive_count} instances of passive voice. Use active voice to emphasize your agency.",
+            "suggestion": "Rewrite sentences to start with 'I' and use active verbs."
+        })
+    we_count = sum(len(re.findall(p, action.lower(), re.IGNORECASE)) for p in WE_INSTEAD_OF_I_PATTERNS)
+    if we_count > 0:
+        issues.append({
+            "type": "we_instead_of_i",
+            "severity": "high",
+            "message": f"Found {we_count} instances of 'we' language in your action section.",
+            "suggestion": "Interviewers want to know YOUR specific contribution. Replace 'we' with 'I' and clarify your individual role."
+        })
+    vague_count = sum(len(re.findall(p, result.lower(), re.IGNORECASE)) for p in VAGUE_RESULTS_PATTERNS)
+    if vague_count > 0:
+        issues.append({
+            "type": "vague_results",
+            "severity": "high",
+            "message": "Your results section contains vague language without specific metrics.",
+            "suggestion": "Add specific numbers: percentages, dollar amounts, time saved, or user counts."
+        })
+    has_numbers = bool(re.search(r"\b\d+[%$KkMm]?\b|\$\d+|\d+\s*(?:percent|%)", result))
+    return {
+        "issues": issues,
+        "issue_count": len(issues),
+        "has_quantified_results": has_numbers,
+        "quality_score": max(0, 1.0 - (len(issues) * 0.25))
+    }
+
+
+def _timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+
+def run_benchmark():
+    print(f"{'stories':>8}{'baseline (ms)':>16}{'per story (ms)':>16}{'batch (ms)':>12}{'speedup':>10}")
+    for size in PORTFOLIO_SIZES:
+        stories = synthetic_portfolio(size, seed=size)
+        expected, baseline = _timed(lambda: [baseline_detect(*s) for s in stories])
+        single, per_story = _timed(lambda: [_detect_weak_storytelling_patterns(*s) for s in stories])
+        batched, batch = _timed(lambda: detect_weak_storytelling_patterns_batch(stories))
+        if not (expected == single == batched):
+            raise SystemExit(f"Results differ from the baseline for {size} stories")
+        print(f"{size:>8}{baseline * 1000:>16.2f}{per_story * 1000:>16.2f}{batch * 1000:>12.2f}"
+              f"{baseline / batch:>9.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
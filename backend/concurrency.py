@@ -0,0 +1,117 @@
+"""
+Bounded thread pool for blocking SDK calls made from async request handlers.
+
+Firebase Storage, Firestore and Google Speech-to-Text only ship synchronous
+clients. Running them directly inside an `async def` handler stalls the event
+loop for every other request on the worker, so handlers hand them off with
+`await run_blocking(func, *args)` instead.
+
+SingleFlight coalesces concurrent identical blocking lookups (Tavily
+searches, memory searches, profile fetches): the first caller for a key does
+the call and callers arriving while it's in flight wait for its result (or
+its exception) instead of calling upstream again.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+from metrics import Counter
+
+T = TypeVar("T")
+
+# Max threads for blocking I/O per worker process (Firestore, Storage, Speech-to-Text, tools)
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "16"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor for blocking calls, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=BLOCKING_IO_WORKERS,
+            thread_name_prefix="blocking-io"
+        )
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking function on the bounded executor and await its result.
+
+    The caller's context variables are copied into the worker thread so
+    request-scoped state stays visible to the blocking call.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_blocking_executor(), call)
+
+
+def shutdown_blocking_executor() -> None:
+    """Stop the executor (used on application shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+SINGLEFLIGHT_CALLS = Counter(
+    "parfolio_singleflight_calls_total",
+    "Coalesced lookups: leaders made the upstream call, followers reused an in-flight one.",
+    ("name", "role"),
+)
+
+
+class SingleFlight:
+    """
+    Per-process in-flight deduplication of blocking calls, keyed by the caller.
+
+    Results aren't kept once the call finishes (caching is the caller's job),
+    so a call made after the leader returns goes upstream again. Works from
+    worker threads (sync tools, run_blocking); followers block their thread
+    only for as long as the leader's call takes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Return func(*args, **kwargs), sharing one call among concurrent callers with the same key."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                future.set_running_or_notify_cancel()
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.inc((self.name, "follower"))
+            return future.result()
+
+        SINGLEFLIGHT_CALLS.inc((self.name, "leader"))
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key: Hashable) -> None:
+        # Later callers start a new call; current followers already hold the future
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
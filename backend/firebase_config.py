@@ -3,6 +3,7 @@ import json
 import firebase_admin
 from firebase_admin import credentials, firestore
 from dotenv import load_dotenv
+from concurrency import SingleFlight
 
 # Load environment variables from .env
 load_dotenv(override=True)
@@ -47,10 +48,20 @@ def initialize_firebase():
 # Initialize once when the module is imported
 firebase_app = initialize_firebase()
 
-def get_user_profile(user_id: str) -> dict:
-    """Fetch user profile from Firestore for coaching context."""
+_profile_fetches = SingleFlight("profile_fetch")
+
+def _fetch_user_profile(user_id: str) -> dict:
     db = firestore.client()
     doc = db.collection("users").document(user_id).get()
     if doc.exists:
         return doc.to_dict()
     return {}
+
+def get_user_profile(user_id: str) -> dict:
+    """
+    Fetch user profile from Firestore for coaching context.
+
+    Concurrent fetches for the same user share one Firestore read; each caller
+    gets its own copy of the result.
+    """
+    return dict(_profile_fetches.do(user_id, _fetch_user_profile, user_id))
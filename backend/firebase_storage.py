@@ -1,8 +1,11 @@
+import logging
 import os
 import tempfile
 from firebase_admin import storage
 from firebase_config import firebase_app
 
+logger = logging.getLogger(__name__)
+
 def get_bucket():
     """Returns the default Firebase Storage bucket."""
     return storage.bucket()
@@ -32,7 +35,7 @@ def download_audio_from_storage(storage_url: str) -> str:
     
     # Download to temp file
     blob.download_to_filename(temp_path)
-    print(f"Downloaded {storage_url} to {temp_path}")
+    logger.debug("Downloaded audio", extra={"storage_url": storage_url, "temp_path": temp_path})
     
     return temp_path
 
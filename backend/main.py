@@ -1,10 +1,35 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routers import auth_router, profile_router, tags_router, ai_router, memory_router, stories_router
 from firebase_config import firebase_app
+from concurrency import get_blocking_executor, shutdown_blocking_executor
+from metrics import MetricsMiddleware, render_metrics
+from structured_logging import RequestIdMiddleware, configure_logging, shutdown_logging
+from ai.prefetch import market_prefetcher
 
-app = FastAPI()
+# JSON logs via a background writer thread (see structured_logging.py)
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Route LangChain's run_in_executor (sync agent tools) through the same
+    # bounded pool the AI handlers use for blocking SDK calls
+    asyncio.get_running_loop().set_default_executor(get_blocking_executor())
+    # Resume any /ai/process jobs left over from a previous run
+    await ai_router.process_jobs.start()
+    yield
+    await ai_router.process_jobs.stop()
+    await market_prefetcher.stop()
+    shutdown_blocking_executor()
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS origins based on environment
 allowed_origins = [
@@ -51,6 +76,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request latency; also labels stage/tool/LLM spans with the route
+app.add_middleware(MetricsMiddleware)
+# Binds X-Request-ID (incoming or generated) to every log record and echoes it back
+app.add_middleware(RequestIdMiddleware)
+
 # Include routers
 app.include_router(auth_router.router)
 app.include_router(profile_router.router)
@@ -71,3 +101,8 @@ async def status():
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (stage, tool, LLM and request latency histograms)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
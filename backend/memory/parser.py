@@ -1,8 +1,11 @@
 import io
+import logging
 from typing import Optional
 from pypdf import PdfReader
 from docx import Document
 
+logger = logging.getLogger(__name__)
+
 class FileParser:
     @staticmethod
     def parse_pdf(file_content: bytes) -> str:
@@ -42,5 +45,5 @@ class FileParser:
             else:
                 return None
         except Exception as e:
-            print(f"Error parsing file {filename}: {str(e)}")
+            logger.warning("Error parsing file", extra={"document": filename, "error": str(e)})
             return None
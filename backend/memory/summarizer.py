@@ -1,8 +1,12 @@
+import logging
 import uuid
 from datetime import datetime
 from ai.chains import get_memory_summarization_chain
+from ai.rate_limit import PRIORITY_BACKGROUND, priority_scope
 from memory.client import get_user_collection
 
+logger = logging.getLogger(__name__)
+
 class MemorySummarizer:
     def __init__(self):
         self.chain = get_memory_summarization_chain()
@@ -10,11 +14,13 @@ class MemorySummarizer:
     async def process_document(self, full_text: str, user_id: str, source_type: str, filename: str):
         """Process an entire document, create a comprehensive summary, and store as ONE memory entry in ChromaDB."""
         collection = get_user_collection(user_id)
-        print(f"Summarizing document '{filename}' for user {user_id}...")
+        logger.info("Summarizing document", extra={"document": filename, "user_id": user_id})
         
         try:
-            # Get comprehensive structured summary from AI for the entire document
-            res = await self.chain.ainvoke({"text_chunk": full_text})
+            # Get comprehensive structured summary from AI for the entire document.
+            # Runs after the upload has returned, so it queues behind interactive calls
+            with priority_scope(PRIORITY_BACKGROUND):
+                res = await self.chain.ainvoke({"text_chunk": full_text})
             
             # Generate a unique ID for the memory entry
             entry_id = str(uuid.uuid4())
@@ -32,9 +38,8 @@ class MemorySummarizer:
                 }],
                 ids=[entry_id]
             )
-            print(f"Successfully created memory entry {entry_id} for '{filename}'")
+            logger.info("Created memory entry", extra={"entry_id": entry_id, "document": filename})
             return entry_id
         except Exception as e:
-            # In production, we'd log this properly
-            print(f"Error summarizing document '{filename}': {e}")
+            logger.exception("Error summarizing document", extra={"document": filename})
             raise
@@ -0,0 +1,290 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition (GET /metrics).
+
+Recording is designed to be cheap enough to wrap every stage, tool and
+external call: a span is two perf_counter() calls, a bisect and a dict update
+under a lock (a few microseconds, see benchmarks/metrics_overhead.py).
+
+    with span("speech_to_text"):
+        transcript = await run_blocking(transcribe_audio_file, path)
+
+Spans are labelled with the HTTP route being served (set by MetricsMiddleware,
+or by route_scope() for background jobs), the stage name, an optional model
+and the outcome (ok / error / timeout / cancelled).
+
+Each uvicorn worker keeps its own metrics; scrape every worker (or run one
+worker per port) to get complete numbers.
+"""
+import asyncio
+import bisect
+import contextlib
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds: sub-millisecond tool work up to long transcriptions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_CANCELLED = "cancelled"
+
+
+# =============================================================================
+# METRIC TYPES
+# =============================================================================
+
+class _Series:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self, bucket_count: int):
+        self.buckets = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram:
+    """Histogram with a fixed label set; label values are passed as a tuple in label order."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.bounds = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], _Series] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, label_values: Tuple[str, ...]) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = _Series(len(self.bounds) + 1)
+            series.buckets[index] += 1
+            series.count += 1
+            series.sum += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(s.buckets), s.count, s.sum) for labels, s in self._series.items()]
+        for label_values, buckets, count, total in sorted(snapshot):
+            base = _format_labels(self.labels, label_values)
+            running = 0
+            for bound, n in zip(self.bounds, buckets):
+                running += n
+                lines.append(f"{self.name}_bucket{{{base}{',' if base else ''}le=\"{_format_number(bound)}\"}} {running}")
+            lines.append(f"{self.name}_bucket{{{base}{',' if base else ''}le=\"+Inf\"}} {count}")
+            lines.append(f"{self.name}_sum{{{base}}} {_format_number(total)}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """Monotonic counter with a fixed label set."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, label_values: Tuple[str, ...], amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, label_values: Tuple[str, ...]) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for label_values, value in snapshot:
+            lines.append(f"{self.name}{{{_format_labels(self.labels, label_values)}}} {_format_number(value)}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Counter):
+    """Value that can go up and down (e.g. queue depth)."""
+
+    def set(self, label_values: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return ",".join(f"{name}=\"{_escape(value)}\"" for name, value in zip(names, values))
+
+
+def _format_number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+_registry: List = []
+# Extra renderers for metrics kept elsewhere (e.g. hedging latency histograms)
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collector: Callable[[], List[str]]) -> None:
+    """Add a function returning exposition lines to every /metrics response."""
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """Render every registered metric in Prometheus text format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    """Drop all recorded values (used by tests)."""
+    for metric in _registry:
+        metric.clear()
+
+
+# =============================================================================
+# APPLICATION METRICS
+# =============================================================================
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "parfolio_http_request_duration_seconds", "HTTP request latency by route.",
+    ("route", "method", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "parfolio_stage_duration_seconds",
+    "Latency of pipeline stages and external client calls (download, speech-to-text, Firestore, Tavily, ...).",
+    ("route", "stage", "model", "outcome"),
+)
+TOOL_SECONDS = Histogram(
+    "parfolio_agent_tool_duration_seconds", "Latency of coaching agent tool calls.",
+    ("route", "tool", "outcome"),
+)
+LLM_SECONDS = Histogram(
+    "parfolio_llm_call_duration_seconds", "Latency of individual LLM calls.",
+    ("route", "model", "outcome"),
+)
+
+
+# =============================================================================
+# ROUTE CONTEXT
+# =============================================================================
+
+# Either the ASGI scope of the request being served (route resolved lazily,
+# after routing) or a fixed label such as "job:/ai/process"
+_route: ContextVar[object] = ContextVar("metrics_route", default=None)
+
+
+def current_route() -> str:
+    value = _route.get()
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    route = value.get("route")
+    return getattr(route, "path", "") if route is not None else "unmatched"
+
+
+@contextlib.contextmanager
+def route_scope(label: str) -> Iterator[None]:
+    """Label spans in the enclosed block with `label` (for work outside HTTP requests)."""
+    token = _route.set(label)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+def outcome_for(exc_type) -> str:
+    """Map an exception type (or None) to an outcome label."""
+    if exc_type is None:
+        return OUTCOME_OK
+    if issubclass(exc_type, asyncio.CancelledError):
+        return OUTCOME_CANCELLED
+    if issubclass(exc_type, TimeoutError) or "Timeout" in exc_type.__name__ or "Deadline" in exc_type.__name__:
+        return OUTCOME_TIMEOUT
+    return OUTCOME_ERROR
+
+
+class span:
+    """
+    Time the enclosed block into STAGE_SECONDS (or another histogram with
+    route/stage/model/outcome labels). Works in sync and async code.
+    """
+    __slots__ = ("stage", "model", "histogram", "start")
+
+    def __init__(self, stage: str, model: str = "", histogram: Histogram = STAGE_SECONDS):
+        self.stage = stage
+        self.model = model
+        self.histogram = histogram
+
+    def __enter__(self) -> "span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.histogram.observe(elapsed, (current_route(), self.stage, self.model, outcome_for(exc_type)))
+
+
+# =============================================================================
+# HTTP MIDDLEWARE
+# =============================================================================
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and labelling spans with the matched route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = _route.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _route.reset(token)
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                elapsed, (getattr(route, "path", "unmatched"), scope["method"], str(status["code"]))
+            )
@@ -1,4 +1,5 @@
 from typing import List, Optional
+from datetime import datetime
 from pydantic import BaseModel
 
 class StructureRequest(BaseModel):
@@ -65,6 +66,11 @@ class CoachResponse(BaseModel):
     gap: CoachingInsight
     suggestion: CoachingInsight
 
+class CachedCoachResponse(BaseModel):
+    """LLM cache entry for /ai/coach: the insights and the model that produced them"""
+    coaching: CoachResponse
+    model: Optional[str] = None
+
 class TranscribeRequest(BaseModel):
     """Request model for /ai/transcribe"""
     audio_url: str  # Firebase Storage URL (gs:// or https://)
@@ -83,6 +89,7 @@ class ProcessRequest(BaseModel):
     raw_transcript: Optional[str] = None # Skip transcription if provided
     story_id: str                         # For transcript storage path
     user_id: str                          # For storage path + profile fetch
+    fused_structure_tag: Optional[bool] = None  # Structure + tag in one LLM call (default: AI_FUSED_STRUCTURE_TAG)
 
 class ProcessResponse(BaseModel):
     """Complete story payload from /ai/process"""
@@ -96,3 +103,42 @@ class ProcessResponse(BaseModel):
     coaching: CoachResponse
     confidence_score: float
     warnings: List[str]  # Accumulates warnings from all steps
+    coaching_model: Optional[str] = None  # Model that produced the coaching (Pro, or Flash when hedged/fallen back)
+
+class ProcessJobSubmitResponse(BaseModel):
+    """Response model for POST /ai/process/jobs"""
+    job_id: str
+    status: str  # "queued"
+
+class JobError(BaseModel):
+    """Failure details for a background job or batch item"""
+    status_code: int
+    detail: str
+
+class ProcessJobStatusResponse(BaseModel):
+    """Response model for GET /ai/process/jobs/{job_id}"""
+    job_id: str
+    status: str                               # "queued" | "running" | "succeeded" | "failed"
+    result: Optional[ProcessResponse] = None  # Set once status is "succeeded"
+    error: Optional[JobError] = None          # Set once status is "failed"
+    created_at: datetime
+    updated_at: datetime
+
+class ProcessBatchRequest(BaseModel):
+    """Request model for /ai/process/batch"""
+    items: List[ProcessRequest]          # Stories to process (same user)
+    concurrency: Optional[int] = None    # Max items in flight (capped at AI_BATCH_CONCURRENCY)
+
+class ProcessBatchItemResult(BaseModel):
+    """Outcome of one item in /ai/process/batch"""
+    index: int                                # Position in the request's `items`
+    story_id: str
+    status: str                               # "succeeded" | "failed"
+    result: Optional[ProcessResponse] = None  # Set when status is "succeeded"
+    error: Optional[JobError] = None          # Set when status is "failed"
+
+class ProcessBatchResponse(BaseModel):
+    """Response model for /ai/process/batch (results in request order)"""
+    results: List[ProcessBatchItemResult]
+    succeeded: int
+    failed: int
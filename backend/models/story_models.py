@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 class CoachingInsightModel(BaseModel):
@@ -41,3 +41,17 @@ class StoryResponse(StoryBase):
     coaching: Optional[CoachingModel] = None
     created_at: datetime
     updated_at: datetime
+
+class PortfolioAnalyticsResponse(BaseModel):
+    """Per-story quality metrics for a user's whole portfolio, one list per column (see ai/portfolio_analytics.py)"""
+    count: int
+    career_stage: Optional[str] = None
+    columns: Dict[str, List[Any]]
+    flag_legend: Dict[str, List[str]]  # Bit i of a *_flags column is the i-th issue type
+    summary: Dict[str, Any]
+
+class PortfolioStatsResponse(BaseModel):
+    """Story counts for a user's portfolio (see portfolio_stats.py)"""
+    total_stories: int
+    tags: Dict[str, int]  # Stories per competency tag
+    status: Dict[str, int]  # Stories per status (draft/complete)
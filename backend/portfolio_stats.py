@@ -0,0 +1,159 @@
+"""
+Per-user portfolio counters (competency coverage without scanning stories).
+
+One document per user in `portfolio_stats/{userId}`:
+    total_stories: int
+    tags:          {tag: number of stories with that tag}
+    status:        {status: number of stories with that status}
+    version:       incremented on every story write (keys cached agent coaching)
+
+stories_router applies each write's delta in the same batch or transaction as
+the story write, using Firestore increments, so the counters never drift from
+the stories. Coverage reads (the coaching agent's get_portfolio_coverage tool,
+GET /stories/coverage) are then a single document read however large the
+portfolio is.
+
+A user's first story write after the counters were introduced finds no
+document and seeds it from a recount of their stories in the same
+transaction (stats_seed), so users with older stories aren't undercounted.
+backfill_portfolio_stats.py recomputes the documents from the stories and can
+check them for drift.
+"""
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+STATS_COLLECTION = "portfolio_stats"
+STORY_FIELDS = ["user_id", "tags", "status"]
+
+
+def _story_counts(story: Optional[dict]) -> Counter:
+    """What one story contributes to the counters (empty for None)."""
+    if not story:
+        return Counter()
+    counts = Counter({"total_stories": 1, f"status:{story.get('status') or 'draft'}": 1})
+    # A tag listed twice on one story still counts that story once
+    counts.update(f"tags:{tag}" for tag in set(story.get("tags") or []))
+    return counts
+
+
+def _as_document(counts: Dict[str, int]) -> dict:
+    document = {"total_stories": counts.get("total_stories", 0), "tags": {}, "status": {}}
+    for key, value in counts.items():
+        if key != "total_stories":
+            group, name = key.split(":", 1)
+            document[group][name] = value
+    return document
+
+
+def compute_stats(stories: Iterable[dict]) -> dict:
+    """Counters for a full list of stories, in the stored document layout."""
+    counts = Counter({"total_stories": 0})
+    for story in stories:
+        counts.update(_story_counts(story))
+    return _as_document(counts)
+
+
+def stats_delta(before: Optional[dict], after: Optional[dict]) -> dict:
+    """
+    Counter changes for one story write: before=None for a create, after=None
+    for a delete. Unchanged counters are left out.
+    """
+    delta = _story_counts(after)
+    delta.subtract(_story_counts(before))
+    return _as_document({key: value for key, value in delta.items() if value})
+
+
+def add_stats_delta(stats: dict, delta: dict) -> dict:
+    """`stats` with `delta` applied (counters that reach zero are kept, like increments)."""
+    result = {
+        "total_stories": stats["total_stories"] + delta["total_stories"],
+        "tags": dict(stats["tags"]),
+        "status": dict(stats["status"]),
+    }
+    for group in ("tags", "status"):
+        for name, value in delta[group].items():
+            result[group][name] = result[group].get(name, 0) + value
+    return result
+
+
+def user_stories_query(db, user_id: str):
+    """The user's stories, with only the fields the counters need."""
+    return db.collection("stories").where(filter=FieldFilter("user_id", "==", user_id)).select(STORY_FIELDS)
+
+
+def stats_seed(transaction, db, user_id: str) -> Optional[dict]:
+    """
+    A recount of the user's stories if they have no counters document yet,
+    otherwise None. Call it before the transaction's writes (Firestore needs
+    reads first) and pass the result to apply_stats_delta.
+    """
+    if db.collection(STATS_COLLECTION).document(user_id).get(transaction=transaction).exists:
+        return None
+    return compute_stats(doc.to_dict() for doc in transaction.get(user_stories_query(db, user_id)))
+
+
+def apply_stats_delta(transaction, db, user_id: str, delta: dict, seed: Optional[dict] = None):
+    """
+    Add `delta` to the user's counters in `transaction`, so it commits
+    atomically with the story write. With a `seed` (from stats_seed) the whole
+    document is written as seed + delta instead.
+    """
+    stats_ref = db.collection(STATS_COLLECTION).document(user_id)
+    if seed is not None:
+        stats = add_stats_delta(seed, delta)
+        transaction.set(stats_ref, {
+            **stats, "user_id": user_id, "version": 1, "updated_at": firestore.SERVER_TIMESTAMP
+        })
+        return
+    # Edits that change no counter (e.g. the story text) still bump the version
+    update = {
+        "user_id": user_id,
+        "version": firestore.Increment(1),
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    }
+    if delta["tags"]:
+        update["tags"] = {tag: firestore.Increment(value) for tag, value in delta["tags"].items()}
+    if delta["status"]:
+        update["status"] = {status: firestore.Increment(value) for status, value in delta["status"].items()}
+    if delta["total_stories"]:
+        update["total_stories"] = firestore.Increment(delta["total_stories"])
+    transaction.set(stats_ref, update, merge=True)
+
+
+def read_stats(db, user_id: str) -> Optional[dict]:
+    """The user's counters, or None if they have no document yet (no story writes since they were added)."""
+    doc = db.collection(STATS_COLLECTION).document(user_id).get()
+    if not doc.exists:
+        return None
+    data = doc.to_dict()
+    return {
+        "total_stories": data.get("total_stories", 0),
+        "tags": data.get("tags", {}),
+        "status": data.get("status", {}),
+    }
+
+
+def read_version(db, user_id: str) -> Optional[int]:
+    """The user's portfolio version (changes with every story write), or None if they have no document yet."""
+    doc = db.collection(STATS_COLLECTION).document(user_id).get()
+    if not doc.exists:
+        return None
+    return doc.to_dict().get("version", 0)
+
+
+def stats_mismatches(stored: Optional[dict], expected: dict) -> Dict[str, tuple]:
+    """Counters whose stored value differs from `expected`, as {name: (stored, expected)}."""
+    stored = stored or {"total_stories": None, "tags": {}, "status": {}}
+    mismatches = {}
+    if stored["total_stories"] != expected["total_stories"]:
+        mismatches["total_stories"] = (stored["total_stories"], expected["total_stories"])
+    for group in ("tags", "status"):
+        # Counters that dropped to zero stay in the document; they aren't drift
+        for name in set(stored[group]) | set(expected[group]):
+            have, want = stored[group].get(name, 0), expected[group].get(name, 0)
+            if have != want:
+                mismatches[f"{group}.{name}"] = (have, want)
+    return mismatches
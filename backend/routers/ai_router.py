@@ -1,24 +1,60 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Optional, Tuple
 from models.ai_models import (
     StructureRequest, StructureResponse,
     TranscribeRequest, TranscribeResponse,
     TagRequest, TagResponseModel,
-    CoachRequest, CoachResponse,
-    ProcessRequest, ProcessResponse
+    CoachRequest, CoachResponse, CoachingInsight, CachedCoachResponse,
+    ProcessRequest, ProcessResponse,
+    ProcessJobSubmitResponse, ProcessJobStatusResponse, JobError,
+    ProcessBatchRequest, ProcessBatchItemResult, ProcessBatchResponse
 )
-from ai.chains import get_structure_chain, get_tagging_chain, get_coaching_chain, get_coaching_agent
+from ai.chains import (
+    get_structure_chain, get_tagging_chain, get_structure_and_tag_chain,
+    get_coaching_chain, get_fast_coaching_chain, get_coaching_agent, AGENT_RUN_CALLBACKS
+)
+from ai.schemas import PARStructure, PARStructureWithTags, TagResponse
+from ai import llm_cache
+from ai.llm_cache import cached_result, is_bypass_requested, CACHE_BYPASS_HEADER, CACHE_STATUS_HEADER
+from ai.pipeline import Stage, StageTimeoutError, run_pipeline, stage_timeout
+from ai.run_context import current_tool_memo, seed_tool_result, user_scope
+from ai.hedging import record_model, track_models
+from ai import chains as ai_chains
+from ai.deadline import (
+    Deadline, activate_deadline, deadline_scope, remaining_budget, within_budget,
+    AI_REQUEST_BUDGET_SECONDS, AI_COACH_FALLBACK_RESERVE_SECONDS, AI_AGENT_MIN_SECONDS, AI_PRO_MIN_SECONDS
+)
+from ai.jobs import JobQueue
+from ai.tools import _detect_weak_storytelling_patterns, _analyze_story_structure_quality, pre_analysis_tool_results
+from ai.token_budget import compact_profile
 import json
+import asyncio
+import logging
 from ai.transcriber import transcribe_audio_file
 from firebase_storage import download_audio_from_storage, upload_transcript_to_storage
+from firebase_admin import firestore
 from firebase_config import get_user_profile
+from portfolio_stats import read_version
 from dependencies.auth_dependencies import get_current_user
+from concurrency import run_blocking
+from structured_logging import AGENT_TRACE_LOGGER
+from metrics import span, route_scope
+from datetime import datetime
 import os
 
+logger = logging.getLogger(__name__)
+# Sampled per request (AGENT_TRACE_SAMPLE_RATE)
+trace_logger = logging.getLogger(AGENT_TRACE_LOGGER)
+
 router = APIRouter(
     prefix="/ai",
     tags=["AI Processing"]
 )
 
+# Response header naming the model that produced /ai/coach insights (Pro or Flash)
+COACHING_MODEL_HEADER = "X-Coaching-Model"
+
 def parse_agent_json(output: str):
     """Helper to extract and parse JSON from agent output string."""
     clean_json = output.strip()
@@ -28,18 +64,108 @@ def parse_agent_json(output: str):
         clean_json = clean_json.split("```")[-1].split("```")[0].strip()
     return json.loads(clean_json)
 
+async def _external_call(stage: str, func, *args, **kwargs):
+    """Run a blocking client call (Storage, Speech-to-Text, Firestore) off the loop, timed as `stage`."""
+    with span(stage):
+        return await run_blocking(func, *args, **kwargs)
+
+def _portfolio_version(user_id: str) -> str:
+    """The user's portfolio version (see portfolio_stats.py), for keying cached agent coaching."""
+    return str(read_version(firestore.client(), user_id))
+
+async def _coach_within_budget(
+    user_id: str, agent_inputs: dict, chain_inputs: dict, route: str, tool_results: Optional[list] = None
+) -> Tuple[dict, bool]:
+    """
+    Generate coaching insights within the current request deadline.
+
+    Runs the tool-calling agent while enough budget is left (keeping
+    AI_COACH_FALLBACK_RESERVE_SECONDS back), otherwise or on failure falls back
+    to the coaching chain. Pro is skipped once less than AI_PRO_MIN_SECONDS remain.
+    `tool_results` ((tool, args, output) tuples) seed the run's tool memo, so the
+    agent doesn't recompute them.
+
+    Returns (coaching dict with strength, gap, suggestion; whether the agent
+    produced it rather than the fallback chain); raises if the fallback fails too.
+    The model that produced it is recorded for ai.hedging.track_models().
+    """
+    agent_budget = remaining_budget() - AI_COACH_FALLBACK_RESERVE_SECONDS
+    if agent_budget >= AI_AGENT_MIN_SECONDS:
+        try:
+            fast = remaining_budget() < AI_PRO_MIN_SECONDS
+            agent_executor = get_coaching_agent(fast=fast)
+            # The agent is shared by every request on this worker; its tools act for this user
+            model = ai_chains.GEMINI_FLASH_MODEL if fast else ai_chains.GEMINI_PRO_MODEL
+            # Tool and LLM callbacks only reach the agent's tools through the run config
+            with user_scope(user_id), span("coaching_agent", model=model):
+                for tool_name, args, output in tool_results or []:
+                    seed_tool_result(tool_name, args, output)
+                memo = current_tool_memo()
+                try:
+                    agent_result = await within_budget(
+                        agent_executor.ainvoke(agent_inputs, config={"callbacks": AGENT_RUN_CALLBACKS}),
+                        reserve=AI_COACH_FALLBACK_RESERVE_SECONDS
+                    )
+                finally:
+                    trace_logger.info("Tool calls saved by run memo", extra={
+                        "saved_calls": memo.saved_calls, "by_tool": dict(memo.saved)
+                    })
+            if fast:
+                record_model(ai_chains.GEMINI_FLASH_MODEL)
+
+            # Log what the agent did
+            raw_output = agent_result.get("output", "")
+            trace_logger.info("Agent output received", extra={"chars": len(raw_output)})
+
+            coaching = parse_agent_json(raw_output)
+
+            # Log and strip the reasoning (internal field)
+            if "_reasoning" in coaching:
+                trace_logger.info("Agent reasoning", extra={"reasoning": coaching["_reasoning"]})
+                del coaching["_reasoning"]  # Don't store in DB/send to frontend
+            return coaching, True
+        except Exception as e:
+            logger.warning("Agent coaching failed, falling back to basic chain",
+                           extra={"route": route, "error": str(e)})
+    else:
+        logger.info("Skipping coaching agent, budget too low",
+                    extra={"route": route, "remaining_seconds": round(remaining_budget(), 1)})
+
+    # Fallback to basic chain (Phase 4 logic), Flash-only when time is short
+    fast = remaining_budget() < AI_PRO_MIN_SECONDS
+    coaching_chain = get_fast_coaching_chain() if fast else get_coaching_chain()
+    model = ai_chains.GEMINI_FLASH_MODEL if fast else ai_chains.GEMINI_PRO_MODEL
+    with span("coaching_chain", model=model):
+        coach_result = await within_budget(coaching_chain.ainvoke(chain_inputs))
+    if fast:
+        record_model(ai_chains.GEMINI_FLASH_MODEL)
+    return coach_result.model_dump(), False
+
 @router.post("/structure", response_model=StructureResponse)
-async def structure_transcript(request: StructureRequest, decoded_token: dict = Depends(get_current_user)):
+async def structure_transcript(
+    request: StructureRequest,
+    response: Response,
+    decoded_token: dict = Depends(get_current_user),
+    cache_bypass: Optional[str] = Header(None, alias=CACHE_BYPASS_HEADER)
+):
     """
     Transforms a raw speech transcript into a structured PAR (Problem-Action-Result) story.
+
+    Results are cached by transcript (see ai/llm_cache.py); send `X-Cache-Bypass: 1` to force a fresh run.
     """
     try:
         # Get the chain
         chain = get_structure_chain()
+        inputs = {"raw_transcript": request.raw_transcript}
 
-        # Invoke the chain
+        # Invoke the chain (or reuse a cached result for the same transcript)
         # The chain returns a PARStructure Pydantic object
-        result = chain.invoke({"raw_transcript": request.raw_transcript})
+        result, cache_status = await cached_result(
+            "structure", inputs, PARStructure,
+            lambda: chain.ainvoke(inputs),
+            bypass=is_bypass_requested(cache_bypass)
+        )
+        response.headers[CACHE_STATUS_HEADER] = cache_status
 
         # Convert to API response model (they share the same structure)
         return StructureResponse(
@@ -52,8 +178,7 @@ async def structure_transcript(request: StructureRequest, decoded_token: dict =
         )
         
     except Exception as e:
-        # In production, log the full error
-        print(f"Error in /ai/structure: {str(e)}")
+        logger.exception("Error in /ai/structure")
         raise HTTPException(
             status_code=500,
             detail="Failed to process transcript. Please try again."
@@ -72,13 +197,14 @@ async def transcribe_audio(request: TranscribeRequest, decoded_token: dict = Dep
     temp_audio_path = None
     try:
         # 1. Download audio from Firebase Storage to temp file
-        temp_audio_path = download_audio_from_storage(request.audio_url)
+        temp_audio_path = await _external_call("download_audio", download_audio_from_storage, request.audio_url)
         
         # 2. Run Whisper transcription
-        transcript_text = transcribe_audio_file(temp_audio_path)
+        transcript_text = await _external_call("speech_to_text", transcribe_audio_file, temp_audio_path)
         
         # 3. Upload transcript text to Firebase Storage
-        transcript_url = upload_transcript_to_storage(
+        transcript_url = await _external_call(
+            "upload_transcript", upload_transcript_to_storage,
             user_id=request.user_id,
             story_id=request.story_id,
             transcript_text=transcript_text
@@ -92,7 +218,7 @@ async def transcribe_audio(request: TranscribeRequest, decoded_token: dict = Dep
         )
         
     except Exception as e:
-        print(f"Error in /ai/transcribe: {str(e)}")
+        logger.exception("Error in /ai/transcribe")
         raise HTTPException(
             status_code=500,
             detail="Failed to transcribe audio. Please try again."
@@ -107,7 +233,12 @@ async def transcribe_audio(request: TranscribeRequest, decoded_token: dict = Dep
 
 
 @router.post("/tag", response_model=TagResponseModel)
-async def tag_story(request: TagRequest, decoded_token: dict = Depends(get_current_user)):
+async def tag_story(
+    request: TagRequest,
+    response: Response,
+    decoded_token: dict = Depends(get_current_user),
+    cache_bypass: Optional[str] = Header(None, alias=CACHE_BYPASS_HEADER)
+):
     """
     Auto-assign 1-3 behavioral competency tags to a PAR story.
 
@@ -116,13 +247,19 @@ async def tag_story(request: TagRequest, decoded_token: dict = Depends(get_curre
     """
     try:
         chain = get_tagging_chain()
-        
-        # Invoke the chain with PAR components
-        result = chain.invoke({
+        inputs = {
             "problem": request.problem,
             "action": request.action,
             "result": request.result
-        })
+        }
+
+        # Invoke the chain with PAR components (or reuse a cached result)
+        result, cache_status = await cached_result(
+            "tagging", inputs, TagResponse,
+            lambda: chain.ainvoke(inputs),
+            bypass=is_bypass_requested(cache_bypass)
+        )
+        response.headers[CACHE_STATUS_HEADER] = cache_status
         
         # Convert to API response format
         tag_assignments = [
@@ -133,14 +270,19 @@ async def tag_story(request: TagRequest, decoded_token: dict = Depends(get_curre
         return TagResponseModel(tags=tag_assignments)
         
     except Exception as e:
-        print(f"Error in /ai/tag: {str(e)}")
+        logger.exception("Error in /ai/tag")
         raise HTTPException(
             status_code=500,
             detail="Tagging failed. Please try again."
         )
 
 @router.post("/coach", response_model=CoachResponse)
-async def coach_story(request: CoachRequest, decoded_token: dict = Depends(get_current_user)):
+async def coach_story(
+    request: CoachRequest,
+    response: Response,
+    decoded_token: dict = Depends(get_current_user),
+    cache_bypass: Optional[str] = Header(None, alias=CACHE_BYPASS_HEADER)
+):
     """
     Generate coaching insights for a PAR story.
 
@@ -151,101 +293,182 @@ async def coach_story(request: CoachRequest, decoded_token: dict = Depends(get_c
 
     Personalized with first name and optional career context.
     """
-    # Validate user_id matches authenticated user
-    if request.user_id != decoded_token["uid"]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    # CoachRequest carries no user ID; the agent acts for the authenticated user
+    user_id = decoded_token["uid"]
 
     # Prepare optional inputs
     tags_str = ", ".join(request.tags) if request.tags else "None provided"
     # UserProfileContext is converted to dict for the prompt
     profile_dict = request.user_profile.model_dump(exclude_none=True) if request.user_profile else {}
-    profile_str = str(profile_dict) if profile_dict else "None provided"
+    profile_str = compact_profile(profile_dict)
 
-    # Try tool-calling agent first
-    try:
-        agent_executor = get_coaching_agent(request.user_id)
-        agent_result = agent_executor.invoke({
-            "first_name": request.first_name,
-            "problem": request.problem,
-            "action": request.action,
-            "result": request.result,
-            "tags": tags_str,
-            "user_profile": profile_str
-        })
-        
-        parsed = parse_agent_json(agent_result["output"])
-        return CoachResponse(
-            strength=parsed["strength"],
-            gap=parsed["gap"],
-            suggestion=parsed["suggestion"]
-        )
-    except Exception as agent_err:
-        print(f"Agent coaching failed: {str(agent_err)}. Falling back to basic chain.")
-        # Fallback to basic chain (Phase 4 logic)
+    inputs = {
+        "first_name": request.first_name,
+        "problem": request.problem,
+        "action": request.action,
+        "result": request.result,
+        "tags": tags_str,
+        "user_profile": profile_str
+    }
+
+    async def generate_coaching() -> CachedCoachResponse:
         try:
-            chain = get_coaching_chain()
-            result = chain.invoke({
-                "first_name": request.first_name,
-                "problem": request.problem,
-                "action": request.action,
-                "result": request.result,
-                "tags": tags_str,
-                "user_profile": profile_str
-            })
-            
-            return CoachResponse(
-                strength=result.strength.model_dump(),
-                gap=result.gap.model_dump(),
-                suggestion=result.suggestion.model_dump()
+            with track_models() as models:
+                coaching, from_agent = await _coach_within_budget(user_id, inputs, inputs, "/ai/coach")
+            nonlocal fallback_used
+            fallback_used = not from_agent
+            return CachedCoachResponse(
+                coaching=CoachResponse(
+                    strength=coaching["strength"],
+                    gap=coaching["gap"],
+                    suggestion=coaching["suggestion"]
+                ),
+                model=models[-1] if models else None
             )
         except Exception as e:
-            print(f"Coaching fallback failed: {str(e)}")
+            logger.exception("Coaching fallback failed")
             raise HTTPException(
                 status_code=500,
                 detail="Coaching failed. Please try again."
             )
 
+    fallback_used = False
+    try:
+        with deadline_scope():
+            # The agent reads the user's other stories, so cached insights are per user and
+            # portfolio version: any story write makes earlier insights miss.
+            version = None
+            if llm_cache.LLM_CACHE_ENABLED:
+                try:
+                    version = await _external_call("portfolio_version", _portfolio_version, user_id)
+                except Exception as e:
+                    logger.warning("Portfolio version read failed, not caching coaching", extra={"error": str(e)})
+            # Fallback-chain insights are degraded, so only agent output is cached
+            cached, cache_status = await cached_result(
+                "coaching_agent", inputs, CachedCoachResponse, generate_coaching,
+                scope=f"{user_id}:portfolio-{version}",
+                bypass=is_bypass_requested(cache_bypass) or version is None,
+                cacheable=lambda result: not fallback_used and version is not None
+            )
+        response.headers[CACHE_STATUS_HEADER] = cache_status
+        if cached.model:
+            response.headers[COACHING_MODEL_HEADER] = cached.model
+        return cached.coaching
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in /ai/coach: {str(e)}")
+        logger.exception("Error in /ai/coach")
         raise HTTPException(
             status_code=500,
             detail="Coaching failed. Please try again."
         )
 
-@router.post("/process", response_model=ProcessResponse)
-async def process_story(request: ProcessRequest, decoded_token: dict = Depends(get_current_user)):
-    """
-    All-in-one: transcribe → structure → tag → coach.
-    Returns complete story payload ready for frontend display/save.
-    """
+# Per-stage timeouts for /ai/process in seconds (override with AI_STAGE_TIMEOUT_<STAGE>).
+# Transcription allows for long_running_recognize, which can wait up to 1800s.
+PROCESS_STAGE_TIMEOUTS = {
+    "transcribe": stage_timeout("transcribe", 1900),
+    "structure": stage_timeout("structure", 90),
+    "tag": stage_timeout("tag", 60),
+    "profile": stage_timeout("profile", 15),
+    "storytelling_analysis": stage_timeout("storytelling_analysis", 10),
+    "structure_analysis": stage_timeout("structure_analysis", 10),
+    "coach": stage_timeout("coach", 240),
+}
+
+# Default for ProcessRequest.fused_structure_tag: structure and tag with one Gemini call
+# instead of two sequential ones (see benchmarks/fused_structure_tag.py)
+FUSED_STRUCTURE_TAG = os.getenv("AI_FUSED_STRUCTURE_TAG", "false").lower() in ("1", "true", "yes")
+
+def _build_profile_context(profile_data: dict) -> str:
+    """Format the coaching-relevant profile fields for the prompt."""
+    # One "field: value" line per non-empty, non-redundant field (see ai/token_budget.py)
+    return compact_profile(profile_data)
+
+def _build_pre_analysis_context(storytelling_analysis: dict, structure_analysis: dict) -> str:
+    """Format the pre-analysis results for the coaching agent prompt."""
+    pre_analysis_context = f"""
+### PRE-ANALYSIS RESULTS (Already gathered for you)
+
+**Storytelling Analysis:**
+- Issues found: {storytelling_analysis['issue_count']}
+- Quality score: {storytelling_analysis['quality_score']:.2f}
+- Has quantified results: {storytelling_analysis['has_quantified_results']}
+"""
+    if storytelling_analysis['issues']:
+        for issue in storytelling_analysis['issues']:
+            pre_analysis_context += f"- [{issue['severity'].upper()}] {issue['type']}: {issue['message']}\n"
+    else:
+        pre_analysis_context += "- No major storytelling issues detected.\n"
+
+    pre_analysis_context += f"""
+**Structure Analysis:**
+- Total words: {structure_analysis['word_counts']['total']}
+- Balance score: {structure_analysis['balance_score']:.2f}
+- Problem: {structure_analysis['word_counts']['problem']} words ({structure_analysis['percentages']['problem']:.0f}%)
+- Action: {structure_analysis['word_counts']['action']} words ({structure_analysis['percentages']['action']:.0f}%)
+- Result: {structure_analysis['word_counts']['result']} words ({structure_analysis['percentages']['result']:.0f}%)
+"""
+    if structure_analysis['issues']:
+        for issue in structure_analysis['issues']:
+            pre_analysis_context += f"- {issue['message']}\n"
+    else:
+        pre_analysis_context += "- Structure is well-balanced.\n"
+
+    return pre_analysis_context
+
+def _check_process_input(request: ProcessRequest, decoded_token: dict) -> None:
+    """Reject /ai/process requests for other users or without any input."""
     # Validate user_id matches authenticated user
     if request.user_id != decoded_token["uid"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
 
-    warnings = []
-    temp_audio_path = None
-
     # 1. Input validation
     if not request.audio_url and not request.raw_transcript:
         raise HTTPException(status_code=400, detail="Either audio_url or raw_transcript must be provided")
 
-    try:
-        # 2. Transcription (if needed)
+async def _run_process_pipeline(request: ProcessRequest, on_stage_complete=None,
+                                cache_bypass: bool = False, load_profile=None) -> ProcessResponse:
+    """
+    Run transcribe → structure → tag → coach for an already-validated request.
+    In fused mode (request.fused_structure_tag / AI_FUSED_STRUCTURE_TAG) the
+    structure stage also returns the tags, falling back to separate calls on failure.
+
+    Stages run as a dependency graph: once structuring finishes, tagging and
+    both pre-analysis tools run concurrently, and the profile fetch starts
+    immediately. Coaching starts when all of them are ready.
+
+    `on_stage_complete(stage_name, result)` is awaited as each stage finishes
+    (used by the streaming endpoint). Structure and tag results share the
+    /ai/structure and /ai/tag cache unless `cache_bypass` is set.
+    `load_profile()` replaces the per-request profile fetch (used by the
+    batch endpoint to fetch the profile once for every item).
+    """
+    warnings = []
+    temp_audio_path = None
+    # Latency budget for coaching, started once the transcript is available
+    analysis_deadline = None
+    # Model that produced the coaching insights (hedged Pro/Flash)
+    coaching_model = None
+
+    # 2. Transcription (if needed)
+    async def transcribe_stage(results):
+        nonlocal temp_audio_path
         transcript_text = request.raw_transcript
         raw_transcript_url = None
-        
+
         if request.audio_url and not request.raw_transcript:
             try:
                 # Reuse logic from /ai/transcribe
-                temp_audio_path = download_audio_from_storage(request.audio_url)
-                transcript_text = transcribe_audio_file(temp_audio_path)
-                raw_transcript_url = upload_transcript_to_storage(
+                temp_audio_path = await _external_call("download_audio", download_audio_from_storage, request.audio_url)
+                transcript_text = await _external_call("speech_to_text", transcribe_audio_file, temp_audio_path)
+                raw_transcript_url = await _external_call(
+                    "upload_transcript", upload_transcript_to_storage,
                     user_id=request.user_id,
                     story_id=request.story_id,
                     transcript_text=transcript_text
                 )
             except Exception as e:
-                print(f"Transcription failed in /ai/process: {str(e)}")
+                logger.exception("Transcription failed in /ai/process")
                 raise HTTPException(status_code=500, detail="Transcription failed. Please try again.")
 
         # 2.5 Validation: Ensure transcript is not empty
@@ -255,190 +478,171 @@ async def process_story(request: ProcessRequest, decoded_token: dict = Depends(g
                 detail="Transcription failed or audio was empty. Please try recording again."
             )
 
-        # 3. Structure
+        nonlocal analysis_deadline
+        analysis_deadline = Deadline(AI_REQUEST_BUDGET_SECONDS)
+        return {"text": transcript_text, "url": raw_transcript_url}
+
+    use_fused = FUSED_STRUCTURE_TAG if request.fused_structure_tag is None else request.fused_structure_tag
+
+    # 3. Structure (and, in fused mode, tag in the same call)
+    async def structure_stage(results):
+        inputs = {"raw_transcript": results["transcribe"]["text"]}
+        if use_fused:
+            try:
+                fused_chain = get_structure_and_tag_chain()
+                fused_result, _ = await cached_result(
+                    "structure_and_tag", inputs, PARStructureWithTags,
+                    lambda: fused_chain.ainvoke(inputs), bypass=cache_bypass
+                )
+                return fused_result
+            except Exception as e:
+                logger.warning("Fused structure+tag failed in /ai/process, using separate calls",
+                               extra={"error": str(e)})
+
         try:
             structure_chain = get_structure_chain()
-            structure_result = structure_chain.invoke({"raw_transcript": transcript_text})
             # Skip structure_result.warnings as they are redundant with Coaching Insights
-            pass
+            structure_result, _ = await cached_result(
+                "structure", inputs, PARStructure,
+                lambda: structure_chain.ainvoke(inputs), bypass=cache_bypass
+            )
+            return structure_result
         except Exception as e:
-            print(f"Structuring failed in /ai/process: {str(e)}")
+            logger.exception("Structuring failed in /ai/process")
             raise HTTPException(status_code=500, detail="Structuring failed. Please try again.")
 
-        # 4. Tagging (Graceful Failure)
-        tags = []
-        try:
+    # 4. Tagging (Graceful Failure)
+    async def tag_stage(results):
+        structure_result = results["structure"]
+        if isinstance(structure_result, PARStructureWithTags):
+            # Already tagged by the fused call
+            tag_assignments = structure_result.tags
+        else:
             tagging_chain = get_tagging_chain()
-            tag_result = tagging_chain.invoke({
+            inputs = {
                 "problem": structure_result.problem,
                 "action": structure_result.action,
                 "result": structure_result.result
-            })
-            tags = [{"tag": ta.tag, "confidence": ta.confidence, "reasoning": ta.reasoning} for ta in tag_result.tags]
-        except Exception as e:
-            print(f"Tagging failed in /ai/process (graceful): {str(e)}")
-            warnings.append(f"Behavioral tagging failed: {str(e)}")
-
-        # 5. Coaching (Graceful Failure - with Tool Agent)
-        coaching = None
-        try:
-            # Fetch user profile for context
-            profile_data = get_user_profile(request.user_id)
-            first_name = profile_data.get("first_name", "User")
-            
-            # Prepare optional profile context
-            profile_context_str = "None provided"
-            if profile_data:
-                context_dict = {
-                    "current_role": profile_data.get("current_role"),
-                    "target_role": profile_data.get("target_role"),
-                    "career_stage": profile_data.get("career_stage"),
-                    "current_company": profile_data.get("current_company"),
-                    "target_companies": profile_data.get("target_companies"),
-                    "current_company_size": profile_data.get("current_company_size"),
-                    "target_company_size": profile_data.get("target_company_size")
-                }
-                # Filter out None values
-                context_dict = {k: v for k, v in context_dict.items() if v is not None}
-                if context_dict:
-                    profile_context_str = str(context_dict)
-
-            tags_list = [t["tag"] for t in tags] if tags else []
-            
-            # ========================================================
-            # FORCED TOOL CALLS: Pre-run quality analysis tools
-            # ========================================================
-            from ai.tools import (
-                _detect_weak_storytelling_patterns,
-                _analyze_story_structure_quality
-            )
-            
-            print("\n📊 Running pre-analysis tools...")
-            
-            # Run storytelling analysis
-            storytelling_analysis = _detect_weak_storytelling_patterns(
-                structure_result.problem,
-                structure_result.action,
-                structure_result.result
-            )
-            
-            # Run structure analysis
-            structure_analysis = _analyze_story_structure_quality(
-                structure_result.problem,
-                structure_result.action,
-                structure_result.result
+            }
+            tag_result, _ = await cached_result(
+                "tagging", inputs, TagResponse,
+                lambda: tagging_chain.ainvoke(inputs), bypass=cache_bypass
             )
-            
-            # Format pre-analysis results for the agent
-            pre_analysis_context = f"""
-### PRE-ANALYSIS RESULTS (Already gathered for you)
+            tag_assignments = tag_result.tags
+        return [{"tag": ta.tag, "confidence": ta.confidence, "reasoning": ta.reasoning} for ta in tag_assignments]
 
-**Storytelling Analysis:**
-- Issues found: {storytelling_analysis['issue_count']}
-- Quality score: {storytelling_analysis['quality_score']:.2f}
-- Has quantified results: {storytelling_analysis['has_quantified_results']}
-"""
-            if storytelling_analysis['issues']:
-                for issue in storytelling_analysis['issues']:
-                    pre_analysis_context += f"- [{issue['severity'].upper()}] {issue['type']}: {issue['message']}\n"
-            else:
-                pre_analysis_context += "- No major storytelling issues detected.\n"
-            
-            pre_analysis_context += f"""
-**Structure Analysis:**
-- Total words: {structure_analysis['word_counts']['total']}
-- Balance score: {structure_analysis['balance_score']:.2f}
-- Problem: {structure_analysis['word_counts']['problem']} words ({structure_analysis['percentages']['problem']:.0f}%)
-- Action: {structure_analysis['word_counts']['action']} words ({structure_analysis['percentages']['action']:.0f}%)
-- Result: {structure_analysis['word_counts']['result']} words ({structure_analysis['percentages']['result']:.0f}%)
-"""
-            if structure_analysis['issues']:
-                for issue in structure_analysis['issues']:
-                    pre_analysis_context += f"- {issue['message']}\n"
-            else:
-                pre_analysis_context += "- Structure is well-balanced.\n"
-            
-            print("   ✅ Pre-analysis complete")
-            raw_word_count = len(transcript_text.split()) if transcript_text else 0
-            print(f"   - Raw transcript: {raw_word_count} words")
-            print(f"   - Structured PAR: {structure_analysis['word_counts']['total']} words")
-            print(f"   - Storytelling issues: {storytelling_analysis['issue_count']}")
-            print(f"   - Structure score: {structure_analysis['balance_score']:.2f}")
-            if storytelling_analysis['issues']:
-                print("   - Issues found:")
-                for issue in storytelling_analysis['issues']:
-                    print(f"     • [{issue['severity']}] {issue['type']}: {issue['message'][:80]}...")
-            if structure_analysis['issues']:
-                print("   - Structure issues:")
-                for issue in structure_analysis['issues']:
-                    print(f"     • {issue['message'][:80]}...")
-            
-            print("\n🤖 Agent context summary:")
-            print(f"   - User: {first_name} ({profile_data.get('career_stage', 'unknown')} at {profile_data.get('current_company', 'unknown')})")
-            print(f"   - Target: {profile_data.get('target_role', 'not set')} at {profile_data.get('target_companies', ['not set'])}")
-            print(f"   - Tags: {', '.join(tags_list) if tags_list else 'none'}")
-            
-            # ========================================================
-            # Use Tool Agent (with pre-analysis context)
-            # ========================================================
-            print("\n🧠 Invoking coaching agent...")
-            try:
-                agent_executor = get_coaching_agent(request.user_id)
-                agent_result = agent_executor.invoke({
-                    "first_name": first_name,
-                    "problem": structure_result.problem,
-                    "action": structure_result.action,
-                    "result": structure_result.result,
-                    "tags": ", ".join(tags_list) if tags_list else "None provided",
-                    "user_profile": profile_context_str,
-                    "pre_analysis": pre_analysis_context  # Add pre-analysis
-                })
-                
-                # Log what the agent did
-                raw_output = agent_result.get("output", "")
-                print(f"\n📝 Agent output received ({len(raw_output)} chars)")
-                
-                coaching = parse_agent_json(raw_output)
-                
-                # Log and strip the reasoning (internal field)
-                if "_reasoning" in coaching:
-                    print(f"\n💭 Agent reasoning: {coaching['_reasoning']}")
-                    del coaching["_reasoning"]  # Don't store in DB/send to frontend
-            except Exception as e:
-                print(f"Agent failed in /ai/process fallback to chain: {str(e)}")
-                # Fallback to chain
-                coaching_chain = get_coaching_chain()
-                coach_result = coaching_chain.invoke({
-                    "first_name": first_name,
-                    "problem": structure_result.problem,
-                    "action": structure_result.action,
-                    "result": structure_result.result,
-                    "tags": ", ".join(tags_list) if tags_list else "None provided",
-                    "user_profile": profile_context_str
-                })
-                coaching = coach_result.model_dump()
-        except Exception as e:
-            print(f"Coaching failed in /ai/process (graceful): {str(e)}")
-            warnings.append(f"Coaching insights failed: {str(e)}")
-            # Provide empty coaching object if it failed
-            from models.ai_models import CoachingInsight, CoachResponse
-            empty_insight = CoachingInsight(overview="Unavailable", detail="Coaching generation failed or was skipped.")
-            coaching = CoachResponse(strength=empty_insight, gap=empty_insight, suggestion=empty_insight).model_dump()
-
-        # 6. Final Response
-        return ProcessResponse(
-            title=structure_result.title,
-            raw_transcript=transcript_text,
-            raw_transcript_url=raw_transcript_url,
-            problem=structure_result.problem,
-            action=structure_result.action,
-            result=structure_result.result,
-            tags=tags,
-            coaching=coaching,
-            confidence_score=structure_result.confidence_score,
-            warnings=warnings
+    def tag_failed(e):
+        logger.warning("Tagging failed in /ai/process (graceful)", extra={"error": str(e)})
+        warnings.append(f"Behavioral tagging failed: {str(e)}")
+        return []
+
+    # Fetch user profile for coaching context (independent of every other stage)
+    async def profile_stage(results):
+        if load_profile is not None:
+            return await load_profile()
+        return await _external_call("profile_fetch", get_user_profile, request.user_id)
+
+    # ========================================================
+    # FORCED TOOL CALLS: Pre-run quality analysis tools
+    # ========================================================
+    async def storytelling_analysis_stage(results):
+        structure_result = results["structure"]
+        return _detect_weak_storytelling_patterns(
+            structure_result.problem,
+            structure_result.action,
+            structure_result.result
+        )
+
+    async def structure_analysis_stage(results):
+        structure_result = results["structure"]
+        return _analyze_story_structure_quality(
+            structure_result.problem,
+            structure_result.action,
+            structure_result.result
         )
 
+    # 5. Coaching (Graceful Failure - with Tool Agent)
+    async def coach_stage(results):
+        transcript_text = results["transcribe"]["text"]
+        structure_result = results["structure"]
+        tags = results["tag"]
+        profile_data = results["profile"]
+        storytelling_analysis = results["storytelling_analysis"]
+        structure_analysis = results["structure_analysis"]
+
+        first_name = profile_data.get("first_name", "User")
+        profile_context_str = _build_profile_context(profile_data)
+        tags_list = [t["tag"] for t in tags] if tags else []
+        pre_analysis_context = _build_pre_analysis_context(storytelling_analysis, structure_analysis)
+
+        trace_logger.info("Pre-analysis complete", extra={
+            "raw_words": len(transcript_text.split()) if transcript_text else 0,
+            "par_words": structure_analysis["word_counts"]["total"],
+            "storytelling_issues": [
+                f"[{issue['severity']}] {issue['type']}: {issue['message'][:80]}"
+                for issue in storytelling_analysis["issues"]
+            ],
+            "structure_score": round(structure_analysis["balance_score"], 2),
+            "structure_issues": [issue["message"][:80] for issue in structure_analysis["issues"]],
+            "career_stage": profile_data.get("career_stage"),
+            "target_role": profile_data.get("target_role"),
+            "tags": tags_list,
+        })
+
+        # ========================================================
+        # Use Tool Agent (with pre-analysis context)
+        # ========================================================
+        chain_inputs = {
+            "first_name": first_name,
+            "problem": structure_result.problem,
+            "action": structure_result.action,
+            "result": structure_result.result,
+            "tags": ", ".join(tags_list) if tags_list else "None provided",
+            "user_profile": profile_context_str
+        }
+        agent_inputs = {**chain_inputs, "pre_analysis": pre_analysis_context}  # Add pre-analysis
+        nonlocal coaching_model
+        with activate_deadline(analysis_deadline), track_models() as models:
+            coaching, _ = await _coach_within_budget(
+                request.user_id, agent_inputs, chain_inputs, "/ai/process",
+                tool_results=pre_analysis_tool_results(
+                    structure_result.problem, structure_result.action, structure_result.result,
+                    storytelling_analysis, structure_analysis
+                )
+            )
+        coaching_model = models[-1] if models else None
+        return coaching
+
+    def coach_failed(e):
+        logger.warning("Coaching failed in /ai/process (graceful)", extra={"error": str(e)})
+        warnings.append(f"Coaching insights failed: {str(e)}")
+        # Provide empty coaching object if it failed
+        empty_insight = CoachingInsight(overview="Unavailable", detail="Coaching generation failed or was skipped.")
+        return CoachResponse(strength=empty_insight, gap=empty_insight, suggestion=empty_insight).model_dump()
+
+    analysis_deps = ("structure",)
+    stages = [
+        Stage("transcribe", transcribe_stage, timeout=PROCESS_STAGE_TIMEOUTS["transcribe"]),
+        Stage("structure", structure_stage, deps=("transcribe",),
+              timeout=PROCESS_STAGE_TIMEOUTS["structure"]),
+        Stage("tag", tag_stage, deps=("structure",),
+              timeout=PROCESS_STAGE_TIMEOUTS["tag"], on_error=tag_failed),
+        Stage("profile", profile_stage,
+              timeout=PROCESS_STAGE_TIMEOUTS["profile"], required=False),
+        Stage("storytelling_analysis", storytelling_analysis_stage, deps=analysis_deps,
+              timeout=PROCESS_STAGE_TIMEOUTS["storytelling_analysis"], required=False),
+        Stage("structure_analysis", structure_analysis_stage, deps=analysis_deps,
+              timeout=PROCESS_STAGE_TIMEOUTS["structure_analysis"], required=False),
+        Stage("coach", coach_stage,
+              deps=("transcribe", "structure", "tag", "profile", "storytelling_analysis", "structure_analysis"),
+              timeout=PROCESS_STAGE_TIMEOUTS["coach"], on_error=coach_failed),
+    ]
+
+    try:
+        results = await run_pipeline(stages, on_stage_complete=on_stage_complete)
+    except StageTimeoutError as e:
+        logger.error("Required stage timed out in /ai/process", extra={"error": str(e)})
+        raise HTTPException(status_code=504, detail="Processing took too long. Please try again.")
     finally:
         # Cleanup temp file if it exists
         if temp_audio_path and os.path.exists(temp_audio_path):
@@ -446,3 +650,233 @@ async def process_story(request: ProcessRequest, decoded_token: dict = Depends(g
                 os.remove(temp_audio_path)
             except:
                 pass
+
+    structure_result = results["structure"]
+
+    # 6. Final Response
+    return ProcessResponse(
+        title=structure_result.title,
+        raw_transcript=results["transcribe"]["text"],
+        raw_transcript_url=results["transcribe"]["url"],
+        problem=structure_result.problem,
+        action=structure_result.action,
+        result=structure_result.result,
+        tags=results["tag"],
+        coaching=results["coach"],
+        confidence_score=structure_result.confidence_score,
+        warnings=warnings,
+        coaching_model=coaching_model
+    )
+
+@router.post("/process", response_model=ProcessResponse)
+async def process_story(
+    request: ProcessRequest,
+    decoded_token: dict = Depends(get_current_user),
+    cache_bypass: Optional[str] = Header(None, alias=CACHE_BYPASS_HEADER)
+):
+    """
+    All-in-one: transcribe → structure → tag → coach.
+    Returns complete story payload ready for frontend display/save.
+    """
+    _check_process_input(request, decoded_token)
+    return await _run_process_pipeline(request, cache_bypass=is_bypass_requested(cache_bypass))
+
+# /ai/process/batch limits (override with env vars)
+# Max items processed at once per batch request; clients may ask for fewer
+BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "3"))
+BATCH_MAX_ITEMS = int(os.getenv("AI_BATCH_MAX_ITEMS", "25"))
+
+def _shared_profile_loader(user_id: str):
+    """Fetch the user's profile once and hand the same result to every batch item."""
+    task = None
+
+    async def load_profile():
+        nonlocal task
+        if task is None:
+            task = asyncio.ensure_future(_external_call("profile_fetch", get_user_profile, user_id))
+        # Shield so one item's stage timeout doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    return load_profile
+
+async def _run_batch_item(index: int, item: ProcessRequest, decoded_token: dict,
+                          semaphore: asyncio.Semaphore, load_profile, cache_bypass: bool) -> ProcessBatchItemResult:
+    """Process one batch item, turning any failure into a per-item error."""
+    try:
+        _check_process_input(item, decoded_token)
+        async with semaphore:
+            response = await _run_process_pipeline(item, cache_bypass=cache_bypass, load_profile=load_profile)
+        return ProcessBatchItemResult(index=index, story_id=item.story_id, status="succeeded", result=response)
+    except HTTPException as e:
+        error = JobError(status_code=e.status_code, detail=str(e.detail))
+    except Exception as e:
+        logger.warning("Batch item failed in /ai/process/batch", extra={"index": index, "error": str(e)})
+        error = JobError(status_code=500, detail="Processing failed. Please try again.")
+    return ProcessBatchItemResult(index=index, story_id=item.story_id, status="failed", error=error)
+
+@router.post("/process/batch", response_model=ProcessBatchResponse)
+async def process_story_batch(
+    request: ProcessBatchRequest,
+    stream: bool = False,
+    decoded_token: dict = Depends(get_current_user),
+    cache_bypass: Optional[str] = Header(None, alias=CACHE_BYPASS_HEADER)
+):
+    """
+    Run /ai/process for many stories with bounded concurrency.
+
+    At most `concurrency` items (capped at AI_BATCH_CONCURRENCY) run at once,
+    and the user's profile is fetched once for the whole batch. A failing item
+    doesn't fail the batch; it is reported with `status: "failed"` and an error.
+
+    With `?stream=true` the response is NDJSON: one ProcessBatchItemResult per
+    line, in completion order, as each item finishes.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items must contain at least one story")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch can contain at most {BATCH_MAX_ITEMS} stories")
+
+    concurrency = min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    if concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be at least 1")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    load_profile = _shared_profile_loader(decoded_token["uid"])
+    bypass = is_bypass_requested(cache_bypass)
+    coroutines = [
+        _run_batch_item(index, item, decoded_token, semaphore, load_profile, bypass)
+        for index, item in enumerate(request.items)
+    ]
+
+    if not stream:
+        results = await asyncio.gather(*coroutines)
+        succeeded = sum(1 for r in results if r.status == "succeeded")
+        return ProcessBatchResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+    async def ndjson_stream():
+        tasks = [asyncio.ensure_future(c) for c in coroutines]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item_result = await next_done
+                yield item_result.model_dump_json() + "\n"
+        finally:
+            # Client disconnected early: stop the items still queued or running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _format_sse(event: str, data) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stage_event(stage_name: str, result):
+    """Map a completed pipeline stage to the (event, data) pair sent to the client, if any."""
+    if stage_name == "transcribe":
+        return "transcript", {"raw_transcript": result["text"], "raw_transcript_url": result["url"]}
+    if stage_name == "structure":
+        return "structure", {
+            "title": result.title,
+            "problem": result.problem,
+            "action": result.action,
+            "result": result.result,
+            "confidence_score": result.confidence_score
+        }
+    if stage_name == "tag":
+        return "tags", {"tags": result}
+    if stage_name == "coach":
+        return "coaching", result
+    return None
+
+@router.post("/process/stream")
+async def process_story_stream(request: ProcessRequest, decoded_token: dict = Depends(get_current_user)):
+    """
+    Streaming variant of /ai/process using Server-Sent Events.
+
+    Emits one event per completed stage so the client can render early:
+    `transcript`, `structure`, `tags`, `coaching`, then `result` with the same
+    payload as /ai/process. Failures after the stream starts are sent as an
+    `error` event with `status_code` and `detail`.
+    """
+    _check_process_input(request, decoded_token)
+
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def on_stage_complete(stage_name, result):
+        event = _stage_event(stage_name, result)
+        if event:
+            await events.put(event)
+
+    async def run():
+        try:
+            response = await _run_process_pipeline(request, on_stage_complete=on_stage_complete)
+            await events.put(("result", response.model_dump()))
+        except HTTPException as e:
+            await events.put(("error", {"status_code": e.status_code, "detail": e.detail}))
+        except Exception as e:
+            logger.exception("Error in /ai/process/stream")
+            await events.put(("error", {"status_code": 500, "detail": "Processing failed. Please try again."}))
+        finally:
+            await events.put(None)
+
+    async def event_stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield _format_sse(*event)
+        finally:
+            # Client disconnected early: stop paying for the remaining stages
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _run_process_job(payload: dict) -> dict:
+    """Job runner: execute the /ai/process pipeline for a stored request."""
+    with route_scope("job:/ai/process/jobs"):
+        response = await _run_process_pipeline(ProcessRequest(**payload))
+    return response.model_dump()
+
+# Background worker pool for /ai/process/jobs (started in main.py's lifespan)
+process_jobs = JobQueue(runner=_run_process_job)
+
+@router.post("/process/jobs", response_model=ProcessJobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_process_job(request: ProcessRequest, decoded_token: dict = Depends(get_current_user)):
+    """
+    Queue an /ai/process run in the background and return a job ID immediately.
+
+    Use this for long recordings that would exceed proxy timeouts, then poll
+    GET /ai/process/jobs/{job_id} for the result.
+    """
+    _check_process_input(request, decoded_token)
+    job_id = await process_jobs.submit(request.user_id, request.model_dump())
+    return ProcessJobSubmitResponse(job_id=job_id, status="queued")
+
+@router.get("/process/jobs/{job_id}", response_model=ProcessJobStatusResponse)
+async def get_process_job(job_id: str, decoded_token: dict = Depends(get_current_user)):
+    """Get the status of a background /ai/process job, and its result once finished."""
+    job = await process_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["user_id"] != decoded_token["uid"]:
+        raise HTTPException(status_code=403, detail="Not authorized to access this job")
+
+    return ProcessJobStatusResponse(
+        job_id=job["job_id"],
+        status=job["status"],
+        result=job["result"],
+        error=job["error"],
+        created_at=datetime.fromtimestamp(job["created_at"]),
+        updated_at=datetime.fromtimestamp(job["updated_at"])
+    )
@@ -4,9 +4,12 @@ from firebase_config import firebase_app
 from models.auth_models import UserRegisterRequest, UserLoginRequest, UserResponse, TokenResponse
 from dependencies.auth_dependencies import get_current_user
 import httpx
+import logging
 import os
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/auth", tags=["auth"])
 db = firestore.client()
 
@@ -52,7 +55,7 @@ async def register(request: UserRegisterRequest):
             detail="Email already registered"
         )
     except Exception as e:
-        print(f"Registration error: {str(e)}")  # Log internally
+        logger.exception("Registration error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Registration failed. Please try again."
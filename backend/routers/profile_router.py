@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from firebase_admin import firestore
 from models.profile_models import ProfileUpdateRequest, ProfileResponse
 from dependencies.auth_dependencies import get_current_user
+from ai.prefetch import TARGET_FIELDS, market_prefetcher, profile_targets
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 db = firestore.client()
@@ -56,7 +57,17 @@ async def update_profile(
         
     update_data["updated_at"] = firestore.SERVER_TIMESTAMP
     
-    db.collection("users").document(uid).update(update_data)
+    user_ref = db.collection("users").document(uid)
+    # Only targets that change are prefetched, so read the old ones first
+    stored_profile = None
+    if any(field in update_data for field in TARGET_FIELDS):
+        stored_profile = user_ref.get().to_dict() or {}
+    
+    user_ref.update(update_data)
+    
+    # Warm the tool cache for new targets so the next coaching run skips the Tavily round trips
+    if stored_profile is not None:
+        await market_prefetcher.enqueue(profile_targets(update_data, stored_profile))
     
     # Return the updated profile
     return await get_profile(decoded_token)
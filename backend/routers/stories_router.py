@@ -2,8 +2,18 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from firebase_admin import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 from typing import List, Optional
-from models.story_models import StoryCreate, StoryUpdate, StoryResponse
+from models.story_models import (
+    StoryCreate, StoryUpdate, StoryResponse, PortfolioAnalyticsResponse, PortfolioStatsResponse
+)
 from dependencies.auth_dependencies import get_current_user
+from ai.portfolio_analytics import analyze_portfolio
+from ai.similarity_index import index_story, unindex_story
+from ai.run_context import invalidate_portfolio
+from concurrency import run_blocking
+from firebase_config import get_user_profile
+from portfolio_stats import apply_stats_delta, compute_stats, read_stats, stats_delta, stats_seed
+from metrics import span
+import asyncio
 from datetime import datetime
 import uuid
 
@@ -28,10 +38,19 @@ async def create_story(
     })
     
     stories_ref = db.collection("stories").document(story_id)
-    stories_ref.set(story_data)
+    # The story and its coverage counters are written atomically
+    @firestore.transactional
+    def create_in_transaction(transaction):
+        seed = stats_seed(transaction, db, uid)
+        transaction.set(stories_ref, story_data)
+        apply_stats_delta(transaction, db, uid, stats_delta(None, story_data), seed)
+
+    create_in_transaction(db.transaction())
     
     # Fetch back to get the server timestamps
     doc = stories_ref.get()
+    invalidate_portfolio(uid)
+    index_story(uid, doc.to_dict())
     return _format_story_doc(doc)
 
 @router.get("", response_model=List[StoryResponse])
@@ -63,6 +82,58 @@ async def list_stories(
     
     return stories
 
+def _load_portfolio(uid: str) -> List[dict]:
+    """Fetch the fields the analytics and coverage need for every story of the user."""
+    query = db.collection("stories").where(filter=FieldFilter("user_id", "==", uid))
+    query = query.select(["story_id", "title", "status", "tags", "problem", "action", "result"])
+    return [doc.to_dict() for doc in query.stream()]
+
+@router.get("/analytics", response_model=PortfolioAnalyticsResponse)
+async def get_portfolio_analytics(
+    career_stage: Optional[str] = Query(None, description="Override the profile's career stage for alignment scores"),
+    decoded_token: dict = Depends(get_current_user)
+):
+    """
+    Quality metrics for every story of the authenticated user in one call.
+
+    Computes structure balance, weak storytelling patterns and career stage
+    alignment for the whole portfolio (no LLM calls) and returns them as a
+    columnar table: `columns` maps each metric to a list in story order.
+    """
+    uid = decoded_token["uid"]
+
+    async def load_stories():
+        with span("stories_fetch"):
+            return await run_blocking(_load_portfolio, uid)
+
+    async def load_career_stage():
+        if career_stage:
+            return career_stage
+        with span("profile_fetch"):
+            profile = await run_blocking(get_user_profile, uid)
+        return profile.get("career_stage")
+
+    stories, stage = await asyncio.gather(load_stories(), load_career_stage())
+    # CPU-bound for large portfolios, so keep it off the event loop
+    return await run_blocking(analyze_portfolio, stories, stage)
+
+@router.get("/coverage", response_model=PortfolioStatsResponse)
+async def get_portfolio_coverage(decoded_token: dict = Depends(get_current_user)):
+    """
+    Story counts per competency tag and per status, plus the total.
+
+    A single read of the user's portfolio_stats document; users whose
+    counters haven't been backfilled yet get them computed from their stories.
+    """
+    uid = decoded_token["uid"]
+    with span("stats_fetch"):
+        stats = await run_blocking(read_stats, db, uid)
+    if stats is None:
+        with span("stories_fetch"):
+            stories = await run_blocking(_load_portfolio, uid)
+        stats = compute_stats(stories)
+    return stats
+
 @router.get("/{story_id}", response_model=StoryResponse)
 async def get_story(
     story_id: str,
@@ -91,24 +162,35 @@ async def update_story(
     """Update an existing story."""
     uid = decoded_token["uid"]
     doc_ref = db.collection("stories").document(story_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Story not found")
-    
-    data = doc.to_dict()
-    if data.get("user_id") != uid:
-        raise HTTPException(status_code=403, detail="Not authorized to update this story")
-    
     update_data = {k: v for k, v in request.model_dump().items() if v is not None}
-    if not update_data:
-        return _format_story_doc(doc)
-        
-    update_data["updated_at"] = firestore.SERVER_TIMESTAMP
-    doc_ref.update(update_data)
-    
+
+    @firestore.transactional
+    def update_in_transaction(transaction):
+        # Read and write in one transaction so concurrent edits can't double-count tags
+        doc = doc_ref.get(transaction=transaction)
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Story not found")
+
+        data = doc.to_dict()
+        if data.get("user_id") != uid:
+            raise HTTPException(status_code=403, detail="Not authorized to update this story")
+        if not update_data:
+            return doc
+
+        seed = stats_seed(transaction, db, uid)
+        transaction.update(doc_ref, {**update_data, "updated_at": firestore.SERVER_TIMESTAMP})
+        apply_stats_delta(transaction, db, uid, stats_delta(data, {**data, **update_data}), seed)
+        return None
+
+    unchanged = update_in_transaction(db.transaction())
+    if unchanged is not None:
+        return _format_story_doc(unchanged)
+
     # Return updated doc
-    return _format_story_doc(doc_ref.get())
+    updated = doc_ref.get()
+    invalidate_portfolio(uid)
+    index_story(uid, updated.to_dict())
+    return _format_story_doc(updated)
 
 @router.delete("/{story_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_story(
@@ -118,16 +200,24 @@ async def delete_story(
     """Delete a story."""
     uid = decoded_token["uid"]
     doc_ref = db.collection("stories").document(story_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Story not found")
-    
-    data = doc.to_dict()
-    if data.get("user_id") != uid:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this story")
-    
-    doc_ref.delete()
+
+    @firestore.transactional
+    def delete_in_transaction(transaction):
+        doc = doc_ref.get(transaction=transaction)
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Story not found")
+
+        data = doc.to_dict()
+        if data.get("user_id") != uid:
+            raise HTTPException(status_code=403, detail="Not authorized to delete this story")
+
+        seed = stats_seed(transaction, db, uid)
+        transaction.delete(doc_ref)
+        apply_stats_delta(transaction, db, uid, stats_delta(data, None), seed)
+
+    delete_in_transaction(db.transaction())
+    invalidate_portfolio(uid)
+    unindex_story(uid, story_id)
     return None
 
 def _format_story_doc(doc):
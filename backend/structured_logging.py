@@ -0,0 +1,259 @@
+"""
+Non-blocking structured (JSON) logging for request paths.
+
+`print` writes to stdout synchronously from the event loop and interleaves
+under load. configure_logging() instead routes every stdlib logger through a
+bounded in-memory queue; a background thread formats records as one JSON
+object per line and writes them out. Call sites only pay for building the
+LogRecord:
+
+    logger = logging.getLogger(__name__)
+    logger.info("Transcription complete", extra={"chars": len(text)})
+
+Every record carries the current request ID (set by RequestIdMiddleware from
+the X-Request-ID header, or generated). Verbose agent traces go to the
+AGENT_TRACE_LOGGER logger and are sampled per request, so a sampled request
+keeps its whole trace. When the queue is full records are dropped (and
+counted on /metrics) rather than blocking the caller.
+"""
+import atexit
+import contextlib
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterator, Optional
+
+from metrics import Counter
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text" (human-readable, for local development)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Max records waiting to be written; further records are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of requests whose agent traces (tool calls, pre-analysis context) are kept
+AGENT_TRACE_SAMPLE_RATE = float(os.getenv("AGENT_TRACE_SAMPLE_RATE", "0.1"))
+
+AGENT_TRACE_LOGGER = "ai.agent_trace"
+REQUEST_ID_HEADER = "X-Request-ID"
+_REQUEST_ID_HEADER_KEY = REQUEST_ID_HEADER.lower().encode("latin-1")
+
+LOG_RECORDS_DROPPED = Counter(
+    "parfolio_log_records_dropped_total", "Log records dropped because the log queue was full.", ("logger",)
+)
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+# =============================================================================
+# REQUEST ID
+# =============================================================================
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextlib.contextmanager
+def request_id_scope(request_id: Optional[str] = None) -> Iterator[str]:
+    """Tag log records in the enclosed block with `request_id` (a new one if omitted)."""
+    request_id = request_id or uuid.uuid4().hex
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: bind the caller's X-Request-ID (or a new one) and echo it on the response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope.get("headers", ()):
+            if name == _REQUEST_ID_HEADER_KEY:
+                incoming = value.decode("latin-1")
+                break
+        if incoming is not None and not _VALID_REQUEST_ID.match(incoming):
+            incoming = None
+
+        with request_id_scope(incoming) as request_id:
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (_REQUEST_ID_HEADER_KEY, request_id.encode("latin-1"))
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_id)
+
+
+# =============================================================================
+# FORMATTING AND SAMPLING
+# =============================================================================
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, request_id, extra fields, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable single-line format with the request ID and extra fields appended."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{k}={v}" for k, v in record.__dict__.items() if k not in _RESERVED_ATTRS)
+        line = f"{self.formatTime(record)} {record.levelname:<7} [{getattr(record, 'request_id', None) or '-'}] " \
+               f"{record.name}: {record.getMessage()}"
+        if fields:
+            line += f" | {fields}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+def _sampled(request_id: Optional[str], rate: float) -> bool:
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    if request_id is None:
+        return False
+    # Stable per request: every trace record of a sampled request is kept
+    return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < rate
+
+
+class TraceSampler(logging.Filter):
+    """Keep AGENT_TRACE_SAMPLE_RATE of requests' trace records (warnings and above always pass)."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or _sampled(_request_id.get(), self.rate)
+
+
+# =============================================================================
+# QUEUE HANDLER
+# =============================================================================
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueue records for the listener thread; drop (and count) them once
+    `maxsize` are waiting. Uses a lock-free SimpleQueue, so the bound is
+    approximate under contention.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, maxsize: int = 0):
+        super().__init__(log_queue)
+        self.maxsize = maxsize
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # The queue is thread-safe, so skip the handler lock logging.Handler takes
+        if not self.filter(record):
+            return False
+        self.enqueue(self.prepare(record))
+        return True
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Capture what depends on the calling context; JSON formatting happens on the listener thread
+        record.request_id = _request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.maxsize and self.queue.qsize() >= self.maxsize:
+            LOG_RECORDS_DROPPED.inc((record.name,))
+            return
+        self.queue.put_nowait(record)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(stream=None) -> None:
+    """Install the queue handler on the root logger and start the writer thread (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    # Skip per-record metadata the JSON output doesn't include (stdlib logging's
+    # documented optimisations); finding the caller's file/line walks the stack
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(NonBlockingQueueHandler(log_queue, maxsize=LOG_QUEUE_SIZE))
+    root.setLevel(LOG_LEVEL)
+
+    trace_logger = logging.getLogger(AGENT_TRACE_LOGGER)
+    trace_logger.filters = [f for f in trace_logger.filters if not isinstance(f, TraceSampler)]
+    trace_logger.addFilter(TraceSampler(AGENT_TRACE_SAMPLE_RATE))
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+
+
+# Flush whatever is still queued when the process exits
+atexit.register(shutdown_logging)
@@ -0,0 +1,356 @@
+"""
+Concurrency tests for the AI router.
+
+The chains, agent and blocking SDK calls are replaced with fakes that sleep,
+so these tests check that N simultaneous requests finish in roughly the time
+of one instead of queueing behind each other on the event loop.
+"""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from routers import ai_router
+from ai import llm_cache
+from dependencies.auth_dependencies import get_current_user
+
+MOCK_USER = {"uid": "test_user_123", "email": "test@example.com"}
+
+STAGE_DELAY = 0.3
+CONCURRENT_REQUESTS = 5
+
+PAR = {
+    "title": "Checkout Redesign",
+    "problem": "Cart abandonment was 40%.",
+    "action": "I redesigned the checkout flow.",
+    "result": "Abandonment dropped to 22%.",
+    "confidence_score": 0.9,
+}
+
+COACHING = {
+    "strength": {"overview": "Clear ownership.", "detail": "You led the redesign."},
+    "gap": {"overview": "Thin context.", "detail": "Explain the stakes."},
+    "suggestion": {"overview": "Add scale.", "detail": "Mention user counts."},
+}
+
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def model_dump(self):
+        return dict(self.__dict__)
+
+
+class FakeChain:
+    """Async-only chain stand-in that sleeps without blocking the loop."""
+
+    def __init__(self, result):
+        self.result = result
+
+    def invoke(self, inputs, config=None):
+        raise AssertionError("Handlers must use ainvoke, not invoke")
+
+    async def ainvoke(self, inputs, config=None):
+        await asyncio.sleep(STAGE_DELAY)
+        return self.result
+
+
+def _blocking(result):
+    """Blocking SDK stand-in (e.g. Speech-to-Text) that holds its thread."""
+    def call(*args, **kwargs):
+        time.sleep(STAGE_DELAY)
+        return result
+    return call
+
+
+@pytest.fixture
+def app(monkeypatch):
+    structure = _Obj(warnings=[], **PAR)
+    tags = _Obj(tags=[_Obj(tag="Impact", confidence=0.9, reasoning="Measured outcome.")])
+
+    # Every request must reach the fakes
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(ai_router, "get_structure_chain", lambda: FakeChain(structure))
+    monkeypatch.setattr(ai_router, "get_tagging_chain", lambda: FakeChain(tags))
+    monkeypatch.setattr(ai_router, "get_coaching_agent",
+                        lambda **kwargs: FakeChain({"output": json.dumps(COACHING)}))
+    monkeypatch.setattr(ai_router, "get_user_profile", _blocking({"first_name": "Test"}))
+    monkeypatch.setattr(ai_router, "download_audio_from_storage", _blocking("/nonexistent/audio.wav"))
+    monkeypatch.setattr(ai_router, "transcribe_audio_file", _blocking("I fixed checkout."))
+    monkeypatch.setattr(ai_router, "upload_transcript_to_storage", _blocking("https://example.com/t.txt"))
+
+    test_app = FastAPI()
+    test_app.include_router(ai_router.router)
+    test_app.dependency_overrides[get_current_user] = lambda: MOCK_USER
+    return test_app
+
+
+async def _fire(app, path, payload, count):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[client.post(path, json=payload) for _ in range(count)])
+        return responses, time.perf_counter() - start
+
+
+def test_structure_requests_run_concurrently(app):
+    """Test that simultaneous /ai/structure calls overlap instead of serializing."""
+    responses, elapsed = asyncio.run(
+        _fire(app, "/ai/structure", {"raw_transcript": "story"}, CONCURRENT_REQUESTS)
+    )
+    assert all(r.status_code == 200 for r in responses)
+    assert elapsed < STAGE_DELAY * 2
+
+
+def test_transcribe_offloads_blocking_calls(app):
+    """Test that blocking download/transcribe/upload calls don't stall other requests."""
+    payload = {"audio_url": "gs://bucket/a.wav", "story_id": "s1", "user_id": MOCK_USER["uid"]}
+    responses, elapsed = asyncio.run(_fire(app, "/ai/transcribe", payload, CONCURRENT_REQUESTS))
+    assert all(r.status_code == 200 for r in responses)
+    # Three sequential blocking stages per request; serialized would be 5x that
+    assert elapsed < STAGE_DELAY * 3 * 2
+
+
+def test_process_requests_run_concurrently(app):
+    """Test that full /ai/process pipelines overlap across requests."""
+    payload = {"raw_transcript": "I fixed checkout.", "story_id": "s1", "user_id": MOCK_USER["uid"]}
+    responses, elapsed = asyncio.run(_fire(app, "/ai/process", payload, CONCURRENT_REQUESTS))
+
+    assert all(r.status_code == 200 for r in responses)
+    body = responses[0].json()
+    assert body["title"] == PAR["title"]
+    assert body["coaching"]["strength"]["overview"] == "Clear ownership."
+    # structure -> tag -> agent is the critical path; the profile fetch overlaps it
+    assert elapsed < STAGE_DELAY * 3 * 2
+
+
+def test_process_whitespace_transcript_rejected(app):
+    """Test that the empty-transcript check still returns 400 through the pipeline."""
+    payload = {"raw_transcript": "   \n  ", "story_id": "s1", "user_id": MOCK_USER["uid"]}
+    responses, _ = asyncio.run(_fire(app, "/ai/process", payload, 1))
+    assert responses[0].status_code == 400
+    assert "Transcription failed or audio was empty" in responses[0].json()["detail"]
+
+
+def test_process_tagging_failure_is_graceful(app, monkeypatch):
+    """Test that a tagging failure becomes a warning while coaching still runs."""
+    class FailingChain:
+        async def ainvoke(self, inputs, config=None):
+            raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(ai_router, "get_tagging_chain", lambda: FailingChain())
+    payload = {"raw_transcript": "I fixed checkout.", "story_id": "s1", "user_id": MOCK_USER["uid"]}
+    responses, _ = asyncio.run(_fire(app, "/ai/process", payload, 1))
+
+    body = responses[0].json()
+    assert responses[0].status_code == 200
+    assert body["tags"] == []
+    assert body["warnings"] == ["Behavioral tagging failed: quota exceeded"]
+    assert body["coaching"]["gap"]["overview"] == "Thin context."
+
+
+def _parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def _stream(app, payload):
+    """Collect SSE events with the time (since request start) each one was read."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        arrivals = []
+        async with client.stream("POST", "/ai/process/stream", json=payload) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            async for chunk in response.aiter_text():
+                for event in _parse_sse(chunk):
+                    arrivals.append((event, time.perf_counter() - start))
+        return arrivals
+
+
+def test_process_stream_emits_stages_in_order(app):
+    """Test that the SSE variant sends each stage as it completes, then the full result."""
+    payload = {"raw_transcript": "I fixed checkout.", "story_id": "s1", "user_id": MOCK_USER["uid"]}
+    arrivals = asyncio.run(_stream(app, payload))
+
+    names = [event[0] for event, _ in arrivals]
+    assert names == ["transcript", "structure", "tags", "coaching", "result"]
+
+    by_name = {event[0]: event[1] for event, _ in arrivals}
+    assert by_name["structure"]["title"] == PAR["title"]
+    assert by_name["tags"]["tags"][0]["tag"] == "Impact"
+
+    # The final payload matches the non-streaming endpoint
+    responses, _ = asyncio.run(_fire(app, "/ai/process", payload, 1))
+    assert by_name["result"] == responses[0].json()
+
+
+def test_stage_events_fire_before_pipeline_finishes(app):
+    """Test that structure results are published while coaching is still running."""
+    from models.ai_models import ProcessRequest
+
+    request = ProcessRequest(raw_transcript="I fixed checkout.", story_id="s1", user_id=MOCK_USER["uid"])
+    fired = {}
+
+    async def record(stage_name, result):
+        fired[stage_name] = time.perf_counter()
+
+    async def run():
+        start = time.perf_counter()
+        await ai_router._run_process_pipeline(request, on_stage_complete=record)
+        return start
+
+    start = asyncio.run(run())
+    assert fired["structure"] - start < STAGE_DELAY * 1.5
+    assert fired["coach"] - fired["structure"] >= STAGE_DELAY * 2
+
+
+def test_process_stream_reports_errors_as_events(app, monkeypatch):
+    """Test that a failure after the stream starts is delivered as an error event."""
+    class FailingChain:
+        async def ainvoke(self, inputs, config=None):
+            raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(ai_router, "get_structure_chain", lambda: FailingChain())
+    payload = {"raw_transcript": "I fixed checkout.", "story_id": "s1", "user_id": MOCK_USER["uid"]}
+    arrivals = asyncio.run(_stream(app, payload))
+
+    names = [event[0] for event, _ in arrivals]
+    assert names == ["transcript", "error"]
+    assert arrivals[-1][0][1]["status_code"] == 500
+
+
+class CountingChain(FakeChain):
+    def __init__(self, result):
+        super().__init__(result)
+        self.calls = 0
+
+    async def ainvoke(self, inputs, config=None):
+        self.calls += 1
+        return await super().ainvoke(inputs)
+
+
+def test_fused_mode_skips_tagging_call(app, monkeypatch):
+    """Test that fused structure+tag mode saves the sequential tagging round trip."""
+    from ai.schemas import PARStructureWithTags
+
+    fused = CountingChain(PARStructureWithTags(
+        **PAR, tags=[{"tag": "Ownership", "confidence": 0.8, "reasoning": "Led the fix."}]
+    ))
+    tagging = CountingChain(None)
+    monkeypatch.setattr(ai_router, "get_structure_and_tag_chain", lambda: fused)
+    monkeypatch.setattr(ai_router, "get_tagging_chain", lambda: tagging)
+
+    payload = {"raw_transcript": "I fixed checkout.", "story_id": "s1",
+               "user_id": MOCK_USER["uid"], "fused_structure_tag": True}
+    responses, elapsed = asyncio.run(_fire(app, "/ai/process", payload, 1))
+
+    body = responses[0].json()
+    assert responses[0].status_code == 200
+    assert body["title"] == PAR["title"]
+    assert body["tags"] == [{"tag": "Ownership", "confidence": 0.8, "reasoning": "Led the fix."}]
+    assert (fused.calls, tagging.calls) == (1, 0)
+    # fused -> agent is the critical path now
+    assert elapsed < STAGE_DELAY * 2.5
+
+
+def test_fused_mode_falls_back_to_separate_calls(app, monkeypatch):
+    """Test that a failed fused call falls back to structure then tag."""
+    class FailingChain:
+        async def ainvoke(self, inputs, config=None):
+            raise RuntimeError("schema mismatch")
+
+    monkeypatch.setattr(ai_router, "get_structure_and_tag_chain", lambda: FailingChain())
+    payload = {"raw_transcript": "I fixed checkout.", "story_id": "s1",
+               "user_id": MOCK_USER["uid"], "fused_structure_tag": True}
+    responses, _ = asyncio.run(_fire(app, "/ai/process", payload, 1))
+
+    body = responses[0].json()
+    assert responses[0].status_code == 200
+    assert body["tags"][0]["tag"] == "Impact"
+    assert body["warnings"] == []
+
+
+class InFlightChain(FakeChain):
+    """Tracks the peak number of overlapping calls."""
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def ainvoke(self, inputs, config=None):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().ainvoke(inputs)
+        finally:
+            self.in_flight -= 1
+
+
+def _batch_items(count, **overrides):
+    return [dict({"raw_transcript": f"Story {i}.", "story_id": f"s{i}", "user_id": MOCK_USER["uid"]}, **overrides)
+            for i in range(count)]
+
+
+def test_batch_bounds_concurrency_and_shares_profile(app, monkeypatch):
+    """Test that a batch never exceeds its concurrency and fetches the profile once."""
+    structure = InFlightChain(_Obj(warnings=[], **PAR))
+    profile_calls = []
+
+    def get_profile(user_id):
+        profile_calls.append(user_id)
+        time.sleep(STAGE_DELAY)
+        return {"first_name": "Test"}
+
+    monkeypatch.setattr(ai_router, "get_structure_chain", lambda: structure)
+    monkeypatch.setattr(ai_router, "get_user_profile", get_profile)
+
+    payload = {"items": _batch_items(4), "concurrency": 2}
+    responses, _ = asyncio.run(_fire(app, "/ai/process/batch", payload, 1))
+
+    body = responses[0].json()
+    assert responses[0].status_code == 200
+    assert [r["index"] for r in body["results"]] == [0, 1, 2, 3]
+    assert (body["succeeded"], body["failed"]) == (4, 0)
+    assert structure.peak == 2
+    assert profile_calls == [MOCK_USER["uid"]]
+
+
+def test_batch_reports_per_item_errors(app):
+    """Test that an invalid item fails on its own without failing the batch."""
+    items = _batch_items(2)
+    items[1]["raw_transcript"] = "   "
+    responses, _ = asyncio.run(_fire(app, "/ai/process/batch", {"items": items}, 1))
+
+    body = responses[0].json()
+    assert responses[0].status_code == 200
+    assert body["results"][0]["status"] == "succeeded"
+    assert body["results"][1]["status"] == "failed"
+    assert body["results"][1]["error"]["status_code"] == 400
+    assert (body["succeeded"], body["failed"]) == (1, 1)
+
+
+def test_batch_rejects_oversized_batches(app, monkeypatch):
+    """Test that batches above AI_BATCH_MAX_ITEMS are rejected up front."""
+    monkeypatch.setattr(ai_router, "BATCH_MAX_ITEMS", 2)
+    responses, _ = asyncio.run(_fire(app, "/ai/process/batch", {"items": _batch_items(3)}, 1))
+    assert responses[0].status_code == 400
+
+
+def test_batch_streams_ndjson(app):
+    """Test that ?stream=true returns one JSON line per finished item."""
+    payload = {"items": _batch_items(3)}
+    responses, _ = asyncio.run(_fire(app, "/ai/process/batch?stream=true", payload, 1))
+
+    assert responses[0].headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in responses[0].text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert all(line["result"]["title"] == PAR["title"] for line in lines)
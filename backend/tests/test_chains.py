@@ -0,0 +1,59 @@
+"""
+Unit tests for the process-wide chain registry in ai.chains.
+
+Building a chain only constructs Gemini clients locally, so these tests
+use a placeholder API key and never hit the network.
+"""
+import pytest
+
+from ai import chains
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch):
+    """Give every test an empty registry and a placeholder API key."""
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.delenv("GEMINI_FLASH_MODEL", raising=False)
+    monkeypatch.delenv("GEMINI_PRO_MODEL", raising=False)
+    chains.reload_chains()
+    yield
+    chains.reload_chains()
+
+
+class TestChainRegistry:
+    """Tests for chain and client reuse across requests."""
+
+    def test_chains_are_built_once(self):
+        """Test that repeated calls return the same chain object."""
+        assert chains.get_structure_chain() is chains.get_structure_chain()
+        assert chains.get_tagging_chain() is chains.get_tagging_chain()
+        assert chains.get_coaching_chain() is chains.get_coaching_chain()
+        assert chains.get_memory_summarization_chain() is chains.get_memory_summarization_chain()
+
+    def test_clients_shared_across_chains(self):
+        """Test that structuring and coaching share the Flash client at the same temperature."""
+        chains.get_structure_chain()
+        chains.get_coaching_chain()
+        # Flash@0.7 is shared, Pro@0.7 is the only extra client
+        assert len(chains._llm_registry) == 2
+        models = {key[0] for key in chains._llm_registry}
+        assert models == {chains.GEMINI_FLASH_MODEL, chains.GEMINI_PRO_MODEL}
+
+    def test_reload_picks_up_model_change(self, monkeypatch):
+        """Test that reload_chains re-reads the model env vars and rebuilds."""
+        before = chains.get_structure_chain()
+        monkeypatch.setenv("GEMINI_FLASH_MODEL", "gemini-test-flash")
+        chains.reload_chains()
+
+        after = chains.get_structure_chain()
+        assert after is not before
+        assert chains.GEMINI_FLASH_MODEL == "gemini-test-flash"
+        assert ("gemini-test-flash", 0.7, True) in chains._llm_registry
+
+    def test_missing_api_key_raises(self, monkeypatch):
+        """Test that a missing API key still surfaces as ValueError."""
+        monkeypatch.delenv("GOOGLE_API_KEY")
+        with pytest.raises(ValueError):
+            chains.get_tagging_chain()
+        with pytest.raises(ValueError):
+            chains.get_coaching_chain()
@@ -0,0 +1,135 @@
+"""
+Tests for request deadlines (ai.deadline) and how coaching honours them.
+
+The agent and coaching chains are replaced with fakes that sleep, and the
+budget thresholds are shrunk so each test runs in well under a second.
+"""
+import asyncio
+import json
+import logging
+import time
+
+import pytest
+
+from ai import deadline
+from ai.deadline import Deadline, DeadlineExceeded, activate_deadline, deadline_scope, within_budget
+from ai.tools import create_user_tools
+from routers import ai_router
+
+COACHING = {
+    "strength": {"overview": "Clear ownership.", "detail": "You led the redesign."},
+    "gap": {"overview": "Thin context.", "detail": "Explain the stakes."},
+    "suggestion": {"overview": "Add scale.", "detail": "Mention user counts."},
+}
+
+
+class _Result:
+    def model_dump(self):
+        return dict(COACHING)
+
+
+class SleepyChain:
+    def __init__(self, delay, result):
+        self.delay = delay
+        self.result = result
+        self.calls = 0
+
+    async def ainvoke(self, inputs, config=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+@pytest.fixture
+def small_budgets(monkeypatch):
+    """Scale the budget thresholds down to fractions of a second."""
+    monkeypatch.setattr(ai_router, "AI_COACH_FALLBACK_RESERVE_SECONDS", 0.2)
+    monkeypatch.setattr(ai_router, "AI_AGENT_MIN_SECONDS", 0.1)
+    monkeypatch.setattr(ai_router, "AI_PRO_MIN_SECONDS", 0.25)
+    monkeypatch.setattr(deadline, "AI_COACH_FALLBACK_RESERVE_SECONDS", 0.2)
+    monkeypatch.setattr(deadline, "AI_TOOL_MIN_SECONDS", 0.1)
+
+
+def _coach(monkeypatch, budget, agent, pro_chain, fast_chain):
+    agent_modes = []
+
+    def get_agent(fast=False):
+        agent_modes.append(fast)
+        return agent
+
+    monkeypatch.setattr(ai_router, "get_coaching_agent", get_agent)
+    monkeypatch.setattr(ai_router, "get_coaching_chain", lambda: pro_chain)
+    monkeypatch.setattr(ai_router, "get_fast_coaching_chain", lambda: fast_chain)
+
+    async def run():
+        with deadline_scope(budget):
+            start = time.perf_counter()
+            coaching, from_agent = await ai_router._coach_within_budget("u1", {}, {}, "test")
+            agent_modes.append("agent" if from_agent else "chain")
+            return coaching, time.perf_counter() - start
+
+    coaching, elapsed = asyncio.run(run())
+    return coaching, elapsed, agent_modes
+
+
+class TestDeadline:
+    """Tests for the Deadline context variable helpers."""
+
+    def test_within_budget_cancels_slow_calls(self):
+        """Test that a call running past the deadline raises DeadlineExceeded."""
+        async def run():
+            with deadline_scope(0.05):
+                await within_budget(asyncio.sleep(1))
+
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(run())
+
+    def test_nested_scope_never_extends_budget(self):
+        """Test that an inner scope keeps the tighter outer deadline."""
+        with deadline_scope(1) as outer:
+            with activate_deadline(Deadline(60)) as inner:
+                assert inner is outer
+        assert deadline.current_deadline() is None
+
+    def test_tools_stop_when_budget_low(self, small_budgets, caplog):
+        """Test that tools return the budget message instead of running near the deadline."""
+        tool = next(t for t in create_user_tools("u1") if t.name == "analyze_structure")
+        args = {"problem": "p", "action": "a", "result": "r"}
+
+        with deadline_scope(10):
+            assert "Story Structure Analysis" in tool.invoke(args)
+        with deadline_scope(0.25), caplog.at_level(logging.INFO, logger="ai.tools"):
+            assert tool.invoke(args) == deadline.BUDGET_EXHAUSTED_TOOL_MESSAGE
+        assert [r.tool for r in caplog.records if r.name == "ai.tools"] == ["analyze_structure"]
+
+
+class TestCoachingBudget:
+    """Tests for agent → chain fallback under a request deadline."""
+
+    def test_agent_used_when_budget_allows(self, monkeypatch, small_budgets):
+        """Test that a fast agent answer is returned with the Pro agent."""
+        agent = SleepyChain(0.01, {"output": json.dumps(COACHING)})
+        coaching, _, modes = _coach(monkeypatch, 5, agent, SleepyChain(0, _Result()), SleepyChain(0, _Result()))
+        assert coaching == COACHING
+        assert modes == [False, "agent"]
+
+    def test_slow_agent_is_cut_off_for_fallback(self, monkeypatch, small_budgets):
+        """Test that a looping agent is cancelled in time for the fallback chain."""
+        agent = SleepyChain(10, {"output": json.dumps(COACHING)})
+        pro, fast = SleepyChain(0, _Result()), SleepyChain(0, _Result())
+        coaching, elapsed, modes = _coach(monkeypatch, 0.6, agent, pro, fast)
+
+        assert coaching == COACHING
+        assert modes[-1] == "chain"
+        assert elapsed < 0.6
+        # Only the reserve is left, which is below AI_PRO_MIN_SECONDS
+        assert (pro.calls, fast.calls) == (0, 1)
+
+    def test_low_budget_skips_agent(self, monkeypatch, small_budgets):
+        """Test that the agent isn't started when its share of the budget is too small."""
+        agent = SleepyChain(0, {"output": json.dumps(COACHING)})
+        fast = SleepyChain(0, _Result())
+        _, _, modes = _coach(monkeypatch, 0.25, agent, SleepyChain(0, _Result()), fast)
+
+        assert modes == ["chain"]
+        assert fast.calls == 1
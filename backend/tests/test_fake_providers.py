@@ -0,0 +1,156 @@
+"""
+Tests for the offline Gemini / Speech-to-Text / Tavily stand-ins (ai.fake_providers).
+
+Latency is set to zero; the /ai/process test runs the real chains, agent and
+pipeline against the fake LLM, with only Firestore/Storage calls stubbed.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from google.api_core.exceptions import ResourceExhausted
+from pydantic import BaseModel
+
+from ai import chains, fake_providers, llm_cache, rate_limit
+from ai.fake_providers import FakeTavilySearch, FaultModel, LatencyModel, fake_output, fake_transcribe
+from ai.run_context import user_scope
+from ai.schemas import CoachingResult, PARStructure, PARStructureWithTags, TagResponse
+from dependencies.auth_dependencies import get_current_user
+from routers import ai_router
+
+TRANSCRIPT = (
+    "Our checkout page was losing forty percent of carts. I interviewed users, rebuilt the "
+    "payment step and ran an A/B test. Abandonment dropped to twenty two percent in a month."
+)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    monkeypatch.setattr(fake_providers, "LLM_PROVIDER", fake_providers.PROVIDER_FAKE)
+    monkeypatch.setattr(fake_providers, "AI_FAKE_FLASH_LATENCY", "fixed:0")
+    monkeypatch.setattr(fake_providers, "AI_FAKE_PRO_LATENCY", "fixed:0")
+    monkeypatch.setattr(fake_providers, "AI_FAKE_LLM_ERRORS", "")
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    chains.reload_chains()
+    yield
+    chains.reload_chains()
+
+
+class TestDistributions:
+    """Tests for latency and fault specs."""
+
+    def test_latency_specs(self):
+        """Test that each distribution parses and samples non-negative values."""
+        assert LatencyModel("fixed:0.25").sample() == 0.25
+        for spec in ("uniform:0.1,0.2", "normal:1,0.5", "lognormal:1,0.4", "exponential:0.5"):
+            samples = [LatencyModel(spec).sample() for _ in range(200)]
+            assert all(s >= 0 for s in samples)
+        assert all(0.1 <= LatencyModel("uniform:0.1,0.2").sample() <= 0.2 for _ in range(100))
+
+    def test_invalid_specs_raise(self):
+        """Test that malformed latency and fault specs are rejected at startup."""
+        for spec in ("gamma:1,2", "uniform:1", "fixed"):
+            with pytest.raises(ValueError):
+                LatencyModel(spec)
+        with pytest.raises(ValueError):
+            FaultModel("0.1:explode")
+
+    def test_fault_rates_are_reproducible(self):
+        """Test that fault draws follow the configured mix and repeat after reseeding."""
+        model = FaultModel("0.2:rate_limit,0.1:error")
+        fake_providers.reseed(7)
+        first = [model.sample() for _ in range(2000)]
+        fake_providers.reseed(7)
+        assert [model.sample() for _ in range(2000)] == first
+        assert 0.15 < first.count("rate_limit") / 2000 < 0.25
+        assert 0.06 < first.count("error") / 2000 < 0.14
+        assert isinstance(FaultModel.exception("rate_limit", "llm"), ResourceExhausted)
+
+
+class TestFakeOutputs:
+    """Tests for deterministic, schema-valid outputs."""
+
+    @pytest.mark.parametrize("schema", [PARStructure, PARStructureWithTags, TagResponse, CoachingResult])
+    def test_outputs_are_valid_and_deterministic(self, schema):
+        """Test that the same input always yields the same valid instance."""
+        first = fake_output(schema, TRANSCRIPT)
+        assert isinstance(first, schema)
+        assert fake_output(schema, TRANSCRIPT) == first
+
+    def test_unsupported_schema_is_named(self):
+        """Test that a schema without a fake output fails with a TypeError naming it."""
+        class Unsupported(BaseModel):
+            answer: str
+
+        with pytest.raises(TypeError, match="Unsupported"):
+            fake_output(Unsupported, TRANSCRIPT)
+
+    def test_chains_use_fake_model(self, fake_llm):
+        """Test that the real structure and fused chains run end to end on the fake model."""
+        structure = asyncio.run(chains.get_structure_chain().ainvoke({"raw_transcript": TRANSCRIPT}))
+        assert isinstance(structure, PARStructure)
+        assert "Our checkout page" in structure.problem
+        fused = chains.get_structure_and_tag_chain().invoke({"raw_transcript": TRANSCRIPT})
+        assert 1 <= len(fused.tags) <= 3
+
+    def test_injected_rate_limits_surface(self, fake_llm, monkeypatch):
+        """Test that configured 429s are raised by the fake model."""
+        monkeypatch.setattr(fake_providers, "AI_FAKE_LLM_ERRORS", "1:rate_limit")
+        monkeypatch.setattr(rate_limit, "AI_RATE_LIMIT_MAX_RETRIES", 0)
+        chains.reload_chains()
+        with pytest.raises(ResourceExhausted):
+            asyncio.run(chains.get_tagging_chain().ainvoke({"problem": "p", "action": "a", "result": "r"}))
+
+    def test_agent_returns_coaching_json(self, fake_llm):
+        """Test that the shared coaching agent produces parseable coaching JSON."""
+        inputs = {"first_name": "Test", "problem": "p", "action": "a", "result": "r",
+                  "tags": "Impact", "user_profile": "", "pre_analysis": ""}
+        with user_scope("user"):
+            output = asyncio.run(chains.get_coaching_agent().ainvoke(inputs))["output"]
+        coaching = json.loads(output)
+        CoachingResult.model_validate({k: v for k, v in coaching.items() if k != "_reasoning"})
+
+
+class TestSpeechAndSearch:
+    """Tests for the Speech-to-Text and Tavily stand-ins."""
+
+    def test_transcript_is_chosen_by_audio_content(self, tmp_path, monkeypatch):
+        """Test that the same audio always yields the same sample transcript."""
+        monkeypatch.setattr(fake_providers, "AI_FAKE_SPEECH_LATENCY", "fixed:0")
+        audio = tmp_path / "a.webm"
+        audio.write_bytes(b"fake audio")
+        transcript = fake_transcribe(str(audio))
+        assert transcript and fake_transcribe(str(audio)) == transcript
+
+    def test_search_results_match_tavily_shape(self, monkeypatch):
+        """Test that fake search results are the dicts _format_tavily_results expects."""
+        monkeypatch.setattr(fake_providers, "AI_FAKE_SEARCH_LATENCY", "fixed:0")
+        results = FakeTavilySearch().invoke("Stripe interview process")
+        assert len(results) == 3
+        assert {"title", "content", "url"} <= set(results[0])
+        assert FakeTavilySearch().invoke("Stripe interview process") == results
+
+
+def test_process_runs_offline(fake_llm, monkeypatch):
+    """Test that /ai/process completes against the fake LLM with no API keys."""
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(ai_router, "get_user_profile", lambda user_id: {"first_name": "Test"})
+    app = FastAPI()
+    app.include_router(ai_router.router)
+    app.dependency_overrides[get_current_user] = lambda: {"uid": "user_1"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/ai/process", json={"user_id": "user_1", "story_id": "s1", "raw_transcript": TRANSCRIPT}
+            )
+
+    response = asyncio.run(run())
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["tags"]
+    assert body["coaching"]["strength"]["overview"].startswith("Fake strength insight")
+    assert body["warnings"] == []
@@ -0,0 +1,199 @@
+"""
+Tests for latency-hedged Pro/Flash execution (ai.hedging).
+
+Models are stood in for by async RunnableLambdas that sleep, and the hedge
+delay is shrunk to fractions of a second.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from ai import hedging
+from ai.hedging import FallbackRunnable, HedgedRunnable, LatencyHistogram, track_models
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(hedging, "_histograms", {})
+    monkeypatch.setattr(hedging, "_wins", {})
+    monkeypatch.setattr(hedging, "AI_HEDGE_DEFAULT_DELAY_SECONDS", 0.1)
+    monkeypatch.setattr(hedging, "AI_HEDGE_MIN_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(hedging, "AI_HEDGE_MAX_DELAY_SECONDS", 1)
+    monkeypatch.setattr(hedging, "AI_HEDGE_MIN_SAMPLES", 5)
+
+
+class FakeModel:
+    """Async model stand-in: sleeps `delay` then returns `answer` (or raises `error`)."""
+
+    def __init__(self, answer, delay=0.0, error=None):
+        self.answer = answer
+        self.delay = delay
+        self.error = error
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self, _input):
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return self.answer
+
+    def runnable(self):
+        return RunnableLambda(self)
+
+
+def _run(pro, flash):
+    hedged = HedgedRunnable(pro.runnable(), flash.runnable(), "pro", "flash")
+
+    async def run():
+        with track_models() as models:
+            start = time.perf_counter()
+            result = await hedged.ainvoke("prompt")
+            return result, models, time.perf_counter() - start
+
+    return asyncio.run(run())
+
+
+class TestHedgedRunnable:
+    """Tests for first-valid-result-wins hedging."""
+
+    def test_fast_primary_never_hedges(self):
+        """Test that Flash isn't called when Pro answers within the hedge delay."""
+        pro, flash = FakeModel("pro"), FakeModel("flash")
+        result, models, _ = _run(pro, flash)
+        assert result == "pro"
+        assert models == ["pro"]
+        assert flash.started == 0
+
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        """Test that a slow Pro call is raced by Flash, which wins and cancels Pro."""
+        pro, flash = FakeModel("pro", delay=5), FakeModel("flash", delay=0.05)
+        result, models, elapsed = _run(pro, flash)
+        assert result == "flash"
+        assert models == ["flash"]
+        assert pro.cancelled == 1
+        assert elapsed < 0.5
+
+    def test_primary_can_still_win_after_hedge(self):
+        """Test that Pro wins the race if it finishes before the hedge call."""
+        pro, flash = FakeModel("pro", delay=0.15), FakeModel("flash", delay=2)
+        result, models, _ = _run(pro, flash)
+        assert result == "pro"
+        assert flash.cancelled == 1
+
+    def test_invalid_result_waits_for_the_other(self):
+        """Test that a failed (e.g. unparseable) hedge result doesn't win."""
+        pro = FakeModel("pro", delay=0.2)
+        flash = FakeModel(None, delay=0.01, error=ValueError("schema mismatch"))
+        result, models, _ = _run(pro, flash)
+        assert result == "pro"
+        assert models == ["pro"]
+
+    def test_primary_error_falls_back_immediately(self):
+        """Test that a Pro error starts Flash without waiting for the hedge delay."""
+        pro, flash = FakeModel(None, error=RuntimeError("quota")), FakeModel("flash")
+        result, models, elapsed = _run(pro, flash)
+        assert result == "flash"
+        assert elapsed < 0.1
+
+    def test_both_failing_raises(self):
+        """Test that the error surfaces when neither model returns a valid result."""
+        pro = FakeModel(None, error=RuntimeError("pro down"))
+        flash = FakeModel(None, error=RuntimeError("flash down"))
+        with pytest.raises(RuntimeError, match="flash down"):
+            _run(pro, flash)
+
+    def test_sync_invoke_uses_failure_fallback(self):
+        """Test that sync invoke keeps plain failure-only fallback."""
+        hedged = HedgedRunnable(
+            RunnableLambda(lambda _: (_ for _ in ()).throw(RuntimeError("pro down"))),
+            RunnableLambda(lambda _: "flash"), "pro", "flash"
+        )
+        assert hedged.invoke("prompt") == "flash"
+
+
+class TestFallbackRunnable:
+    """Tests for failure-only fallback when hedging is off (AI_LLM_HEDGING=false)."""
+
+    def _run(self, pro, flash):
+        fallback = hedging.hedged_or_fallback(pro.runnable(), flash.runnable(), "pro", "flash")
+
+        async def run():
+            with track_models() as models:
+                return await fallback.ainvoke("prompt"), models
+
+        return asyncio.run(run())
+
+    def test_models_are_recorded_without_hedging(self, monkeypatch):
+        """Test that the answering model is reported and a slow Pro is never hedged."""
+        monkeypatch.setattr(hedging, "AI_LLM_HEDGING", False)
+        pro, flash = FakeModel("pro", delay=0.2), FakeModel("flash")
+        assert self._run(pro, flash) == ("pro", ["pro"])
+        assert flash.started == 0
+
+        assert self._run(FakeModel(None, error=RuntimeError("quota")), flash) == ("flash", ["flash"])
+        assert hedging.get_model_wins() == {"pro": 1, "flash": 1}
+
+    def test_binding_keeps_fallback_behaviour(self):
+        """Test that with_structured_output on the fallback doesn't turn it into a hedge."""
+        class Model:
+            def with_structured_output(self, schema):
+                return RunnableLambda(lambda _: schema)
+
+        bound = FallbackRunnable(Model(), Model(), "pro", "flash").with_structured_output("Schema")
+        assert type(bound) is FallbackRunnable
+        assert bound.invoke("prompt") == "Schema"
+
+    def test_wins_are_counted_across_threads(self):
+        """Test that concurrent sync calls don't lose win counts."""
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda _: hedging.record_model("pro"), range(2000)))
+        assert hedging.get_model_wins() == {"pro": 2000}
+
+
+class TestLatencyHistograms:
+    """Tests for per-model latency tracking and the percentile-based delay."""
+
+    def test_delay_uses_default_until_enough_samples(self):
+        """Test that the default delay applies before AI_HEDGE_MIN_SAMPLES calls."""
+        for _ in range(4):
+            hedging.get_latency_histogram("pro").record(0.5)
+        assert hedging.hedge_delay("pro") == 0.1
+
+    def test_delay_tracks_percentile_and_is_clamped(self, monkeypatch):
+        """Test that the delay follows the configured percentile within its bounds."""
+        monkeypatch.setattr(hedging, "AI_HEDGE_PERCENTILE", 90)
+        histogram = hedging.get_latency_histogram("pro")
+        for seconds in [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 5.0]:
+            histogram.record(seconds)
+        assert hedging.hedge_delay("pro") == pytest.approx(0.9)
+
+        for _ in range(100):
+            histogram.record(10)
+        assert hedging.hedge_delay("pro") == 1  # AI_HEDGE_MAX_DELAY_SECONDS
+
+    def test_snapshot_buckets_are_cumulative(self):
+        """Test that histogram buckets follow Prometheus `le` semantics."""
+        histogram = LatencyHistogram(buckets=(1, 5))
+        for seconds in (0.5, 1.0, 3, 10):
+            histogram.record(seconds)
+        snapshot = histogram.snapshot()
+        assert snapshot["buckets"] == [(1, 2), (5, 3), ("+Inf", 4)]
+        assert snapshot["count"] == 4
+        assert snapshot["sum"] == pytest.approx(14.5)
+
+    def test_hedged_calls_are_recorded_per_model(self):
+        """Test that both models' latencies (including cancelled calls) are recorded."""
+        _run(FakeModel("pro", delay=5), FakeModel("flash", delay=0.05))
+        histograms = hedging.get_latency_histograms()
+        assert histograms["pro"]["count"] == 1
+        assert histograms["flash"]["count"] == 1
+        assert hedging.get_model_wins() == {"flash": 1}
@@ -0,0 +1,207 @@
+"""
+Unit tests for the durable background job queue (ai.jobs) and the
+/ai/process/jobs endpoints, using a temporary SQLite store.
+"""
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from ai.jobs import (
+    FirestoreJobStore, JobQueue, SQLiteJobStore,
+    JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+async def _wait_for(queue, job_id, timeout=3.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        job = await queue.get(job_id)
+        if job["status"] in (JOB_SUCCEEDED, JOB_FAILED):
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+class TestSQLiteJobStore:
+    """Tests for persistence and atomic claiming."""
+
+    def test_claim_marks_oldest_job_running(self, store):
+        """Test that claim_next returns queued jobs oldest first, once each."""
+        store.create("a", "user", {"n": 1})
+        store.create("b", "user", {"n": 2})
+
+        first = store.claim_next()
+        second = store.claim_next()
+        assert (first["job_id"], second["job_id"]) == ("a", "b")
+        assert store.get("a")["status"] == JOB_RUNNING
+        assert store.claim_next() is None
+
+    def test_jobs_survive_reopen(self, store):
+        """Test that a new store on the same file sees existing jobs."""
+        store.create("a", "user", {"n": 1})
+        reopened = SQLiteJobStore(store.path)
+        assert reopened.get("a")["payload"] == {"n": 1}
+
+    def test_requeue_stale_running_jobs(self, store):
+        """Test that jobs orphaned in running are returned to the queue."""
+        store.create("a", "user", {})
+        store.claim_next()
+        assert store.requeue_stale(lease_seconds=3600) == 0
+        assert store.requeue_stale(lease_seconds=-1) == 1
+        assert store.get("a")["status"] == JOB_QUEUED
+
+
+class TestFirestoreJobStore:
+    """Tests for the production store's queries (Firestore mocked)."""
+
+    def test_claim_orders_by_creation_time(self):
+        """Test that claim_next asks Firestore for the oldest queued job, like SQLite."""
+        store = FirestoreJobStore.__new__(FirestoreJobStore)
+        store._firestore = MagicMock(transactional=lambda fn: fn)
+        store.db = MagicMock()
+        store.collection = MagicMock()
+        query = store.collection.where.return_value
+        query.order_by.return_value.limit.return_value.stream.return_value = []
+
+        assert store.claim_next() is None
+        query.order_by.assert_called_once_with("created_at")
+        query.order_by.return_value.limit.assert_called_once_with(1)
+
+
+class TestJobQueue:
+    """Tests for the worker pool."""
+
+    def test_runs_jobs_with_bounded_concurrency(self, store):
+        """Test that at most `concurrency` jobs execute at once and all complete."""
+        active = 0
+        peak = 0
+
+        async def runner(payload):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.05)
+            active -= 1
+            return {"echo": payload["n"]}
+
+        async def run():
+            queue = JobQueue(runner, store=store, concurrency=2, poll_interval=0.05)
+            job_ids = [await queue.submit("user", {"n": i}) for i in range(6)]
+            jobs = [await _wait_for(queue, job_id) for job_id in job_ids]
+            await queue.stop()
+            return jobs
+
+        jobs = asyncio.run(run())
+        assert [job["result"] for job in jobs] == [{"echo": i} for i in range(6)]
+        assert peak == 2
+
+    def test_failed_job_records_error(self, store):
+        """Test that runner exceptions are stored with status code and detail."""
+        async def runner(payload):
+            raise HTTPException(status_code=400, detail="Transcript was empty")
+
+        async def run():
+            queue = JobQueue(runner, store=store, poll_interval=0.05)
+            job_id = await queue.submit("user", {})
+            job = await _wait_for(queue, job_id)
+            await queue.stop()
+            return job
+
+        job = asyncio.run(run())
+        assert job["status"] == JOB_FAILED
+        assert job["error"] == {"status_code": 400, "detail": "Transcript was empty"}
+
+    def test_resumes_jobs_after_restart(self, store):
+        """Test that queued and orphaned running jobs are picked up by a new worker."""
+        store.create("queued-job", "user", {"n": 1})
+        store.create("orphaned-job", "user", {"n": 2})
+        store.claim_next()  # Simulate a worker that died mid-job
+
+        async def runner(payload):
+            return {"n": payload["n"]}
+
+        async def run():
+            queue = JobQueue(runner, store=store, poll_interval=0.05, lease_seconds=-1)
+            await queue.start()
+            jobs = [await _wait_for(queue, job_id) for job_id in ("queued-job", "orphaned-job")]
+            await queue.stop()
+            return jobs
+
+        jobs = asyncio.run(run())
+        assert all(job["status"] == JOB_SUCCEEDED for job in jobs)
+
+    def test_requeues_jobs_orphaned_while_running(self, store):
+        """Test that a job orphaned after start() is re-queued by the periodic sweep."""
+        async def runner(payload):
+            return {"n": payload["n"]}
+
+        async def run():
+            queue = JobQueue(runner, store=store, poll_interval=0.05, lease_seconds=0.1, sweep_interval=0.05)
+            await queue.start()
+            store.create("orphaned-job", "user", {"n": 1})
+            store.claim_next()  # Simulate a worker in another process that died mid-job
+            job = await _wait_for(queue, "orphaned-job")
+            await queue.stop()
+            return job
+
+        assert asyncio.run(run())["status"] == JOB_SUCCEEDED
+
+
+class TestProcessJobEndpoints:
+    """Tests for POST/GET /ai/process/jobs."""
+
+    def test_submit_and_poll(self, store, monkeypatch):
+        """Test that a submitted job returns immediately and its result can be polled."""
+        from fastapi import FastAPI
+        from routers import ai_router
+        from dependencies.auth_dependencies import get_current_user
+
+        async def fake_pipeline(request, on_stage_complete=None):
+            await asyncio.sleep(0.05)
+            return ai_router.ProcessResponse(
+                title="T", raw_transcript=request.raw_transcript, problem="P", action="A",
+                result="R", tags=[], confidence_score=0.9, warnings=[],
+                coaching={k: {"overview": "o", "detail": "d"} for k in ("strength", "gap", "suggestion")},
+            )
+
+        monkeypatch.setattr(ai_router, "_run_process_pipeline", fake_pipeline)
+
+        app = FastAPI()
+        app.include_router(ai_router.router)
+        user = {"uid": "test_user_123"}
+        app.dependency_overrides[get_current_user] = lambda: user
+
+        async def run():
+            monkeypatch.setattr(ai_router, "process_jobs",
+                                JobQueue(ai_router._run_process_job, store=store, poll_interval=0.05))
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                submitted = await client.post("/ai/process/jobs", json={
+                    "raw_transcript": "I fixed checkout.", "story_id": "s1", "user_id": "test_user_123"
+                })
+                job_id = submitted.json()["job_id"]
+                await _wait_for(ai_router.process_jobs, job_id)
+                finished = await client.get(f"/ai/process/jobs/{job_id}")
+
+                user["uid"] = "other_user"
+                forbidden = await client.get(f"/ai/process/jobs/{job_id}")
+                missing = await client.get("/ai/process/jobs/does-not-exist")
+            await ai_router.process_jobs.stop()
+            return submitted, finished, forbidden, missing
+
+        submitted, finished, forbidden, missing = asyncio.run(run())
+        assert submitted.status_code == 202
+        assert submitted.json()["status"] == "queued"
+        assert finished.json()["status"] == "succeeded"
+        assert finished.json()["result"]["raw_transcript"] == "I fixed checkout."
+        assert forbidden.status_code == 403
+        assert missing.status_code == 404
@@ -0,0 +1,266 @@
+"""
+Tests for the persistent LLM output cache (ai.sqlite_cache and ai.llm_cache).
+
+Uses a temporary SQLite file per test and a fake structuring chain, so no
+Gemini calls are made.
+"""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from ai import chains, hedging, llm_cache
+from ai.schemas import PARStructure
+from ai.sqlite_cache import SQLiteCache
+from routers import ai_router
+from dependencies.auth_dependencies import get_current_user
+from metrics import render_metrics
+from models.ai_models import CoachResponse
+
+MOCK_USER = {"uid": "test_user_123", "email": "test@example.com"}
+
+PAR = PARStructure(
+    title="Checkout Redesign",
+    problem="Cart abandonment was 40%.",
+    action="I redesigned the checkout flow.",
+    result="Abandonment dropped to 22%.",
+    confidence_score=0.9,
+    warnings=[],
+)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Point the LLM cache at a fresh SQLite file with empty counters."""
+    sqlite_cache = SQLiteCache(str(tmp_path / "llm_cache.sqlite3"), max_bytes=1024 * 1024)
+    monkeypatch.setattr(llm_cache, "_cache", sqlite_cache)
+    llm_cache.LLM_CACHE_EVENTS.clear()
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    return sqlite_cache
+
+
+class TestSQLiteCache:
+    """Tests for TTL expiry and size-capped LRU eviction."""
+
+    def test_get_returns_stored_value(self, tmp_path):
+        """Test that a stored value is returned until it expires."""
+        store = SQLiteCache(str(tmp_path / "c.sqlite3"), max_bytes=1024)
+        store.set("k", "v", ttl=60)
+        assert store.get("k") == "v"
+        assert store.get("missing") is None
+
+    def test_expired_entries_are_dropped(self, tmp_path):
+        """Test that entries past their TTL are treated as missing."""
+        store = SQLiteCache(str(tmp_path / "c.sqlite3"), max_bytes=1024)
+        store.set("k", "v", ttl=0)
+        time.sleep(0.01)
+        assert store.get("k") is None
+        assert store.stats()["entries"] == 0
+
+    def test_lru_eviction_over_size_cap(self, tmp_path):
+        """Test that the least recently used entries are evicted first."""
+        store = SQLiteCache(str(tmp_path / "c.sqlite3"), max_bytes=250)
+        store.set("a", "x" * 100, ttl=60)
+        time.sleep(0.01)
+        store.set("b", "x" * 100, ttl=60)
+        time.sleep(0.01)
+        store.get("a")  # "a" is now more recent than "b"
+        time.sleep(0.01)
+        store.set("c", "x" * 100, ttl=60)
+
+        assert store.get("b") is None
+        assert store.get("a") is not None
+        assert store.get("c") is not None
+        assert store.stats()["evictions"] == 1
+
+
+class TestCacheKey:
+    """Tests for content-addressed cache keys."""
+
+    def test_whitespace_is_normalized(self):
+        """Test that inputs differing only in whitespace share a key."""
+        a = llm_cache.build_cache_key("structure", {"raw_transcript": "I fixed  checkout.\n"})
+        b = llm_cache.build_cache_key("structure", {"raw_transcript": " I fixed checkout."})
+        assert a == b
+
+    def test_scope_and_chain_partition_keys(self):
+        """Test that different chains and scopes never share entries."""
+        inputs = {"problem": "p", "action": "a", "result": "r"}
+        assert llm_cache.build_cache_key("tagging", inputs) != llm_cache.build_cache_key("coaching", inputs)
+        assert (llm_cache.build_cache_key("coaching_agent", inputs, scope="u1")
+                != llm_cache.build_cache_key("coaching_agent", inputs, scope="u2"))
+
+    def test_model_change_changes_key(self, monkeypatch):
+        """Test that switching models invalidates cached outputs."""
+        inputs = {"raw_transcript": "I fixed checkout."}
+        before = llm_cache.build_cache_key("structure", inputs)
+        monkeypatch.setattr(chains, "GEMINI_FLASH_MODEL", "gemini-test-flash")
+        assert llm_cache.build_cache_key("structure", inputs) != before
+
+    def test_prompt_version_is_stable(self):
+        """Test that the prompt version is a deterministic hash of the template."""
+        identity = chains.get_chain_identity("structure")
+        assert identity["prompt_version"] == chains.get_chain_identity("structure")["prompt_version"]
+        assert identity["prompt_version"] != chains.get_chain_identity("tagging")["prompt_version"]
+
+
+class CountingChain:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, inputs, config=None):
+        self.calls += 1
+        return PAR
+
+
+class TestStructureEndpointCache:
+    """Tests for cache hits, misses and bypass through /ai/structure."""
+
+    def _post(self, app, transcript, headers=None):
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post("/ai/structure", json={"raw_transcript": transcript}, headers=headers)
+        return asyncio.run(run())
+
+    @pytest.fixture
+    def app(self, cache, monkeypatch):
+        chain = CountingChain()
+        monkeypatch.setattr(ai_router, "get_structure_chain", lambda: chain)
+        test_app = FastAPI()
+        test_app.include_router(ai_router.router)
+        test_app.dependency_overrides[get_current_user] = lambda: MOCK_USER
+        test_app.state.chain = chain
+        return test_app
+
+    def test_repeat_request_hits_cache(self, app):
+        """Test that an identical transcript is served from the cache."""
+        first = self._post(app, "I fixed checkout.")
+        second = self._post(app, "I fixed   checkout.")
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json() == first.json()
+        assert app.state.chain.calls == 1
+        assert llm_cache.LLM_CACHE_EVENTS.value(("structure", "hit")) == 1
+        assert 'parfolio_llm_cache_events_total{chain="structure",event="miss"} 1' in render_metrics()
+
+    def test_bypass_header_forces_fresh_call(self, app):
+        """Test that X-Cache-Bypass skips the lookup but still refreshes the entry."""
+        self._post(app, "I fixed checkout.")
+        bypassed = self._post(app, "I fixed checkout.", headers={"X-Cache-Bypass": "1"})
+
+        assert bypassed.headers["X-Cache"] == "BYPASS"
+        assert app.state.chain.calls == 2
+
+    def test_cache_failure_falls_through(self, app, monkeypatch):
+        """Test that a broken cache never fails the request."""
+        def broken_get(key):
+            raise RuntimeError("disk full")
+        monkeypatch.setattr(llm_cache._cache, "get", broken_get)
+
+        response = self._post(app, "I fixed checkout.")
+        assert response.status_code == 200
+        assert llm_cache.LLM_CACHE_EVENTS.value(("structure", "error")) == 1
+
+
+COACHING = {
+    "strength": {"overview": "Clear ownership.", "detail": "You led the redesign."},
+    "gap": {"overview": "Thin context.", "detail": "Explain the stakes."},
+    "suggestion": {"overview": "Add scale.", "detail": "Mention user counts."},
+}
+
+
+class CoachingAgent:
+    """Agent stand-in that reports the model that answered, like the hedged LLM does."""
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def ainvoke(self, inputs, config=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("agent unavailable")
+        hedging.record_model("gemini-pro-test")
+        return {"output": json.dumps(COACHING)}
+
+
+class FallbackChain:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, inputs, config=None):
+        self.calls += 1
+        return CoachResponse.model_validate(COACHING)
+
+
+class TestCoachEndpointCache:
+    """Tests for caching /ai/coach insights with the model that produced them."""
+
+    PAYLOAD = {"first_name": "Test", "problem": "Cart abandonment was 40%.",
+               "action": "I redesigned the checkout flow.", "result": "Abandonment dropped to 22%."}
+
+    def _post(self, app):
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post("/ai/coach", json=self.PAYLOAD)
+        return asyncio.run(run())
+
+    def _app(self, monkeypatch, agent, chain, versions=None):
+        versions = versions if versions is not None else ["1"]
+        monkeypatch.setattr(ai_router, "_portfolio_version", lambda user_id: versions[-1])
+        monkeypatch.setattr(ai_router, "get_coaching_agent", lambda fast=False: agent)
+        monkeypatch.setattr(ai_router, "get_coaching_chain", lambda: chain)
+        monkeypatch.setattr(ai_router, "get_fast_coaching_chain", lambda: chain)
+        test_app = FastAPI()
+        test_app.include_router(ai_router.router)
+        test_app.dependency_overrides[get_current_user] = lambda: MOCK_USER
+        return test_app
+
+    def test_hit_keeps_model_header(self, cache, monkeypatch):
+        """Test that a cached agent answer is served with its X-Coaching-Model header."""
+        agent = CoachingAgent()
+        app = self._app(monkeypatch, agent, FallbackChain())
+        first, second = self._post(app), self._post(app)
+
+        assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+        assert first.headers["X-Coaching-Model"] == second.headers["X-Coaching-Model"] == "gemini-pro-test"
+        assert second.json() == first.json() == COACHING
+        assert agent.calls == 1
+
+    def test_fallback_result_is_not_cached(self, cache, monkeypatch):
+        """Test that fallback-chain insights are returned but the next request retries the agent."""
+        agent, chain = CoachingAgent(fail=True), FallbackChain()
+        app = self._app(monkeypatch, agent, chain)
+        first, second = self._post(app), self._post(app)
+
+        assert first.status_code == second.status_code == 200
+        assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "MISS")
+        assert (agent.calls, chain.calls) == (2, 2)
+
+    def test_story_write_invalidates(self, cache, monkeypatch):
+        """Test that a new portfolio version (any story write) misses the cached insights."""
+        agent, versions = CoachingAgent(), ["1"]
+        app = self._app(monkeypatch, agent, FallbackChain(), versions)
+        assert self._post(app).headers["X-Cache"] == "MISS"
+        assert self._post(app).headers["X-Cache"] == "HIT"
+        versions.append("2")
+        assert self._post(app).headers["X-Cache"] == "MISS"
+        assert agent.calls == 2
+
+    def test_unknown_version_is_not_cached(self, cache, monkeypatch):
+        """Test that coaching isn't cached when the portfolio version can't be read."""
+        agent = CoachingAgent()
+        app = self._app(monkeypatch, agent, FallbackChain())
+
+        def unavailable(user_id):
+            raise ConnectionError("firestore down")
+        monkeypatch.setattr(ai_router, "_portfolio_version", unavailable)
+
+        assert [self._post(app).status_code for _ in range(2)] == [200, 200]
+        assert agent.calls == 2
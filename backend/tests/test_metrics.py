@@ -0,0 +1,185 @@
+"""
+Tests for the in-process metrics layer (metrics.py, ai.instrumentation).
+
+Agent runs use a scripted RunnableLambda agent and a fake chat model, so no
+Gemini calls are made.
+"""
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+import metrics
+from metrics import (
+    LLM_SECONDS, STAGE_SECONDS, TOOL_SECONDS, Histogram, MetricsMiddleware, render_metrics, route_scope, span
+)
+from ai import instrumentation
+from ai.instrumentation import METRICS_CALLBACKS, MetricsCallbackHandler
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset_metrics()
+    yield
+    metrics.reset_metrics()
+
+
+def _count(histogram: Histogram, labels: tuple) -> int:
+    series = histogram._series.get(labels)
+    return series.count if series else 0
+
+
+class TestHistogram:
+    """Tests for recording and Prometheus exposition."""
+
+    def test_render_uses_cumulative_buckets(self):
+        """Test that buckets follow Prometheus `le` semantics with +Inf, _sum and _count."""
+        histogram = Histogram("test_latency_seconds", "Test.", ("stage",), buckets=(1, 5))
+        try:
+            for seconds in (0.5, 1.0, 3, 10):
+                histogram.observe(seconds, ("a",))
+            lines = histogram.render()
+        finally:
+            metrics._registry.remove(histogram)
+        assert 'test_latency_seconds_bucket{stage="a",le="1"} 2' in lines
+        assert 'test_latency_seconds_bucket{stage="a",le="5"} 3' in lines
+        assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 4' in lines
+        assert 'test_latency_seconds_sum{stage="a"} 14.5' in lines
+        assert 'test_latency_seconds_count{stage="a"} 4' in lines
+
+    def test_label_values_are_escaped(self):
+        """Test that quotes, backslashes and newlines in labels are escaped."""
+        with route_scope('odd"route\\\n'):
+            with span("stage"):
+                pass
+        assert 'route="odd\\"route\\\\\\n"' in render_metrics()
+
+
+class TestSpan:
+    """Tests for span outcomes and cost."""
+
+    def test_outcomes(self):
+        """Test that ok, error, timeout and cancelled outcomes are labelled."""
+        with span("s", model="m"):
+            pass
+        with pytest.raises(ValueError):
+            with span("s", model="m"):
+                raise ValueError("boom")
+        with pytest.raises(asyncio.TimeoutError):
+            with span("s", model="m"):
+                raise asyncio.TimeoutError()
+
+        async def cancelled():
+            with span("s", model="m"):
+                await asyncio.sleep(10)
+
+        async def run():
+            task = asyncio.create_task(cancelled())
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(run())
+        for outcome in ("ok", "error", "timeout", "cancelled"):
+            assert _count(STAGE_SECONDS, ("", "s", "m", outcome)) == 1
+
+    def test_span_costs_a_few_microseconds(self):
+        """Test that a span stays cheap (loose bound for slow CI machines)."""
+        iterations = 20_000
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with span("bench"):
+                pass
+        per_span_us = (time.perf_counter() - start) / iterations * 1_000_000
+        assert per_span_us < 20
+
+
+class TestMiddleware:
+    """Tests for route labels and the request histogram."""
+
+    def test_spans_are_labelled_with_route_template(self):
+        """Test that spans inside a handler carry the matched route path, not the raw URL."""
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: str):
+            with span("lookup"):
+                return {"id": item_id}
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.get("/items/1")
+                await client.get("/items/2")
+                await client.get("/missing")
+
+        asyncio.run(run())
+        assert _count(STAGE_SECONDS, ("/items/{item_id}", "lookup", "", "ok")) == 2
+        exposition = render_metrics()
+        assert ('parfolio_http_request_duration_seconds_count'
+                '{route="/items/{item_id}",method="GET",status="200"} 2') in exposition
+        assert 'route="unmatched",method="GET",status="404"' in exposition
+
+
+class TestCallbacks:
+    """Tests for tool and LLM timing through LangChain callbacks."""
+
+    def test_agent_tool_calls_are_timed(self):
+        """Test that tools called by an AgentExecutor are recorded via the run config."""
+        @tool
+        def lookup(query: str) -> str:
+            """Look something up."""
+            return query
+
+        @tool
+        def broken(query: str) -> str:
+            """Always fails."""
+            raise RuntimeError("down")
+
+        steps = iter([
+            AgentAction(tool="lookup", tool_input={"query": "a"}, log=""),
+            AgentAction(tool="broken", tool_input={"query": "b"}, log=""),
+            AgentFinish({"output": "done"}, ""),
+        ])
+        executor = AgentExecutor(agent=RunnableLambda(lambda _: next(steps)), tools=[lookup, broken])
+
+        async def run():
+            with route_scope("/ai/coach"):
+                await executor.ainvoke({"input": "hi"}, config={"callbacks": [METRICS_CALLBACKS]})
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(run())
+        assert _count(TOOL_SECONDS, ("/ai/coach", "lookup", "ok")) == 1
+        assert _count(TOOL_SECONDS, ("/ai/coach", "broken", "error")) == 1
+
+    def test_llm_call_counted_once(self):
+        """Test that a client-attached handler also passed in the run config records one call."""
+        llm = GenericFakeChatModel(messages=iter([AIMessage(content="hi")]), callbacks=[METRICS_CALLBACKS])
+        llm.invoke("hello", config={"callbacks": [METRICS_CALLBACKS]})
+        assert sum(series.count for series in LLM_SECONDS._series.values()) == 1
+
+    def test_concurrent_tool_callbacks(self, monkeypatch):
+        """Test that tools starting and ending on many threads (with evictions) don't race."""
+        monkeypatch.setattr(instrumentation, "MAX_OPEN_RUNS", 50)
+        handler = MetricsCallbackHandler()
+
+        def tool_run(_):
+            run_id = uuid.uuid4()
+            handler.on_tool_start({"name": "lookup"}, "q", run_id=run_id)
+            handler.on_tool_end("ok", run_id=run_id)
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(tool_run, range(5000)))
+        assert 0 < sum(series.count for series in TOOL_SECONDS._series.values()) <= 5000
+        assert handler._open == {}
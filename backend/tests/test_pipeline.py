@@ -0,0 +1,121 @@
+"""
+Unit tests for the dependency-graph stage scheduler in ai.pipeline.
+"""
+import asyncio
+import time
+
+import pytest
+
+from ai.pipeline import Stage, StageTimeoutError, run_pipeline
+
+
+def _sleeper(value, delay=0.1, log=None, name=None):
+    async def run(results):
+        if log is not None:
+            log.append(("start", name, time.perf_counter()))
+        await asyncio.sleep(delay)
+        return value(results) if callable(value) else value
+    return run
+
+
+async def _boom(results):
+    raise RuntimeError("boom")
+
+
+class TestRunPipeline:
+    """Tests for stage ordering, concurrency and failure semantics."""
+
+    def test_dependencies_receive_results(self):
+        """Test that a stage sees the results of the stages it depends on."""
+        stages = [
+            Stage("a", _sleeper(2, delay=0)),
+            Stage("b", _sleeper(lambda r: r["a"] * 10, delay=0), deps=("a",)),
+        ]
+        results = asyncio.run(run_pipeline(stages))
+        assert results == {"a": 2, "b": 20}
+
+    def test_independent_stages_run_concurrently(self):
+        """Test that siblings start together once their shared dependency finishes."""
+        stages = [
+            Stage("root", _sleeper("r")),
+            Stage("left", _sleeper("l"), deps=("root",)),
+            Stage("right", _sleeper("r"), deps=("root",)),
+            Stage("side", _sleeper("s")),
+            Stage("join", _sleeper("j", delay=0), deps=("left", "right", "side")),
+        ]
+        start = time.perf_counter()
+        asyncio.run(run_pipeline(stages))
+        elapsed = time.perf_counter() - start
+        # Critical path is root -> left/right (0.2s); serial would be 0.4s
+        assert elapsed < 0.3
+
+    def test_on_error_provides_fallback(self):
+        """Test that a graceful stage failure feeds its fallback to dependents."""
+        stages = [
+            Stage("tag", _boom, on_error=lambda exc: []),
+            Stage("coach", _sleeper(lambda r: len(r["tag"]), delay=0), deps=("tag",)),
+        ]
+        results = asyncio.run(run_pipeline(stages))
+        assert results == {"tag": [], "coach": 0}
+
+    def test_required_failure_raises_and_cancels(self):
+        """Test that a required failure aborts the pipeline and cancels running stages."""
+        cancelled = []
+
+        async def slow(results):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        stages = [
+            Stage("structure", _boom),
+            Stage("profile", slow, required=False),
+        ]
+        with pytest.raises(RuntimeError, match="boom"):
+            asyncio.run(run_pipeline(stages))
+        assert cancelled == [True]
+
+    def test_optional_failure_propagates_to_dependents(self):
+        """Test that a non-required failure is handled by the dependent's on_error."""
+        seen = []
+        stages = [
+            Stage("profile", _boom, required=False),
+            Stage("coach", _sleeper("never", delay=0), deps=("profile",),
+                  on_error=lambda exc: seen.append(str(exc)) or "fallback"),
+        ]
+        results = asyncio.run(run_pipeline(stages))
+        assert results["coach"] == "fallback"
+        assert seen == ["boom"]
+
+    def test_timeout(self):
+        """Test that a stage exceeding its timeout fails with StageTimeoutError."""
+        stages = [Stage("slow", _sleeper("x", delay=1), timeout=0.05)]
+        with pytest.raises(StageTimeoutError):
+            asyncio.run(run_pipeline(stages))
+
+    def test_rejects_cycles_and_unknown_deps(self):
+        """Test that malformed graphs are rejected before anything runs."""
+        with pytest.raises(ValueError):
+            asyncio.run(run_pipeline([Stage("a", _boom, deps=("missing",))]))
+        with pytest.raises(ValueError):
+            asyncio.run(run_pipeline([
+                Stage("a", _boom, deps=("b",)),
+                Stage("b", _boom, deps=("a",)),
+            ]))
+
+    def test_on_stage_complete_reports_in_completion_order(self):
+        """Test that the completion hook fires per stage, including fallbacks."""
+        events = []
+
+        async def record(name, result):
+            events.append((name, result))
+
+        stages = [
+            Stage("transcribe", _sleeper("text", delay=0)),
+            Stage("tag", _boom, deps=("transcribe",), on_error=lambda exc: []),
+            Stage("coach", _sleeper("tips", delay=0.05), deps=("tag",)),
+        ]
+        asyncio.run(run_pipeline(stages, on_stage_complete=record))
+        assert events == [("transcribe", "text"), ("tag", []), ("coach", "tips")]
@@ -0,0 +1,76 @@
+"""
+Tests for portfolio-wide story analytics (ai.portfolio_analytics).
+"""
+from ai.portfolio_analytics import COLUMNS, STORYTELLING_ISSUE_TYPES, STRUCTURE_ISSUE_TYPES, analyze_portfolio
+from ai.tools import (
+    _analyze_story_structure_quality, _detect_weak_storytelling_patterns, _validate_career_stage_alignment
+)
+
+STORIES = [
+    {
+        "story_id": "s1", "title": "Checkout", "status": "complete",
+        "problem": "Checkout failures were rising and support tickets were piling up every week.",
+        "action": "I led a working group, rewrote the retry logic and owned the rollout plan end to end. " * 3,
+        "result": "Failed checkouts dropped by 35% and tickets halved within a month.",
+    },
+    {
+        "story_id": "s2", "title": "Migration", "status": "draft",
+        "problem": "The database was outdated.",
+        "action": "We built a new pipeline. I just helped with testing.",
+        "result": "It improved things.",
+    },
+    {"story_id": "s3", "title": "Empty", "status": "draft", "problem": "", "action": "", "result": ""},
+]
+
+
+class TestAnalyzePortfolio:
+    """Tests for the columnar portfolio table."""
+
+    def test_columns_match_single_story_analyses(self):
+        """Test that every column holds the per-story tool results, in story order."""
+        table = analyze_portfolio(STORIES, "mid_career")
+        columns = table["columns"]
+        assert set(columns) == set(COLUMNS)
+        assert all(len(values) == len(STORIES) for values in columns.values())
+
+        for i, story in enumerate(STORIES):
+            sections = (story["problem"], story["action"], story["result"])
+            structure = _analyze_story_structure_quality(*sections)
+            patterns = _detect_weak_storytelling_patterns(*sections)
+            alignment = _validate_career_stage_alignment(*sections, "mid_career")
+
+            assert columns["story_id"][i] == story["story_id"]
+            assert columns["words_total"][i] == structure["word_counts"]["total"]
+            assert columns["pct_action"][i] == round(structure["percentages"]["action"], 3)
+            assert columns["balance_score"][i] == round(structure["balance_score"], 3)
+            assert columns["storytelling_score"][i] == patterns["quality_score"]
+            assert columns["has_quantified_results"][i] == patterns["has_quantified_results"]
+            assert columns["aligned"][i] == alignment["aligned"]
+            assert columns["alignment_score"][i] == round(alignment["alignment_score"], 3)
+
+    def test_issue_flags_decode_to_issue_types(self):
+        """Test that bit flags, read through the legend, give back each story's issue types."""
+        table = analyze_portfolio(STORIES)
+        legend = table["flag_legend"]
+        assert legend["structure_flags"] == list(STRUCTURE_ISSUE_TYPES)
+
+        story = STORIES[1]
+        patterns = _detect_weak_storytelling_patterns(story["problem"], story["action"], story["result"])
+        flags = table["columns"]["storytelling_flags"][1]
+        decoded = [t for bit, t in enumerate(legend["storytelling_flags"]) if flags & (1 << bit)]
+        assert decoded == [issue["type"] for issue in patterns["issues"]]
+        assert table["summary"]["issue_counts"]["vague_results"] == 1
+
+    def test_unknown_career_stage_skips_alignment(self):
+        """Test that alignment columns are empty without a known career stage."""
+        table = analyze_portfolio(STORIES, "astronaut")
+        assert table["career_stage"] is None
+        assert table["columns"]["alignment_score"] == [None, None, None]
+        assert table["summary"]["mean_alignment_score"] is None
+
+    def test_empty_portfolio(self):
+        """Test that a user without stories gets empty columns."""
+        table = analyze_portfolio([], "early_career")
+        assert table["count"] == 0
+        assert table["columns"]["story_id"] == []
+        assert table["summary"]["mean_balance_score"] is None
@@ -0,0 +1,127 @@
+"""
+Tests for the per-user portfolio counters (portfolio_stats.py).
+"""
+from unittest.mock import MagicMock, patch
+
+from firebase_admin import firestore
+
+from ai.tools import _get_competency_coverage_internal
+from portfolio_stats import apply_stats_delta, compute_stats, stats_delta, stats_mismatches, stats_seed
+
+STORIES = [
+    {"tags": ["Leadership", "Impact"], "status": "complete"},
+    {"tags": ["Impact", "Impact"], "status": "draft"},
+    {"tags": [], "status": None},
+]
+
+
+class TestCounters:
+    """Tests for counting and write deltas."""
+
+    def test_compute_stats(self):
+        """Test totals, per-tag and per-status counts (a repeated tag counts the story once)."""
+        assert compute_stats(STORIES) == {
+            "total_stories": 3,
+            "tags": {"Leadership": 1, "Impact": 2},
+            "status": {"complete": 1, "draft": 2},
+        }
+        assert compute_stats([]) == {"total_stories": 0, "tags": {}, "status": {}}
+
+    def test_deltas_replay_to_recount(self):
+        """Test that applying the deltas of a create/update/delete sequence matches a recount."""
+        story_a = {"tags": ["Leadership"], "status": "draft"}
+        story_a_edited = {"tags": ["Impact", "Conflict"], "status": "complete"}
+        story_b = {"tags": ["Impact"], "status": "draft"}
+        writes = [(None, story_a), (None, story_b), (story_a, story_a_edited), (story_b, None)]
+
+        totals = {"total_stories": 0, "tags": {}, "status": {}}
+        for before, after in writes:
+            delta = stats_delta(before, after)
+            totals["total_stories"] += delta["total_stories"]
+            for group in ("tags", "status"):
+                for name, value in delta[group].items():
+                    totals[group][name] = totals[group].get(name, 0) + value
+        assert stats_mismatches(totals, compute_stats([story_a_edited])) == {}
+
+    def test_update_delta_only_touches_changed_counters(self):
+        """Test that an edit leaves out counters it doesn't change."""
+        before = {"tags": ["Leadership", "Impact"], "status": "draft", "title": "Old"}
+        after = {**before, "tags": ["Impact", "Conflict"], "title": "New"}
+        assert stats_delta(before, after) == {
+            "total_stories": 0, "tags": {"Leadership": -1, "Conflict": 1}, "status": {}
+        }
+
+
+class TestFirestoreWrites:
+    """Tests for writing deltas in the story write's transaction."""
+
+    def test_delta_is_written_as_increments(self):
+        """Test that counters are merged with Firestore increments in the caller's transaction."""
+        writer, db = MagicMock(), MagicMock()
+        apply_stats_delta(writer, db, "u1", stats_delta(None, {"tags": ["Strategic Thinking"], "status": "draft"}))
+
+        db.collection.assert_called_once_with("portfolio_stats")
+        _, update = writer.set.call_args.args
+        assert writer.set.call_args.kwargs == {"merge": True}
+        assert isinstance(update["total_stories"], firestore.Increment)
+        assert update["tags"]["Strategic Thinking"].value == 1
+        assert update["status"]["draft"].value == 1
+
+    def test_missing_document_is_seeded_from_a_recount(self):
+        """Test that a user's first write counts their existing stories, not just this one."""
+        transaction, db = MagicMock(), MagicMock()
+        db.collection.return_value.document.return_value.get.return_value.exists = False
+        transaction.get.return_value = [MagicMock(to_dict=MagicMock(return_value=story)) for story in STORIES]
+
+        seed = stats_seed(transaction, db, "u1")
+        assert seed == compute_stats(STORIES)
+        new_story = {"tags": ["Leadership"], "status": "draft"}
+        apply_stats_delta(transaction, db, "u1", stats_delta(None, new_story), seed)
+
+        _, document = transaction.set.call_args.args
+        assert "merge" not in transaction.set.call_args.kwargs
+        assert stats_mismatches(document, compute_stats(STORIES + [new_story])) == {}
+
+    def test_existing_document_is_not_recounted(self):
+        """Test that users with counters only pay for the document read."""
+        transaction, db = MagicMock(), MagicMock()
+        db.collection.return_value.document.return_value.get.return_value.exists = True
+        assert stats_seed(transaction, db, "u1") is None
+        transaction.get.assert_not_called()
+
+    def test_text_edit_only_bumps_version(self):
+        """Test that an edit that changes no counter only increments the portfolio version."""
+        writer = MagicMock()
+        story = {"tags": ["Impact"], "status": "draft"}
+        apply_stats_delta(writer, MagicMock(), "u1", stats_delta(story, {**story, "title": "New"}))
+        _, update = writer.set.call_args.args
+        assert update["version"].value == 1
+        assert not {"total_stories", "tags", "status"} & set(update)
+
+
+class TestConsistency:
+    """Tests for the drift report used by backfill_portfolio_stats.py --check."""
+
+    def test_mismatches(self):
+        """Test that drift is reported per counter and zeroed counters aren't drift."""
+        expected = compute_stats(STORIES)
+        stored = {"total_stories": 4, "tags": {"Leadership": 1, "Impact": 1, "Failure": 0},
+                  "status": {"complete": 1, "draft": 2}}
+        assert stats_mismatches(stored, expected) == {"total_stories": (4, 3), "tags.Impact": (1, 2)}
+        assert stats_mismatches(None, expected)["total_stories"] == (None, 3)
+
+
+class TestCoverageTool:
+    """Tests that the coverage tool reads the counters instead of the stories."""
+
+    @patch("ai.tools._get_user_stories")
+    @patch("ai.tools._get_portfolio_stats")
+    def test_reads_counters(self, mock_stats, mock_get_stories):
+        """Test that stored counters are used without loading any story."""
+        mock_stats.return_value = {"total_stories": 40, "tags": {"Leadership": 12, "Impact": 1}, "status": {}}
+        result = _get_competency_coverage_internal("test_user")
+        mock_get_stories.assert_not_called()
+        assert result["total_stories"] == 40
+        assert "Leadership" in result["strong_coverage"]
+        assert result["weak_coverage"] == ["Impact"]
+        assert len(result["gaps"]) == 8
@@ -0,0 +1,125 @@
+"""
+Tests for market-intelligence prefetch on profile changes (ai.prefetch).
+
+Tavily is replaced by a counting fake and the tool cache by a temporary
+SQLite file, so prefetched results can be checked against later tool calls.
+"""
+import asyncio
+import time
+
+import pytest
+
+from ai import prefetch, tool_cache, tools
+from ai.prefetch import MarketPrefetcher, profile_targets
+from ai.sqlite_cache import SQLiteCache
+from ai.tool_cache import _MemoryLRU
+
+
+class CountingTavily:
+    def __init__(self):
+        self.queries = []
+        self.error = None
+
+    def invoke(self, query):
+        self.queries.append(query)
+        if self.error:
+            raise self.error
+        return [{"title": "Result", "url": "https://example.com", "content": f"About {query}"}]
+
+
+@pytest.fixture
+def tavily(tmp_path, monkeypatch):
+    fake = CountingTavily()
+    monkeypatch.setattr(tools, "_get_tavily_tool", lambda: fake)
+    monkeypatch.setattr(prefetch, "_get_tavily_tool", lambda: fake)
+    monkeypatch.setattr(prefetch, "AI_PREFETCH_ENABLED", True)
+    monkeypatch.setattr(tool_cache, "_store", SQLiteCache(str(tmp_path / "tool_cache.sqlite3"), 1024 * 1024))
+    monkeypatch.setattr(tool_cache, "_memory", _MemoryLRU(1024 * 1024))
+    prefetch.PREFETCH_EVENTS.clear()
+    tool_cache.TOOL_CACHE_EVENTS.clear()
+    return fake
+
+
+async def _prefetch(targets, rpm=6000, **kwargs):
+    prefetcher = MarketPrefetcher(rpm=rpm, **kwargs)
+    queued = await prefetcher.enqueue(targets)
+    await prefetcher.join()
+    await prefetcher.stop()
+    return queued
+
+
+def test_profile_targets():
+    """Test that target fields become (tool, value) pairs and other fields are ignored."""
+    update = {"target_companies": ["Stripe", "  Figma  ", ""], "target_role": "Staff  PM",
+              "target_industry": "Fintech", "current_company": "Acme"}
+    assert profile_targets(update) == [
+        ("company_insights", "Stripe"), ("company_insights", "Figma"),
+        ("role_trends", "Staff PM"), ("industry_context", "Fintech"),
+    ]
+    assert profile_targets({"current_role": "PM"}) == []
+
+
+def test_profile_targets_skip_stored_values():
+    """Test that only targets the stored profile didn't have are prefetched."""
+    stored = {"target_companies": ["Stripe"], "target_role": "Staff PM", "target_industry": "Fintech"}
+    update = {"target_companies": ["stripe", "Figma"], "target_role": "Staff  PM", "target_industry": "Climate"}
+    assert profile_targets(update, stored) == [("company_insights", "Figma"), ("industry_context", "Climate")]
+    assert profile_targets(stored, stored) == []
+
+
+class TestPrefetch:
+    """Tests for warming the tool cache in the background."""
+
+    def test_agent_call_hits_warm_cache(self, tavily):
+        """Test that after a prefetch the agent's tool call makes no Tavily request."""
+        asyncio.run(_prefetch([("company_insights", "Stripe"), ("role_trends", "Product Manager")]))
+        assert len(tavily.queries) == 2
+
+        output = tools.get_company_interview_insights.invoke({"company_name": "stripe"})
+        assert "Interview Insights for stripe" in output
+        assert len(tavily.queries) == 2
+
+    def test_duplicates_and_cached_targets_are_skipped(self, tavily):
+        """Test that repeated targets are queued once and cached ones aren't searched again."""
+        queued = asyncio.run(_prefetch([("company_insights", "Google"), ("company_insights", "google")]))
+        assert queued == 1
+        asyncio.run(_prefetch([("company_insights", "Google")]))
+        assert len(tavily.queries) == 1
+
+    def test_searches_are_rate_limited(self, tavily):
+        """Test that consecutive searches are spaced by the configured rate."""
+        start = time.perf_counter()
+        asyncio.run(_prefetch([("company_insights", name) for name in ("A", "B", "C")], rpm=600))
+        assert len(tavily.queries) == 3
+        assert time.perf_counter() - start >= 0.2  # 0.1 s between searches
+
+    def test_full_queue_drops_targets(self, tavily):
+        """Test that targets beyond max_pending are dropped instead of queued."""
+        queued = asyncio.run(_prefetch([("company_insights", str(i)) for i in range(5)], max_pending=2))
+        assert queued == 2
+
+    def test_without_tavily_nothing_is_searched(self, tavily, monkeypatch):
+        """Test that prefetching is a no-op when Tavily isn't configured."""
+        monkeypatch.setattr(prefetch, "_get_tavily_tool", lambda: None)
+        asyncio.run(_prefetch([("industry_context", "Fintech")]))
+        assert tavily.queries == []
+
+    def test_search_errors_count_as_failed(self, tavily):
+        """Test that a Tavily error is counted as failed and nothing is cached."""
+        tavily.error = RuntimeError("quota exceeded")
+        asyncio.run(_prefetch([("company_insights", "Stripe")]))
+
+        assert prefetch.PREFETCH_EVENTS.value(("company_insights", "failed")) == 1
+        assert prefetch.PREFETCH_EVENTS.value(("company_insights", "fetched")) == 0
+        tavily.error = None
+        tools.get_company_interview_insights.invoke({"company_name": "Stripe"})
+        assert len(tavily.queries) == 2
+
+    def test_lookups_are_not_counted_as_tool_cache_misses(self, tavily):
+        """Test that prefetch lookups leave the tool cache hit/miss metrics alone."""
+        asyncio.run(_prefetch([("company_insights", "Stripe")]))
+        asyncio.run(_prefetch([("company_insights", "Stripe")]))
+
+        assert prefetch.PREFETCH_EVENTS.value(("company_insights", "cached")) == 1
+        assert tool_cache.TOOL_CACHE_EVENTS.value(("company_insights", tool_cache.MEMORY_TIER, "miss")) == 0
+        assert tool_cache.TOOL_CACHE_EVENTS.value(("company_insights", tool_cache.MEMORY_TIER, "hit")) == 0
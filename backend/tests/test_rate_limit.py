@@ -0,0 +1,195 @@
+"""
+Tests for per-model rate limiting and priority scheduling (ai.rate_limit).
+
+Buckets run at a few requests per second and backoffs are shrunk to
+milliseconds, so every test finishes well under a second.
+"""
+import asyncio
+import time
+
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+from langchain_core.runnables import RunnableLambda
+
+from ai import rate_limit
+from ai.rate_limit import (
+    LLM_QUEUE_DEPTH, LLM_RATE_LIMIT_EVENTS, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, RateLimitTimeout,
+    RateLimitedRunnable, TokenBucket, get_bucket, is_rate_limited, priority_scope
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_buckets(monkeypatch):
+    monkeypatch.setattr(rate_limit, "AI_RATE_LIMIT_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(rate_limit, "AI_RATE_LIMIT_BACKOFF_MAX_SECONDS", 0.02)
+    rate_limit.reset_buckets()
+    yield
+    rate_limit.reset_buckets()
+
+
+class TestTokenBucket:
+    """Tests for admission, ordering and timeouts."""
+
+    def test_burst_then_refill_rate(self):
+        """Test that the burst goes through at once and later calls are spaced by the refill rate."""
+        bucket = TokenBucket("m", rpm=600, burst=2)
+
+        async def run():
+            start = time.monotonic()
+            times = []
+            for _ in range(4):
+                await bucket.acquire()
+                times.append(time.monotonic() - start)
+            return times
+
+        times = asyncio.run(run())
+        assert times[1] < 0.02
+        assert times[3] >= 0.18
+
+    def test_interactive_jumps_the_queue(self):
+        """Test that a queued interactive call is served before background calls queued earlier."""
+        bucket = TokenBucket("m", rpm=1200, burst=1, background_reserve=0)
+        order = []
+
+        async def call(name, priority):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        async def run():
+            await bucket.acquire()
+            background = [asyncio.create_task(call(f"bg{i}", PRIORITY_BACKGROUND)) for i in range(3)]
+            await asyncio.sleep(0)
+            interactive = asyncio.create_task(call("user", PRIORITY_INTERACTIVE))
+            await asyncio.gather(*background, interactive)
+
+        asyncio.run(run())
+        assert order == ["user", "bg0", "bg1", "bg2"]
+
+    def test_background_leaves_reserve(self):
+        """Test that background calls stop at the reserve while interactive calls still go through."""
+        bucket = TokenBucket("m", rpm=6, burst=4, background_reserve=0.5)
+
+        async def run():
+            await bucket.acquire(PRIORITY_BACKGROUND)
+            await bucket.acquire(PRIORITY_BACKGROUND)
+            with pytest.raises(RateLimitTimeout):
+                await bucket.acquire(PRIORITY_BACKGROUND, timeout=0.05)
+            assert await bucket.acquire(PRIORITY_INTERACTIVE, timeout=0.05) == 0.0
+
+        asyncio.run(run())
+
+    def test_queue_timeout_clears_depth(self):
+        """Test that a timed-out waiter raises, is counted and leaves the queue-depth gauge at zero."""
+        bucket = TokenBucket("timeout-model", rpm=1, burst=1)
+        before = LLM_RATE_LIMIT_EVENTS.value(("timeout-model", "queue_timeout"))
+
+        async def run():
+            await bucket.acquire()
+            with pytest.raises(RateLimitTimeout):
+                await bucket.acquire(timeout=0.05)
+
+        asyncio.run(run())
+        assert LLM_RATE_LIMIT_EVENTS.value(("timeout-model", "queue_timeout")) - before == 1
+        assert LLM_QUEUE_DEPTH.value(("timeout-model", "interactive")) == 0
+
+    def test_cancel_after_handoff_keeps_the_token(self):
+        """Test that a waiter cancelled right after being granted a token doesn't lose it."""
+        bucket = TokenBucket("m", rpm=0.06, burst=1)
+
+        async def run():
+            await bucket.acquire()
+            task = asyncio.create_task(bucket.acquire())
+            await asyncio.sleep(0)
+            with bucket._lock:
+                bucket.tokens = 1.0
+                bucket._dispatch_locked()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return task
+
+        assert asyncio.run(run()).cancelled()
+        assert bucket.tokens == pytest.approx(1.0, abs=0.01)
+        assert not bucket._waiters
+
+    def test_limits_come_from_environment(self, monkeypatch):
+        """Test that per-model overrides win over the global setting."""
+        monkeypatch.setenv("AI_RATE_LIMIT_RPM", "30")
+        monkeypatch.setenv("AI_RATE_LIMIT_RPM_GEMINI_2_0_FLASH", "1200")
+        monkeypatch.setenv("AI_RATE_LIMIT_BURST", "3")
+        assert get_bucket("gemini-2.0-flash").rate == 20
+        assert get_bucket("gemini-pro").rate == 0.5
+        assert get_bucket("gemini-pro").burst == 3
+
+
+class TestRateLimitedRunnable:
+    """Tests for 429 backoff and retry."""
+
+    def _flaky(self, failures, error=None):
+        calls = []
+
+        async def model(_input):
+            calls.append(time.monotonic())
+            if len(calls) <= failures:
+                raise error or ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+            return "ok"
+
+        return RunnableLambda(model), calls
+
+    def test_429_is_retried_and_pauses_bucket(self):
+        """Test that 429s are retried with backoff and counted, and the bucket is emptied."""
+        runnable, calls = self._flaky(2)
+        limited = RateLimitedRunnable(runnable, "flaky-model")
+        before = LLM_RATE_LIMIT_EVENTS.value(("flaky-model", "retry"))
+
+        assert asyncio.run(limited.ainvoke("prompt")) == "ok"
+        assert len(calls) == 3
+        assert LLM_RATE_LIMIT_EVENTS.value(("flaky-model", "retry")) - before == 2
+        assert get_bucket("flaky-model").tokens < 1
+
+    def test_gives_up_after_max_retries(self, monkeypatch):
+        """Test that the 429 is raised once retries are used up."""
+        monkeypatch.setattr(rate_limit, "AI_RATE_LIMIT_MAX_RETRIES", 1)
+        runnable, calls = self._flaky(5)
+        with pytest.raises(ResourceExhausted):
+            asyncio.run(RateLimitedRunnable(runnable, "m").ainvoke("prompt"))
+        assert len(calls) == 2
+
+    def test_other_errors_are_not_retried(self):
+        """Test that non-quota errors propagate on the first attempt."""
+        runnable, calls = self._flaky(1, error=ValueError("bad schema"))
+        with pytest.raises(ValueError):
+            asyncio.run(RateLimitedRunnable(runnable, "m").ainvoke("prompt"))
+        assert len(calls) == 1
+
+    def test_priority_scope_reaches_the_bucket(self, monkeypatch):
+        """Test that calls inside priority_scope queue as background."""
+        seen = []
+
+        async def acquire(priority, timeout):
+            seen.append(priority)
+            return 0.0
+
+        monkeypatch.setattr(get_bucket("m"), "acquire", acquire)
+        limited = RateLimitedRunnable(RunnableLambda(lambda x: x), "m")
+
+        async def run():
+            await limited.ainvoke("a")
+            with priority_scope(PRIORITY_BACKGROUND):
+                await limited.ainvoke("b")
+
+        asyncio.run(run())
+        assert seen == [PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND]
+
+    def test_sync_invoke_is_limited(self):
+        """Test that sync invoke() takes a token too."""
+        limited = RateLimitedRunnable(RunnableLambda(lambda x: x.upper()), "sync-model")
+        assert limited.invoke("a") == "A"
+        assert get_bucket("sync-model").tokens < rate_limit.DEFAULT_BURST
+
+    def test_is_rate_limited(self):
+        """Test 429 detection on direct and wrapped errors."""
+        wrapped = RuntimeError("call failed")
+        wrapped.__cause__ = ResourceExhausted("quota")
+        assert is_rate_limited(ResourceExhausted("quota"))
+        assert is_rate_limited(wrapped)
+        assert not is_rate_limited(ValueError("expected 429 tokens"))
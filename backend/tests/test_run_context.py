@@ -0,0 +1,244 @@
+"""
+Tests for the shared coaching agent and per-run user binding (ai.run_context).
+
+Firestore is replaced by a fake `_get_user_stories` that sleeps, so many
+concurrent runs for different users interleave inside the same tools.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ai import chains, run_context, tools
+from ai.similarity_index import reset_story_indexes
+from ai.run_context import (
+    NoUserBoundError, current_tool_memo, current_user_id, invalidate_portfolio, reset_portfolio_cache,
+    seed_tool_result, user_portfolio, user_scope
+)
+
+USERS = [f"user_{i}" for i in range(20)]
+
+STORY = {
+    "problem": "Our checkout flow was losing customers.",
+    "action": "I redesigned the payment step and ran an A/B test.",
+    "result": "Conversion improved by 12%.",
+}
+
+
+def _stories_for(user_id: str):
+    # Each user owns a different number of stories, all tagged with their own marker title
+    count = USERS.index(user_id) + 1
+    return [
+        {"id": f"{user_id}-{n}", "title": f"{user_id} story {n}", "problem": "", "action": "",
+         "result": "", "tags": ["Leadership"], "status": "draft"}
+        for n in range(count)
+    ]
+
+
+@pytest.fixture
+def fake_stories(monkeypatch):
+    def get_user_stories(user_id):
+        time.sleep(0.01)  # Let other runs interleave mid-tool
+        return _stories_for(user_id)
+
+    monkeypatch.setattr(tools, "_get_user_stories", get_user_stories)
+    reset_story_indexes()
+    yield
+    reset_story_indexes()
+
+
+@pytest.fixture
+def shared_tools():
+    return {t.name: t for t in tools.create_user_tools()}
+
+
+class TestSharedAgent:
+    """Tests for building the coaching agent once per worker."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_registry(self, monkeypatch):
+        monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+        chains.reload_chains()
+        yield
+        chains.reload_chains()
+
+    def test_agent_is_built_once(self):
+        """Test that repeated calls return the same executor."""
+        assert chains.get_coaching_agent() is chains.get_coaching_agent()
+        assert chains.get_coaching_agent(fast=True) is chains.get_coaching_agent(fast=True)
+        assert chains.get_coaching_agent() is not chains.get_coaching_agent(fast=True)
+
+
+class TestUserScope:
+    """Tests that user-scoped tools only ever see the bound user's data."""
+
+    def test_unbound_tool_call_fails(self, fake_stories, shared_tools):
+        """Test that a shared tool refuses to run without a bound user."""
+        with pytest.raises(NoUserBoundError):
+            shared_tools["get_portfolio_coverage"].invoke({})
+
+    def test_scope_is_restored(self):
+        """Test that nested scopes restore the outer user on exit."""
+        with user_scope("outer"):
+            with user_scope("inner"):
+                assert current_user_id() == "inner"
+            assert current_user_id() == "outer"
+        with pytest.raises(NoUserBoundError):
+            current_user_id()
+
+    def test_concurrent_async_runs_are_isolated(self, fake_stories, shared_tools):
+        """Test that interleaved async runs for different users never mix data."""
+        coverage = shared_tools["get_portfolio_coverage"]
+        similar = shared_tools["find_similar_stories"]
+
+        async def run(user_id):
+            with user_scope(user_id):
+                await asyncio.sleep(0)
+                coverage_out = await coverage.ainvoke({})
+                similar_out = await similar.ainvoke({"title": "story", "top_k": 50})
+                return user_id, coverage_out, similar_out
+
+        async def run_all():
+            return await asyncio.gather(*[run(u) for u in USERS * 3])
+
+        for user_id, coverage_out, similar_out in asyncio.run(run_all()):
+            assert f"Total Stories: {USERS.index(user_id) + 1}" in coverage_out
+            other_users = [u for u in USERS if u != user_id]
+            assert user_id in similar_out
+            assert not any(f"{u} story" in similar_out for u in other_users)
+
+    def test_concurrent_threads_are_isolated(self, fake_stories, shared_tools):
+        """Test that sync tool calls from many threads each see their own user."""
+        coverage = shared_tools["get_portfolio_coverage"]
+
+        def run(user_id):
+            with user_scope(user_id):
+                return user_id, coverage.invoke({})
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(run, USERS * 3))
+
+        for user_id, output in results:
+            assert f"Total Stories: {USERS.index(user_id) + 1}" in output
+
+
+class TestPortfolioSnapshot:
+    """Tests that a coaching run reads the user's stories at most once."""
+
+    @pytest.fixture
+    def loads(self, monkeypatch):
+        calls = []
+
+        def get_user_stories(user_id):
+            calls.append(user_id)
+            return _stories_for(user_id)
+
+        monkeypatch.setattr(tools, "_get_user_stories", get_user_stories)
+        reset_story_indexes()
+        reset_portfolio_cache()
+        yield calls
+        reset_story_indexes()
+        reset_portfolio_cache()
+
+    def test_one_read_per_run(self, loads, shared_tools):
+        """Test that every portfolio tool in a run shares one Firestore read."""
+        async def run():
+            with user_scope("user_2"):
+                await shared_tools["get_portfolio_coverage"].ainvoke({})
+                await shared_tools["find_similar_stories"].ainvoke({"tags": "Leadership"})
+                await shared_tools["get_portfolio_coverage"].ainvoke({})
+
+        asyncio.run(run())
+        assert loads == ["user_2"]
+        asyncio.run(run())  # A new run takes a new snapshot (the cache is off by default)
+        assert loads == ["user_2", "user_2"]
+
+    def test_snapshot_is_per_user(self, loads):
+        """Test that a run's snapshot is never served for another user."""
+        with user_scope("user_0"):
+            assert len(user_portfolio("user_0", tools._get_user_stories)) == 1
+            assert len(user_portfolio("user_1", tools._get_user_stories)) == 2
+            assert len(user_portfolio("user_0", tools._get_user_stories)) == 1
+        assert loads == ["user_0", "user_1"]
+
+    def test_cache_is_invalidated_by_writes(self, loads, monkeypatch):
+        """Test that the optional per-user cache serves repeat loads until a story write."""
+        monkeypatch.setattr(run_context, "PORTFOLIO_CACHE_TTL_SECONDS", 60)
+        for _ in range(2):
+            with user_scope("user_3"):
+                tools._get_competency_coverage_internal("user_3")
+        assert loads == ["user_3"]
+
+        invalidate_portfolio("user_3")
+        with user_scope("user_3"):
+            tools._get_competency_coverage_internal("user_3")
+        assert loads == ["user_3", "user_3"]
+
+
+class TestToolMemo:
+    """Tests that repeated tool calls in a run are answered from the run's memo."""
+
+    @pytest.fixture
+    def analyses(self, monkeypatch):
+        calls = []
+
+        def counted(func):
+            def call(*args):
+                calls.append(func.__name__)
+                return func(*args)
+            return call
+
+        monkeypatch.setattr(tools, "_detect_weak_storytelling_patterns",
+                            counted(tools._detect_weak_storytelling_patterns))
+        monkeypatch.setattr(tools, "_analyze_story_structure_quality",
+                            counted(tools._analyze_story_structure_quality))
+        return calls
+
+    def test_repeat_calls_run_once(self, analyses, shared_tools):
+        """Test that a repeat call, even with different whitespace, reuses the first output."""
+        async def run():
+            with user_scope("user_0"):
+                first = await shared_tools["analyze_storytelling"].ainvoke(STORY)
+                spaced = {**STORY, "action": "  I redesigned the payment step\nand ran an A/B test. "}
+                second = await shared_tools["analyze_storytelling"].ainvoke(spaced)
+                return first, second, current_tool_memo().saved
+
+        first, second, saved = asyncio.run(run())
+        assert first == second
+        assert analyses == ["_detect_weak_storytelling_patterns"]
+        assert saved == {"analyze_storytelling": 1}
+
+        asyncio.run(run())  # A new run starts with an empty memo
+        assert len(analyses) == 2
+
+    def test_seeded_pre_analysis_is_reused(self, analyses, shared_tools):
+        """Test that seeded pre-analysis answers the agent's call with the tool's own output."""
+        storytelling = tools._detect_weak_storytelling_patterns(*STORY.values())
+        structure = tools._analyze_story_structure_quality(*STORY.values())
+        expected = shared_tools["analyze_structure"].invoke(STORY)  # Outside a run: not memoized
+        analyses.clear()
+
+        with user_scope("user_0"):
+            for tool_name, args, output in tools.pre_analysis_tool_results(*STORY.values(), storytelling, structure):
+                seed_tool_result(tool_name, args, output)
+            assert shared_tools["analyze_structure"].invoke(STORY) == expected
+            shared_tools["analyze_storytelling"].invoke(STORY)
+            assert current_tool_memo().saved_calls == 2
+        assert analyses == []
+
+    def test_default_arguments_match(self, monkeypatch, shared_tools):
+        """Test that omitting an argument and passing its default are the same call."""
+        queries = []
+
+        class FakeMemorySearch:
+            def invoke(self, args):
+                queries.append(args)
+                return "[PROJECT] Led the Kafka migration"
+
+        monkeypatch.setattr(tools, "search_personal_memory", FakeMemorySearch())
+        with user_scope("user_0"):
+            shared_tools["search_memory"].invoke({"query": "kafka"})
+            shared_tools["search_memory"].invoke({"query": "kafka", "top_k": 3})
+            shared_tools["search_memory"].invoke({"query": "kafka", "top_k": 5})
+        assert [q["top_k"] for q in queries] == [3, 5]
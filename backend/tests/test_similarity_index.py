@@ -0,0 +1,145 @@
+"""
+Tests for the per-user story similarity index (ai.similarity_index).
+"""
+import random
+
+import pytest
+
+from ai import similarity_index
+from ai.similarity_index import (
+    StoryIndex, get_story_index, index_story, reset_story_indexes, title_terms, unindex_story
+)
+
+TOPICS = ["checkout", "billing", "onboarding", "search", "latency", "hiring", "migration", "pricing"]
+VERBS = ["redesigned", "rewrote", "automated", "measured", "negotiated", "mentored", "launched"]
+TAGS = ["Leadership", "Impact", "Communication", "Execution", "Ownership", "Conflict"]
+
+
+def make_story(i: int, rng: random.Random) -> dict:
+    topic, other = rng.sample(TOPICS, 2)
+    return {
+        "story_id": f"s{i}",
+        "title": f"{topic.title()} {rng.choice(VERBS)} {i}",
+        "problem": f"The {topic} flow was slow and the {other} team was blocked. Ticket {i} kept reopening.",
+        "action": f"I {rng.choice(VERBS)} the {topic} service and {rng.choice(VERBS)} the {other} reports.",
+        "result": f"Conversion rose {rng.randint(1, 40)}% and support load fell.",
+        "tags": rng.sample(TAGS, 2),
+        "status": "complete",
+    }
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    reset_story_indexes()
+    yield
+    reset_story_indexes()
+
+
+class TestSearch:
+    """Tests for scoring and ranking."""
+
+    def test_identical_story_scores_full_weight(self):
+        """Test that a query equal to a story scores 1.0 and ranks it first."""
+        rng = random.Random(1)
+        stories = [make_story(i, rng) for i in range(20)]
+        target = stories[7]
+        results = StoryIndex(stories).search(
+            title=target["title"], tags=target["tags"],
+            content=f"{target['problem']} {target['action']} {target['result']}",
+        )
+        assert results[0]["story_id"] == "s7"
+        assert results[0]["similarity_score"] == pytest.approx(1.0)
+
+    def test_weights_and_partial_titles(self):
+        """Test the 40/20/40 weighting and that partial titles still match."""
+        index = StoryIndex([
+            {"story_id": "a", "title": "Checkout redesign", "tags": ["Impact"], "problem": "cart abandonment"},
+            {"story_id": "b", "title": "Hiring plan", "tags": ["Leadership", "Impact"], "problem": "slow hiring"},
+        ])
+        assert [r["story_id"] for r in index.search(tags=["Leadership", "Impact"])] == ["b", "a"]
+        assert index.search(tags=["Leadership", "Impact"])[0]["similarity_score"] == pytest.approx(0.4)
+        assert index.search(title="checkout")[0]["story_id"] == "a"
+        assert index.search(content="hiring")[0]["story_id"] == "b"
+        assert index.search(content="hiring")[0]["similarity_score"] <= 0.4
+        assert index.search() == []
+
+    def test_pruned_candidates_match_exhaustive_scoring(self, monkeypatch):
+        """Test that skipping common-term postings doesn't change the top results."""
+        rng = random.Random(7)
+        index = StoryIndex(make_story(i, rng) for i in range(1000))
+        queries = [make_story(i, random.Random(i)) for i in range(0, 1000, 97)]
+
+        def run():
+            return [
+                [(r["story_id"], round(r["similarity_score"], 9)) for r in index.search(
+                    title=q["title"], tags=q["tags"][:1], content=q["action"], top_k=3)]
+                for q in queries
+            ]
+
+        pruned = run()
+        monkeypatch.setattr(similarity_index, "COMMON_TERM_MIN_DF", 10 ** 9)
+        assert pruned == run()
+
+    def test_ties_keep_portfolio_order(self):
+        """Test that equal scores are returned in portfolio order."""
+        index = StoryIndex({"story_id": str(i), "tags": ["Leadership"]} for i in range(10))
+        assert [r["story_id"] for r in index.search(tags=["Leadership"], top_k=3)] == ["0", "1", "2"]
+
+
+class TestIncrementalUpdates:
+    """Tests for keeping the index in step with story writes."""
+
+    def test_upsert_and_remove(self):
+        """Test that updates re-index a story and deletes drop it."""
+        index = StoryIndex([{"story_id": "a", "title": "Billing migration", "problem": "invoices were late"}])
+        assert index.search(content="invoices")[0]["story_id"] == "a"
+
+        index.upsert({"story_id": "a", "title": "Billing migration", "problem": "refunds were slow"})
+        assert index.search(content="invoices") == []
+        assert index.search(content="refunds")[0]["problem"] == "refunds were slow"
+
+        index.remove("a")
+        assert len(index) == 0
+        assert index.search(title="Billing migration") == []
+
+    def test_registry_builds_once_and_applies_writes(self):
+        """Test that the index is loaded once per user and updated by index_story / unindex_story."""
+        calls = []
+
+        def load(user_id):
+            calls.append(user_id)
+            return [{"story_id": "a", "title": "Pricing experiment", "tags": ["Impact"]}]
+
+        get_story_index("u1", load)
+        index_story("u1", {"story_id": "b", "title": "Hiring loop", "tags": ["Leadership"], "user_id": "u1"})
+        index = get_story_index("u1", load)
+        assert calls == ["u1"]
+        assert index.search(tags=["Leadership"])[0]["story_id"] == "b"
+        assert "user_id" not in index.search(tags=["Leadership"])[0]
+
+        unindex_story("u1", "a")
+        assert get_story_index("u1", load).search(tags=["Impact"]) == []
+        index_story("u2", {"story_id": "c"})  # no index loaded for u2: nothing to update
+
+    def test_ttl_and_empty_portfolios_rebuild(self, monkeypatch):
+        """Test that expired and empty indexes are rebuilt from the loader."""
+        calls = []
+
+        def load(user_id):
+            calls.append(user_id)
+            return []
+
+        get_story_index("u1", load)
+        get_story_index("u1", load)
+        assert calls == ["u1", "u1"]
+
+        monkeypatch.setattr(similarity_index, "SIMILARITY_INDEX_TTL_SECONDS", 0)
+        get_story_index("u2", lambda _: [{"story_id": "a"}])
+        get_story_index("u2", load)
+        assert calls[-1] == "u2"
+
+
+def test_title_trigrams_ignore_punctuation_and_case():
+    """Test that titles are normalized before trigrams are taken."""
+    assert title_terms("Led  the-Migration!") == title_terms("led the migration")
+    assert title_terms("  ") == {}
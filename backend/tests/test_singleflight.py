@@ -0,0 +1,114 @@
+"""
+Tests for single-flight coalescing of identical concurrent lookups (concurrency.SingleFlight).
+
+Slow fakes hold the first call open while other threads arrive, so a
+cold-cache stampede must cost exactly one upstream call.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import firebase_config
+from ai import tool_cache
+from ai.sqlite_cache import SQLiteCache
+from ai.tool_cache import _MemoryLRU, cached_tavily_search
+from ai.tools import search_personal_memory
+from concurrency import SingleFlight
+
+CALLERS = 20
+
+
+def _stampede(func, callers=CALLERS):
+    """Call `func` from many threads released at the same moment."""
+    barrier = threading.Barrier(callers)
+
+    def call(_):
+        barrier.wait()
+        return func()
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        return list(pool.map(call, range(callers)))
+
+
+def _slow(result, calls):
+    def call(*args):
+        calls.append(args)
+        time.sleep(0.2)
+        return result
+    return call
+
+
+class TestSingleFlight:
+    """Tests for the coalescing primitive."""
+
+    def test_concurrent_callers_share_one_call(self):
+        """Test that callers arriving while a call is in flight get its result."""
+        flights, calls = SingleFlight("test"), []
+        results = _stampede(lambda: flights.do("key", _slow("value", calls), "arg"))
+        assert results == ["value"] * CALLERS
+        assert calls == [("arg",)]
+        assert flights.in_flight() == 0
+
+    def test_errors_reach_every_waiter_and_are_not_kept(self):
+        """Test that a failed call raises for all its waiters and the next call retries."""
+        flights = SingleFlight("test")
+
+        def fail():
+            time.sleep(0.2)
+            raise ConnectionError("upstream down")
+
+        def call():
+            try:
+                return flights.do("key", fail)
+            except ConnectionError as e:
+                return str(e)
+
+        assert _stampede(call, callers=5) == ["upstream down"] * 5
+        assert flights.do("key", lambda: "recovered") == "recovered"
+
+    def test_keys_are_independent(self):
+        """Test that a call in flight for one key doesn't hold up another key."""
+        flights = SingleFlight("test")
+        slow = threading.Thread(target=flights.do, args=("a", _slow("a", [])))
+        slow.start()
+        time.sleep(0.05)
+        start = time.perf_counter()
+        assert flights.do("b", lambda: "b") == "b"
+        assert time.perf_counter() - start < 0.1
+        slow.join()
+
+
+class TestCoalescedLookups:
+    """Tests for the lookups that use SingleFlight."""
+
+    def test_tavily_stampede_costs_one_search(self, tmp_path, monkeypatch):
+        """Test that a cold-cache stampede on one query makes exactly one Tavily call."""
+        monkeypatch.setattr(tool_cache, "_store", SQLiteCache(str(tmp_path / "tool_cache.sqlite3"), 1024 * 1024))
+        monkeypatch.setattr(tool_cache, "_memory", _MemoryLRU(1024 * 1024))
+        calls = []
+        search = _slow([{"title": "Google interviews", "content": "..."}], calls)
+
+        results = _stampede(lambda: cached_tavily_search("google interview process", search, tool="company_insights"))
+        assert len(calls) == 1
+        assert all(r == results[0] for r in results)
+
+    @patch("ai.tools.get_user_collection")
+    def test_memory_searches_are_coalesced(self, mock_collection):
+        """Test that identical concurrent memory searches share one vector query."""
+        calls = []
+        mock_collection.return_value = MagicMock(query=lambda **kwargs: _slow(
+            {"documents": [["Led the Kafka migration"]], "metadatas": [[{"category": "project"}]]}, calls
+        )())
+        results = _stampede(lambda: search_personal_memory.invoke({"query": "kafka", "user_id": "u1"}))
+        assert len(calls) == 1
+        assert results == ["[PROJECT] Led the Kafka migration"] * CALLERS
+
+    def test_profile_fetches_are_coalesced(self, monkeypatch):
+        """Test that concurrent profile fetches share one read and each get their own copy."""
+        calls = []
+        monkeypatch.setattr(firebase_config, "_fetch_user_profile", _slow({"career_stage": "mid_career"}, calls))
+        profiles = _stampede(lambda: firebase_config.get_user_profile("u1"))
+        assert calls == [("u1",)]
+        assert profiles[0] == {"career_stage": "mid_career"}
+        assert profiles[0] is not profiles[1]
@@ -126,6 +126,33 @@ def test_delete_story():
     response = client.get(f"/stories/{story_id}")
     assert response.status_code == 404
 
+def test_coverage_counters_follow_writes():
+    before = client.get("/stories/coverage").json()
+    
+    # Create, retag and delete a story
+    response = client.post("/stories", json={
+        "title": "Counted Story",
+        "problem": "P", "action": "A", "result": "R",
+        "tags": ["Conflict"],
+        "raw_transcript": "T",
+        "status": "draft"
+    })
+    story_id = response.json()["story_id"]
+    after_create = client.get("/stories/coverage").json()
+    assert after_create["total_stories"] == before["total_stories"] + 1
+    assert after_create["tags"]["Conflict"] == before["tags"].get("Conflict", 0) + 1
+    
+    client.put(f"/stories/{story_id}", json={"tags": ["Failure"], "status": "complete"})
+    after_update = client.get("/stories/coverage").json()
+    assert after_update["tags"]["Conflict"] == before["tags"].get("Conflict", 0)
+    assert after_update["tags"]["Failure"] == before["tags"].get("Failure", 0) + 1
+    assert after_update["status"]["complete"] == before["status"].get("complete", 0) + 1
+    
+    client.delete(f"/stories/{story_id}")
+    after_delete = client.get("/stories/coverage").json()
+    assert after_delete["total_stories"] == before["total_stories"]
+    assert after_delete["tags"]["Failure"] == before["tags"].get("Failure", 0)
+
 def test_unauthorized_access():
     # Create a story as user 1
     response = client.post("/stories", json={
@@ -0,0 +1,68 @@
+"""
+Golden tests for the precompiled storytelling pattern engine (ai.tools.PatternSet).
+
+tests/golden/storytelling_patterns.jsonl holds stories (synthetic portfolio
+plus edge cases: mixed case, Unicode case folding, near misses such as
+"reduced costs by 30%") with the output of the original re.findall-per-pattern
+detector. The precompiled and batch detectors must reproduce it exactly.
+"""
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from ai.tools import (
+    PASSIVE_VOICE, PASSIVE_VOICE_PATTERNS, VAGUE_RESULTS, VAGUE_RESULTS_PATTERNS, WE_INSTEAD_OF_I,
+    WE_INSTEAD_OF_I_PATTERNS, PatternSet, _detect_weak_storytelling_patterns,
+    detect_weak_storytelling_patterns_batch
+)
+
+GOLDEN = [
+    json.loads(line)
+    for line in (Path(__file__).parent / "golden" / "storytelling_patterns.jsonl").read_text(encoding="utf-8").splitlines()
+]
+
+
+class TestGoldenOutputs:
+    """Tests that results match the original detector byte for byte."""
+
+    @pytest.mark.parametrize("index", range(len(GOLDEN)))
+    def test_single_story(self, index):
+        """Test that each golden story gets the recorded analysis."""
+        case = GOLDEN[index]
+        assert _detect_weak_storytelling_patterns(*case["story"]) == case["expected"]
+
+    def test_batch_matches_golden_in_order(self):
+        """Test that the batch API returns the recorded analyses, in input order."""
+        stories = [tuple(case["story"]) for case in GOLDEN]
+        assert detect_weak_storytelling_patterns_batch(stories) == [case["expected"] for case in GOLDEN]
+        assert detect_weak_storytelling_patterns_batch([]) == []
+
+
+class TestPatternSet:
+    """Tests for the combined alternation."""
+
+    @pytest.mark.parametrize("pattern_set, patterns", [
+        (PASSIVE_VOICE, PASSIVE_VOICE_PATTERNS),
+        (WE_INSTEAD_OF_I, WE_INSTEAD_OF_I_PATTERNS),
+        (VAGUE_RESULTS, VAGUE_RESULTS_PATTERNS),
+    ])
+    def test_one_pass_equals_separate_findall(self, pattern_set, patterns):
+        """Test that per-pattern counts from one scan equal separate re.findall calls."""
+        for case in GOLDEN:
+            text = " ".join(case["story"]).lower()
+            by_pattern = pattern_set.count_by_pattern(text)
+            for i, pattern in enumerate(patterns):
+                assert by_pattern.get(f"{pattern_set.name}_{i}", 0) == len(re.findall(pattern, text, re.IGNORECASE))
+
+    def test_batch_never_matches_across_stories(self):
+        """Test that a match can't span the end of one text and the start of the next."""
+        pattern_set = PatternSet("we", WE_INSTEAD_OF_I_PATTERNS)
+        assert pattern_set.count_per_text(["we", "built it", "our team", "delivered"]) == [0, 0, 0, 0]
+        assert pattern_set.count_per_text(["", "we built it", ""]) == [0, 1, 0]
+
+    def test_guard_is_skipped_for_non_literal_patterns(self):
+        """Test that patterns not starting with a letter still compile and match."""
+        pattern_set = PatternSet("num", [r"\d+%", r"\bgood\b"])
+        assert pattern_set.count("good: 20% and 30%") == 3
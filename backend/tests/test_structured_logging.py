@@ -0,0 +1,205 @@
+"""
+Tests for queue-backed structured logging (structured_logging.py).
+
+Records are written to a StringIO; shutdown_logging() flushes the queue
+before each assertion.
+"""
+import asyncio
+import io
+import json
+import logging
+import queue
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+import structured_logging
+from memory.summarizer import MemorySummarizer
+from structured_logging import (
+    AGENT_TRACE_LOGGER, LOG_RECORDS_DROPPED, NonBlockingQueueHandler, RequestIdMiddleware, TraceSampler,
+    configure_logging, current_request_id, request_id_scope, shutdown_logging
+)
+
+logger = logging.getLogger("tests.structured_logging")
+
+
+@pytest.fixture
+def log_output():
+    """Configure logging into a buffer; yields a function returning the parsed JSON lines."""
+    stream = io.StringIO()
+    configure_logging(stream=stream)
+
+    def lines():
+        shutdown_logging()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield lines
+    shutdown_logging()
+
+
+class TestJsonOutput:
+    """Tests for the record format."""
+
+    def test_record_has_level_request_id_and_fields(self, log_output):
+        """Test that extra fields and the bound request ID end up in the JSON object."""
+        with request_id_scope("req-1"):
+            logger.info("Transcription complete", extra={"chars": 42})
+        record = log_output()[-1]
+        assert record["msg"] == "Transcription complete"
+        assert record["level"] == "INFO"
+        assert record["logger"] == "tests.structured_logging"
+        assert record["request_id"] == "req-1"
+        assert record["chars"] == 42
+
+    def test_exception_is_formatted(self, log_output):
+        """Test that logger.exception includes the traceback text."""
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Error in /ai/structure")
+        record = log_output()[-1]
+        assert record["level"] == "ERROR"
+        assert "ValueError: boom" in record["exc"]
+
+    def test_request_id_is_captured_at_call_time(self, log_output):
+        """Test that records keep the request ID of the code that logged them, not the writer thread's."""
+        async def handle(request_id):
+            with request_id_scope(request_id):
+                await asyncio.sleep(0)
+                logger.info("handled", extra={"expected": request_id})
+
+        async def run():
+            await asyncio.gather(*[handle(f"req-{i}") for i in range(20)])
+
+        asyncio.run(run())
+        records = [r for r in log_output() if r["msg"] == "handled"]
+        assert len(records) == 20
+        assert all(r["request_id"] == r["expected"] for r in records)
+
+
+class TestCallSites:
+    """Tests that request-path log calls survive the configured handlers."""
+
+    def _summarizer(self, ainvoke):
+        summarizer = MemorySummarizer.__new__(MemorySummarizer)  # Skip building the LLM chain
+        summarizer.chain = MagicMock(ainvoke=ainvoke)
+        return summarizer
+
+    @patch("memory.summarizer.get_user_collection")
+    def test_memory_upload_logs_document(self, mock_collection, log_output):
+        """Test that summarizing a document logs it without clashing with LogRecord attributes."""
+        async def ainvoke(inputs):
+            return SimpleNamespace(summary="Led the Kafka migration", detected_source_type=None,
+                                   category="project", context=["Platform"])
+
+        entry_id = asyncio.run(self._summarizer(ainvoke).process_document("text", "u1", "resume", "cv.pdf"))
+        assert mock_collection.return_value.add.called
+        records = [r for r in log_output() if r.get("document") == "cv.pdf"]
+        assert [r["msg"] for r in records] == ["Summarizing document", "Created memory entry"]
+        assert records[-1]["entry_id"] == entry_id
+
+    @patch("memory.summarizer.get_user_collection")
+    def test_memory_upload_error_is_logged_and_raised(self, mock_collection, log_output):
+        """Test that a summarization error reaches the caller (not a logging KeyError)."""
+        async def ainvoke(inputs):
+            raise ConnectionError("model unavailable")
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(self._summarizer(ainvoke).process_document("text", "u1", "resume", "cv.pdf"))
+        assert log_output()[-1]["msg"] == "Error summarizing document"
+
+
+class TestNonBlocking:
+    """Tests for the bounded queue."""
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that records are dropped and counted once the queue is full."""
+        handler = NonBlockingQueueHandler(queue.SimpleQueue(), maxsize=1)
+        full_logger = logging.getLogger("tests.full_queue")
+        full_logger.propagate = False
+        full_logger.addHandler(handler)
+        before = LOG_RECORDS_DROPPED.value(("tests.full_queue",))
+        try:
+            for _ in range(3):
+                full_logger.warning("burst")
+        finally:
+            full_logger.removeHandler(handler)
+            full_logger.propagate = True
+        assert LOG_RECORDS_DROPPED.value(("tests.full_queue",)) - before == 2
+
+
+class TestTraceSampling:
+    """Tests for per-request sampling of agent traces."""
+
+    def _record(self, level=logging.INFO):
+        return logging.LogRecord(AGENT_TRACE_LOGGER, level, "", 0, "Tool call", None, None)
+
+    def test_sampling_is_stable_per_request(self):
+        """Test that every trace record of a request gets the same decision, at roughly the rate."""
+        sampler = TraceSampler(0.3)
+        kept = 0
+        for i in range(2000):
+            with request_id_scope(f"req-{i}"):
+                decisions = {sampler.filter(self._record()) for _ in range(3)}
+            assert len(decisions) == 1
+            kept += decisions.pop()
+        assert 0.2 < kept / 2000 < 0.4
+
+    def test_warnings_always_pass(self):
+        """Test that trace warnings (e.g. tool errors) are never sampled out."""
+        sampler = TraceSampler(0.0)
+        with request_id_scope("req"):
+            assert not sampler.filter(self._record())
+            assert sampler.filter(self._record(logging.WARNING))
+
+    def test_configured_trace_logger_is_sampled(self, log_output, monkeypatch):
+        """Test that configure_logging attaches the sampler with AGENT_TRACE_SAMPLE_RATE."""
+        shutdown_logging()
+        monkeypatch.setattr(structured_logging, "AGENT_TRACE_SAMPLE_RATE", 0.0)
+        stream = io.StringIO()
+        configure_logging(stream=stream)
+        with request_id_scope("req"):
+            logging.getLogger(AGENT_TRACE_LOGGER).info("Tool call")
+            logger.info("kept")
+        shutdown_logging()
+        messages = [json.loads(line)["msg"] for line in stream.getvalue().splitlines()]
+        assert messages == ["kept"]
+
+
+class TestRequestIdMiddleware:
+    """Tests for binding and echoing X-Request-ID."""
+
+    def _app(self):
+        app = FastAPI()
+        app.add_middleware(RequestIdMiddleware)
+
+        @app.get("/whoami")
+        async def whoami():
+            return {"request_id": current_request_id()}
+
+        return app
+
+    def _get(self, headers=None):
+        async def run():
+            transport = httpx.ASGITransport(app=self._app())
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.get("/whoami", headers=headers or {})
+
+        return asyncio.run(run())
+
+    def test_incoming_id_is_used_and_echoed(self):
+        """Test that a valid client-supplied ID is bound and returned."""
+        response = self._get({"X-Request-ID": "abc-123"})
+        assert response.json()["request_id"] == "abc-123"
+        assert response.headers["X-Request-ID"] == "abc-123"
+
+    def test_missing_or_invalid_id_is_generated(self):
+        """Test that a fresh ID replaces a missing or malformed one."""
+        for headers in (None, {"X-Request-ID": "bad id\n" * 3}):
+            response = self._get(headers)
+            request_id = response.json()["request_id"]
+            assert len(request_id) == 32
+            assert response.headers["X-Request-ID"] == request_id
@@ -0,0 +1,118 @@
+"""
+Tests for token budgets and prompt compaction (ai.token_budget).
+"""
+import asyncio
+import logging
+
+import pytest
+
+from ai import token_budget
+from ai.token_budget import (
+    GAP_MARKER, NO_PROFILE, PROMPT_TOKENS, compact_inputs, compact_profile, compaction_step, count_tokens,
+    drop_filler, prompt_tokens, summarize_text
+)
+
+STORY_SENTENCES = [
+    "I joined the payments team when checkout was failing for a lot of users.",
+    "Nobody owned the problem and support tickets kept piling up.",
+] + [f"We met with stakeholder group number {i} to walk through the flow." for i in range(40)] + [
+    "I rewrote the retry logic and added alerting on the payment provider.",
+    "Failed checkouts dropped by 35% within a month and tickets halved.",
+]
+LONG_STORY = " ".join(STORY_SENTENCES)
+
+
+class TestTextCompaction:
+    """Tests for filler removal and extractive summaries."""
+
+    def test_drop_filler(self):
+        """Test that hesitations and stutters go but meaningful words stay."""
+        text = "Um, so I, uh, led the the migration, you know, and it was like a big deal. Hmm."
+        assert drop_filler(text) == "so I, led the migration, and it was like a big deal. Hmm."
+
+    def test_drop_filler_keeps_legitimate_repeats(self):
+        """Test that only stutters are collapsed, not repeats that are grammatical."""
+        assert drop_filler("I I led it, and and we shipped.") == "I led it, and we shipped."
+        text = "I had had enough, and I knew that that plan would fail. It was so so, like like a draft."
+        assert drop_filler(text) == text
+
+    def test_drop_filler_keeps_units_and_sentences(self):
+        """Test that "mm" as a unit stays and a hesitation never swallows a full stop."""
+        text = "The gap was 5 mm. We cut it to 2 mm, and um it worked. It was so so."
+        assert drop_filler(text) == "The gap was 5 mm. We cut it to 2 mm, and it worked. It was so so."
+        assert drop_filler("It shipped, uh. Then we, um? Scaled.") == "It shipped. Then we? Scaled."
+
+    def test_summary_keeps_opening_outcome_and_fits(self):
+        """Test that the summary fits, keeps the first and last sentences, and marks gaps."""
+        summary = summarize_text(LONG_STORY, 120)
+        assert count_tokens(summary) <= 120
+        assert summary.startswith(STORY_SENTENCES[0])
+        assert summary.endswith(STORY_SENTENCES[-1])
+        assert GAP_MARKER in summary
+
+    def test_summary_is_deterministic_and_noop_when_short(self):
+        """Test that summaries repeat exactly and short text is returned unchanged."""
+        assert summarize_text(LONG_STORY, 100) == summarize_text(LONG_STORY, 100)
+        assert summarize_text("Short story.", 100) == "Short story."
+
+
+class TestProfile:
+    """Tests for compact profile formatting."""
+
+    def test_redundant_fields_are_dropped(self):
+        """Test that empty and repeated profile fields are left out."""
+        profile = {
+            "first_name": "Ana", "current_role": "PM", "target_role": "PM", "career_stage": None,
+            "current_company": "Stripe", "target_companies": ["Stripe", "Figma", "Figma"],
+            "current_company_size": "enterprise", "target_company_size": "enterprise",
+        }
+        assert compact_profile(profile) == (
+            "current_role: PM\ncurrent_company: Stripe\ntarget_companies: Figma\ncurrent_company_size: enterprise"
+        )
+        assert compact_profile({}) == NO_PROFILE
+        assert compact_profile({"first_name": "Ana"}) == NO_PROFILE
+
+
+class TestBudgets:
+    """Tests for per-chain budget enforcement."""
+
+    def test_within_budget_only_normalizes(self):
+        """Test that inputs under budget only get whitespace and filler cleanup."""
+        inputs = {"raw_transcript": "Um,  we   shipped it.\n\n\n\nThen uh it worked."}
+        compacted, report = compact_inputs("structure", inputs)
+        assert compacted["raw_transcript"] == "we shipped it.\n\nThen it worked."
+        assert report["steps"] == ["normalize"]
+
+    def test_over_budget_trims_profile_then_summarizes(self, monkeypatch):
+        """Test that over-budget inputs lose low-value profile lines, then long fields are summarized."""
+        profile = compact_profile({"current_role": "PM", "current_company": "Stripe", "current_company_size": "enterprise"})
+        inputs = {"first_name": "Ana", "problem": LONG_STORY, "action": "Fixed it.", "result": "Better.",
+                  "tags": "Impact", "user_profile": profile}
+        budget = prompt_tokens("coaching", inputs) - 200
+        monkeypatch.setenv("AI_TOKEN_BUDGET_COACHING", str(budget))
+
+        compacted, report = compact_inputs("coaching", inputs)
+        assert report["tokens_after"] <= budget
+        assert report["steps"][:3] == ["profile:-current_company_size", "profile:-current_company", "summarize:problem"]
+        assert compacted["user_profile"] == "current_role: PM"
+        assert compacted["action"] == "Fixed it."
+
+    def test_agent_steps_pass_through(self):
+        """Test that non-text inputs such as the agent's intermediate steps are untouched."""
+        steps = [("action", "observation")]
+        compacted, _ = compact_inputs("coaching_agent", {"problem": "p", "intermediate_steps": steps})
+        assert compacted["intermediate_steps"] is steps
+
+
+def test_compaction_step_logs_and_counts_savings(monkeypatch, caplog):
+    """Test that the chain step compacts, logs the saving and records it on /metrics."""
+    monkeypatch.setattr(token_budget, "AI_PROMPT_COMPACTION", True)
+    before = PROMPT_TOKENS.value(("structure", "saved"))
+    transcript = "Um, uh, we we shipped the fix. " * 50
+    with caplog.at_level(logging.INFO, logger="ai.token_budget"):
+        result = asyncio.run(compaction_step("structure").ainvoke({"raw_transcript": transcript}))
+    assert "Um" not in result["raw_transcript"]
+    saved = PROMPT_TOKENS.value(("structure", "saved")) - before
+    assert saved > 0
+    record = next(r for r in caplog.records if r.getMessage() == "Prompt compacted")
+    assert record.tokens_saved == saved
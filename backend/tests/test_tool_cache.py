@@ -0,0 +1,109 @@
+"""
+Tests for the two-tier tool cache (ai.tool_cache).
+
+Each test gets a fresh memory tier and a temporary SQLite file.
+"""
+import json
+import time
+
+import pytest
+
+from ai import tool_cache
+from ai.sqlite_cache import SQLiteCache
+from ai.tool_cache import (
+    MEMORY_TIER, SQLITE_TIER, TOOL_CACHE_EVENTS, _MemoryLRU, cache_get, cache_set, cached_tavily_search, tool_ttl
+)
+
+RESULTS = [{"title": "Stripe interviews", "url": "https://example.com", "content": "Behavioral rounds..."}]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    sqlite_store = SQLiteCache(str(tmp_path / "tool_cache.sqlite3"), max_bytes=1024 * 1024)
+    monkeypatch.setattr(tool_cache, "_store", sqlite_store)
+    monkeypatch.setattr(tool_cache, "_memory", _MemoryLRU(1024 * 1024))
+    monkeypatch.setattr(tool_cache, "TOOL_CACHE_PERSIST", True)
+    return sqlite_store
+
+
+def _events(tool, tier, event):
+    return TOOL_CACHE_EVENTS.value((tool, tier, event))
+
+
+class TestTwoTiers:
+    """Tests for memory/SQLite lookups and sharing between workers."""
+
+    def test_search_runs_once_and_hits_memory(self, store):
+        """Test that a repeated query is served from memory without searching again."""
+        calls = []
+        search = lambda q: calls.append(q) or RESULTS
+        before = _events("company_insights", MEMORY_TIER, "hit")
+
+        assert cached_tavily_search("stripe interviews", search, tool="company_insights") == RESULTS
+        assert cached_tavily_search("stripe interviews", search, tool="company_insights") == RESULTS
+        assert calls == ["stripe interviews"]
+        assert _events("company_insights", MEMORY_TIER, "hit") - before == 1
+
+    def test_other_worker_reads_sqlite_tier(self, store, monkeypatch):
+        """Test that a fresh worker (empty memory tier) is served from SQLite and keeps the expiry."""
+        cache_set("k", RESULTS, ttl=60, tool="role_trends")
+        monkeypatch.setattr(tool_cache, "_memory", _MemoryLRU(1024 * 1024))
+        before = _events("role_trends", SQLITE_TIER, "hit")
+
+        assert cache_get("k", "role_trends") == RESULTS
+        assert _events("role_trends", SQLITE_TIER, "hit") - before == 1
+        _, expires_at = tool_cache._memory.get("k")
+        assert expires_at == json.loads(store.get("k"))["expires_at"]
+
+    def test_expired_entries_miss_in_both_tiers(self, store, monkeypatch):
+        """Test that an entry is gone from both tiers once its TTL passes."""
+        cache_set("k", RESULTS, ttl=60)
+        now = time.time()
+        monkeypatch.setattr(tool_cache.time, "time", lambda: now + 61)
+        assert cache_get("k") is None
+
+    def test_sqlite_errors_are_misses(self, store, monkeypatch):
+        """Test that a broken SQLite tier degrades to memory-only caching."""
+        def broken(*args):
+            raise OSError("disk I/O error")
+
+        monkeypatch.setattr(store, "get", broken)
+        monkeypatch.setattr(store, "set", broken)
+        calls = []
+        search = lambda q: calls.append(q) or RESULTS
+        assert cached_tavily_search("q", search) == RESULTS
+        assert cached_tavily_search("q", search) == RESULTS
+        assert calls == ["q"]
+
+
+class TestBounds:
+    """Tests for size caps and per-tool TTLs."""
+
+    def test_memory_lru_evicts_least_recently_used(self):
+        """Test that the memory tier stays under its byte cap, dropping the oldest entry."""
+        lru = _MemoryLRU(max_bytes=100)
+        expires_at = time.time() + 60
+        lru.set("a", "A", expires_at, 40)
+        lru.set("b", "B", expires_at, 40)
+        lru.get("a")
+        assert lru.set("c", "C", expires_at, 40) == 1
+        assert lru.get("b") is None
+        assert lru.get("a") is not None and lru.get("c") is not None
+        assert lru.set("huge", "H", expires_at, 500) == 0
+        assert lru.get("huge") is None
+
+    def test_sqlite_evictions_are_counted(self, store):
+        """Test that SQLite evictions caused by a write show up in the metrics."""
+        store.max_bytes = 2000
+        before = _events("industry_context", SQLITE_TIER, "eviction")
+        for i in range(5):
+            cache_set(f"k{i}", "x" * 600, ttl=60, tool="industry_context")
+        assert store.stats()["bytes"] <= 2000
+        assert _events("industry_context", SQLITE_TIER, "eviction") - before >= 2
+
+    def test_tool_ttls(self, monkeypatch):
+        """Test per-tool defaults and environment overrides."""
+        assert tool_ttl("role_trends") == 3 * 24 * 60 * 60
+        assert tool_ttl("unknown_tool") == tool_cache.DEFAULT_TTL
+        monkeypatch.setenv("AI_TOOL_CACHE_TTL_ROLE_TRENDS", "120")
+        assert tool_ttl("role_trends") == 120
@@ -14,9 +14,11 @@ from ai.tools import (
     _validate_career_stage_alignment,
     _get_competency_coverage_internal,
     _search_similar_stories_internal,
-    _calculate_similarity,
     create_user_tools,
 )
+from ai import tool_cache
+from ai.similarity_index import reset_story_indexes
+from ai.sqlite_cache import SQLiteCache
 from ai.tool_cache import (
     cache_get,
     cache_set,
@@ -57,10 +59,12 @@ The results were positive and made things better."""
 # =============================================================================
 
 class TestToolCache:
-    """Tests for the in-memory cache module."""
+    """Tests for the tool cache module."""
 
-    def setup_method(self):
-        """Clear cache before each test."""
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self, tmp_path, monkeypatch):
+        """Point the cache at a temporary SQLite file and clear it before each test."""
+        monkeypatch.setattr(tool_cache, "_store", SQLiteCache(str(tmp_path / "tool_cache.sqlite3"), 1024 * 1024))
         cache_clear()
 
     def test_cache_key_generation(self):
@@ -296,15 +300,12 @@ class TestGetCompetencyCoverage:
 class TestSearchSimilarStories:
     """Tests for similar story search."""
 
-    def test_calculate_similarity(self):
-        """Test text similarity calculation."""
-        # Identical strings should have similarity of 1.0
-        sim = _calculate_similarity("hello world", "hello world")
-        assert sim == 1.0
-
-        # Different strings should have lower similarity
-        sim = _calculate_similarity("hello world", "goodbye moon")
-        assert sim < 0.5
+    @pytest.fixture(autouse=True)
+    def fresh_indexes(self):
+        """Each test mocks a different portfolio for the same user."""
+        reset_story_indexes()
+        yield
+        reset_story_indexes()
 
     @patch('ai.tools._get_user_stories')
     def test_tag_overlap_scoring(self, mock_get_stories):